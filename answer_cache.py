@@ -0,0 +1,254 @@
+# answer_cache.py
+"""
+Семантический кэш ответов юриста (legal_engine.query).
+
+Вопрос эмбеддится, и если среди недавних ответов есть вопрос с косинусной
+близостью не ниже порога, его ответ возвращается без цепочки из десятка
+запросов к LLM. Точный повтор вопроса (без учета регистра и пробелов)
+находится без эмбеддинга.
+
+Запись живет ANSWER_CACHE_TTL_HOURS часов и привязана к хешу базы знаний
+(legal_engine.docs_hash): после изменения docs/ весь кэш сбрасывается.
+При старте кэш заполняется из users.answers (seed_from_users).
+"""
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Настройки кэша берем из окружения
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "True").lower() == "true"
+# Порог косинусной близости вопросов: ниже - считаем вопрос другим
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.93"))
+ANSWER_CACHE_TTL_HOURS = float(os.getenv("ANSWER_CACHE_TTL_HOURS", "168"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "2000"))
+
+
+def normalize_question(text):
+    """Ключ точного совпадения: нижний регистр, схлопнутые пробелы, без финальной пунктуации"""
+    return re.sub(r"\s+", " ", text or "").strip().lower().rstrip("?!. ")
+
+
+def _parse_timestamp(value):
+    """ISO-время из users.messages / users.answers в unix-время (время без зоны - UTC)"""
+    if isinstance(value, datetime):
+        moment = value
+    else:
+        try:
+            moment = datetime.fromisoformat(str(value))
+        except ValueError:
+            return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def question_answer_pairs(user):
+    """
+    Пары (вопрос, ответ, время ответа) из документа пользователя.
+    messages и answers - независимые списки (вопрос без ответа при ошибке не получает
+    пары), поэтому ответ сопоставляется с последним вопросом, заданным до него.
+    """
+    messages = []
+    for message in user.get("messages") or []:
+        timestamp = _parse_timestamp(message.get("timestamp"))
+        if message.get("text") and timestamp is not None:
+            messages.append((timestamp, message["text"]))
+    messages.sort(key=lambda item: item[0])
+
+    pairs = []
+    used = set()
+    for answer in user.get("answers") or []:
+        answered_at = _parse_timestamp(answer.get("timestamp"))
+        if not answer.get("text") or answered_at is None:
+            continue
+        candidates = [i for i, (asked_at, _) in enumerate(messages) if asked_at <= answered_at and i not in used]
+        if not candidates:
+            continue
+        used.add(candidates[-1])
+        pairs.append((messages[candidates[-1]][1], answer["text"], answered_at))
+    return pairs
+
+
+class SemanticAnswerCache:
+    """
+    Потокобезопасный кэш вопрос -> ответ в памяти процесса.
+    embed_query(text) -> вектор и embed_documents(texts) -> векторы (как у OpenAIEmbeddings)
+    передаются фабрикой, чтобы эмбеддинги создавались только при первом вопросе.
+    current_docs_hash() -> str - версия базы знаний, при ее смене кэш сбрасывается.
+    """
+
+    def __init__(self, embeddings_factory, current_docs_hash, threshold=ANSWER_CACHE_THRESHOLD,
+                 ttl_seconds=ANSWER_CACHE_TTL_HOURS * 3600, max_items=ANSWER_CACHE_SIZE):
+        self._embeddings_factory = embeddings_factory
+        self._embeddings = None
+        self._current_docs_hash = current_docs_hash
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_items = max_items
+
+        self._lock = threading.Lock()
+        # normalize_question(вопрос) -> {"question", "answer", "vector", "created_at"}, от старых к новым
+        self._entries = OrderedDict()
+        self._matrix = None  # нормированные векторы записей (строки в порядке _entries)
+        self._docs_hash = None
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.invalidations = 0
+        self.last_similarity = None
+
+    def _get_embeddings(self):
+        if self._embeddings is None:
+            self._embeddings = self._embeddings_factory()
+        return self._embeddings
+
+    @staticmethod
+    def _unit(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_docs_hash(self):
+        """Сбрасывает кэш, если база знаний изменилась (вызывается под _lock)"""
+        docs_hash = self._current_docs_hash()
+        if docs_hash != self._docs_hash:
+            if self._entries:
+                self.invalidations += 1
+                print(f"[LOG] Кэш ответов сброшен: изменилась база знаний ({len(self._entries)} ответов)")
+            self._entries.clear()
+            self._matrix = None
+            self._docs_hash = docs_hash
+
+    def _drop_expired(self, now):
+        """Удаляет устаревшие записи (вызывается под _lock; записи упорядочены по времени)"""
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if now - entry["created_at"] < self.ttl_seconds:
+                break
+            del self._entries[key]
+            self._matrix = None
+            self.expired += 1
+
+    def _vectors(self):
+        if self._matrix is None and self._entries:
+            self._matrix = np.vstack([entry["vector"] for entry in self._entries.values()])
+        return self._matrix
+
+    def lookup(self, question):
+        """
+        Ищет ответ на вопрос. Возвращает (ответ или None, вектор вопроса или None).
+        Вектор можно передать в store, чтобы не эмбеддить вопрос второй раз.
+        """
+        key = normalize_question(question)
+        with self._lock:
+            self._check_docs_hash()
+            self._drop_expired(time.time())
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.exact_hits += 1
+                self.last_similarity = 1.0
+                return entry["answer"], entry["vector"]
+            if not self._entries:
+                self.misses += 1
+                return None, None
+
+        # Эмбеддинг - запрос в сеть, вне блокировки
+        vector = self._unit(self._get_embeddings().embed_query(question))
+
+        with self._lock:
+            matrix = self._vectors()
+            if matrix is not None:
+                similarities = matrix @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    entry = list(self._entries.values())[best]
+                    self.semantic_hits += 1
+                    self.last_similarity = round(float(similarities[best]), 4)
+                    print(f"[LOG] Ответ из кэша (близость {self.last_similarity}): «{entry['question'][:60]}»")
+                    return entry["answer"], vector
+            self.misses += 1
+        return None, vector
+
+    def store(self, question, answer, vector=None, created_at=None):
+        """Сохраняет ответ (вектор вопроса считается, если не передан)"""
+        if not answer:
+            return
+        if vector is None:
+            vector = self._unit(self._get_embeddings().embed_query(question))
+        self._add([(question, answer, created_at or time.time())], [vector])
+
+    def _add(self, items, vectors):
+        key_items = [(normalize_question(question), question, answer, created_at)
+                     for question, answer, created_at in items]
+        with self._lock:
+            self._check_docs_hash()
+            for (key, question, answer, created_at), vector in zip(key_items, vectors):
+                self._entries.pop(key, None)
+                self._entries[key] = {
+                    "question": question, "answer": answer, "vector": self._unit(vector), "created_at": created_at,
+                }
+            # Порядок записей - по времени ответа (для TTL), лишние - самые старые
+            self._entries = OrderedDict(sorted(self._entries.items(), key=lambda item: item[1]["created_at"]))
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def seed_from_users(self, users_collection, since=None, limit=None):
+        """
+        Заполняет кэш ответами из users.answers, данными после since (unix-время,
+        например время последнего изменения базы знаний) и не старше TTL.
+        Вопросы эмбеддятся одним пакетом. Возвращает количество добавленных ответов.
+        """
+        limit = limit or self.max_items
+        oldest = time.time() - self.ttl_seconds
+        if since is not None:
+            oldest = max(oldest, since)
+
+        pairs = {}
+        cursor = users_collection.find({"answers.0": {"$exists": True}}, {"messages": 1, "answers": 1})
+        for user in cursor:
+            for question, answer, answered_at in question_answer_pairs(user):
+                key = normalize_question(question)
+                if answered_at >= oldest and (key not in pairs or pairs[key][2] < answered_at):
+                    pairs[key] = (question, answer, answered_at)
+
+        items = sorted(pairs.values(), key=lambda item: item[2])[-limit:]
+        if not items:
+            return 0
+        vectors = self._get_embeddings().embed_documents([question for question, _, _ in items])
+        self._add(items, vectors)
+        print(f"[LOG] Кэш ответов заполнен из users.answers: {len(items)} ответов")
+        return len(items)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def stats(self):
+        """Счетчики попаданий/промахов для диагностики"""
+        with self._lock:
+            hits = self.exact_hits + self.semantic_hits
+            total = hits + self.misses
+            return {
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "hits": hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / total, 3) if total else 0.0,
+                "expired": self.expired,
+                "invalidations": self.invalidations,
+                "last_similarity": self.last_similarity,
+                "items": len(self._entries),
+            }
@@ -0,0 +1,165 @@
+# async_bot.py
+"""
+Асинхронный режим бота (BOT_MODE=async) на AsyncTeleBot.
+
+Обработчики по-прежнему регистрируются декораторами синхронного TeleBot в main.py.
+build_async_bot переносит их в AsyncTeleBot с теми же фильтрами и в том же порядке:
+- обработчики из native_handlers заменяются нативными async-версиями (вызовы Bot API
+  через aiohttp, Mongo через motor) - сейчас это /start;
+- остальные выполняются в своем пуле из ASYNC_BOT_SYNC_THREADS потоков (пул asyncio
+  по умолчанию - min(32, CPU + 4), на малом сервере это 5) и отвечают через
+  синхронный бот, как раньше. Обновления одного чата обрабатываются по очереди
+  (как в webhook_server), разные чаты - параллельно.
+Получение обновлений и быстрые обработчики не ждут друг друга: один процесс
+обслуживает много пользователей одновременно.
+"""
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from dotenv import load_dotenv
+from telebot.async_telebot import AsyncTeleBot
+
+from async_db import find_or_register_user, get_async_db
+from user_registration import admin_notification_text, restored_access_text, welcome_text
+
+load_dotenv()
+
+# Сколько синхронных обработчиков выполняется в потоках одновременно
+ASYNC_BOT_SYNC_THREADS = int(os.getenv("ASYNC_BOT_SYNC_THREADS", "32"))
+
+# Списки обработчиков, которые есть и у TeleBot, и у AsyncTeleBot
+HANDLER_LISTS = (
+    "message_handlers", "edited_message_handlers", "channel_post_handlers", "edited_channel_post_handlers",
+    "message_reaction_handlers", "message_reaction_count_handlers", "inline_handlers", "chosen_inline_handlers",
+    "callback_query_handlers", "shipping_query_handlers", "pre_checkout_query_handlers", "poll_handlers",
+    "poll_answer_handlers", "my_chat_member_handlers", "chat_member_handlers", "chat_join_request_handlers",
+    "chat_boost_handlers", "removed_chat_boost_handlers", "business_connection_handlers",
+    "business_message_handlers", "edited_business_message_handlers", "deleted_business_messages_handlers",
+)
+
+
+def handler_chat_id(update):
+    """Чат (или пользователь) объекта, который получает обработчик: сообщение, callback и т.п."""
+    for item in (update, getattr(update, "message", None)):
+        chat = getattr(item, "chat", None)
+        if chat is not None:
+            return chat.id
+    user = getattr(update, "from_user", None)
+    return user.id if user is not None else None
+
+
+class ChatLocks:
+    """asyncio.Lock на чат: обработчики одного чата выполняются по очереди, в порядке поступления"""
+
+    def __init__(self):
+        self._locks = {}  # chat_id -> [lock, сколько задач держит или ждет]
+
+    @asynccontextmanager
+    async def hold(self, chat_id):
+        if chat_id is None:
+            yield
+            return
+        entry = self._locks.setdefault(chat_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[chat_id]
+
+    def __len__(self):
+        return len(self._locks)
+
+
+def bridge_handler(function, executor, chat_locks=None):
+    """
+    Async-обертка синхронного обработчика: выполнение в потоке общего пула executor.
+    С chat_locks вызовы для одного чата идут по очереди (поток занимается после очереди чата).
+    """
+
+    async def run_in_thread(update):
+        loop = asyncio.get_running_loop()
+        if chat_locks is None:
+            return await loop.run_in_executor(executor, function, update)
+        async with chat_locks.hold(handler_chat_id(update)):
+            return await loop.run_in_executor(executor, function, update)
+
+    run_in_thread.__name__ = function.__name__
+    return run_in_thread
+
+
+def build_async_bot(sync_bot, native_handlers=None, sync_threads=ASYNC_BOT_SYNC_THREADS, token=None):
+    """
+    AsyncTeleBot с обработчиками sync_bot.
+    native_handlers: {синхронный обработчик: фабрика(async_bot) -> async-обработчик} - нативные замены.
+    """
+    async_bot = AsyncTeleBot(token or sync_bot.token)
+    overrides = {function: factory(async_bot) for function, factory in (native_handlers or {}).items()}
+    executor = ThreadPoolExecutor(max_workers=sync_threads, thread_name_prefix="async-bridge")
+    chat_locks = ChatLocks()
+
+    for name in HANDLER_LISTS:
+        handlers = getattr(sync_bot, name, None)
+        if handlers is None or not hasattr(async_bot, name):
+            continue
+        mirrored = []
+        for handler in handlers:
+            function = handler["function"]
+            if handler.get("pass_bot"):
+                print(f"[WARN] Обработчик {function.__name__} ждет bot=... и пропущен в async-режиме")
+                continue
+            replacement = overrides.get(function) or bridge_handler(function, executor, chat_locks)
+            mirrored.append(dict(handler, function=replacement))
+        setattr(async_bot, name, mirrored)
+    return async_bot
+
+
+def start_handler(async_bot, create_main_menu, admin_ids, get_db=get_async_db):
+    """Нативный async /start: поиск или регистрация пользователя через motor, приветствие и меню"""
+
+    async def start(message):
+        user_id = message.from_user.id
+        first_name = message.from_user.first_name
+        last_name = message.from_user.last_name
+
+        _, old_user = await find_or_register_user(get_db(), user_id, first_name, last_name)
+        restored_text = restored_access_text(old_user)
+        if restored_text:
+            await async_bot.send_message(message.chat.id, restored_text, parse_mode='Markdown')
+
+        await async_bot.send_message(message.chat.id, welcome_text(first_name), reply_markup=create_main_menu())
+
+        admin_text = admin_notification_text(user_id, first_name, last_name, admin_ids)
+        if not admin_text:
+            return
+        results = await asyncio.gather(
+            *(async_bot.send_message(admin_id, admin_text) for admin_id in admin_ids), return_exceptions=True
+        )
+        for admin_id, result in zip(admin_ids, results):
+            if isinstance(result, Exception):
+                print(f"[WARN] Не удалось отправить сообщение админу {admin_id}: {result}")
+
+    return start
+
+
+async def _run(sync_bot, native_handlers, polling_timeout):
+    async_bot = build_async_bot(sync_bot, native_handlers)
+    try:
+        await async_bot.delete_webhook()  # polling не работает, пока у бота зарегистрирован webhook
+        await async_bot.infinity_polling(timeout=polling_timeout)
+    finally:
+        await async_bot.close_session()
+
+
+def run_async_bot(sync_bot, native_handlers=None, polling_timeout=60):
+    """
+    Запускает AsyncTeleBot с обработчиками sync_bot (блокирует поток).
+    native_handlers: {синхронный обработчик: фабрика(async_bot) -> async-обработчик}.
+    """
+    print(f"[INFO] Async-режим: AsyncTeleBot, синхронных обработчиков в потоках до {ASYNC_BOT_SYNC_THREADS}")
+    asyncio.run(_run(sync_bot, native_handlers, polling_timeout))
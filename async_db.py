@@ -0,0 +1,49 @@
+# async_db.py
+"""
+Асинхронный доступ к MongoDB (motor) для обработчиков AsyncTeleBot (async_bot.py).
+
+Клиент создается при первом обращении внутри работающего цикла событий.
+Функции принимают базу аргументом, как и синхронные хелперы: в тестах
+подставляется фейковая база с async-методами коллекций.
+"""
+
+import os
+
+from dotenv import load_dotenv
+
+from user_registration import new_user_record
+
+load_dotenv()
+
+MONGO_URI = os.getenv("MONGO_URI")
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "telegram_bot")
+# Пул соединений motor: сколько запросов к базе идет одновременно
+ASYNC_MONGO_POOL_SIZE = int(os.getenv("ASYNC_MONGO_POOL_SIZE", "50"))
+
+_client = None
+
+
+def get_async_db():
+    """База бота через motor (ленивое подключение, motor нужен только в режиме BOT_MODE=async)"""
+    global _client
+    if _client is None:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        _client = AsyncIOMotorClient(MONGO_URI, maxPoolSize=ASYNC_MONGO_POOL_SIZE)
+    return _client[MONGO_DB_NAME]
+
+
+async def find_or_register_user(db, user_id, first_name, last_name):
+    """
+    Поиск пользователя для /start: существующий, восстановленный из user_migration или новый.
+    Возвращает (пользователь, старая запись миграции или None).
+    """
+    users = db["users"]
+    existing_user = await users.find_one({"user_id": user_id})
+    if existing_user:
+        return existing_user, None
+
+    old_user = await db["user_migration"].find_one({"user_id": user_id})
+    user = new_user_record(user_id, first_name, last_name, old_user)
+    await users.insert_one(user)
+    return user, old_user
+
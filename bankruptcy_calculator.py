@@ -491,22 +491,16 @@ def process_credit_report_with_bankruptcy_analysis(filepath: str, user_id: int)
     Функция для интеграции в document_processor.py
     """
     from document_processor import process_uploaded_file
-    from credit_parser import extract_credit_data_with_total
-    from text_extractor import extract_text_from_pdf
-    from ocr import ocr_file
+    from upload_pipeline import UploadPipeline
     
-    # Сначала обрабатываем как обычно
-    result = process_uploaded_file(filepath, user_id)
+    # Сначала обрабатываем как обычно (текст извлекается один раз)
+    pipeline = UploadPipeline(filepath, user_id)
+    result = process_uploaded_file(filepath, user_id, text=pipeline.text)
     
     if result.get("type") == "credit_report":
         try:
-            # Извлекаем текст
-            text = extract_text_from_pdf(filepath)
-            if not text.strip():
-                text = ocr_file(filepath)
-            
-            # Парсим данные
-            parsed_data = extract_credit_data_with_total(text)
+            # Парсим уже извлеченный текст
+            parsed_data = pipeline.parsed_data
             
             # Добавляем анализ банкротства
             bankruptcy_analysis = analyze_credit_report_for_bankruptcy(parsed_data)
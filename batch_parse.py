@@ -0,0 +1,237 @@
+# batch_parse.py
+"""
+Пакетный разбор архива кредитных отчетов (вне бота).
+
+Источник - папка с PDF / извлеченными текстами (.txt) или запрос к коллекции
+documents. Каждый отчет в пуле процессов проходит тот же путь, что и загрузка
+в боте: извлечение текста (для PDF), цепочка create_parser_chain() и
+extract_collateral_info. Результаты пишутся в JSONL по мере готовности,
+по одной строке на отчет, со временем каждого этапа и ошибкой, если она была.
+
+Запуск:
+    python -m batch_parse temp/reports --out results.jsonl
+    python -m batch_parse --mongo '{"type": "credit_report"}' --limit 1000 --workers 4
+    python -m batch_parse --mongo '{"_id": {"$oid": "6826f90c5877e257b5e6f660"}}'
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Количество процессов (по умолчанию - все ядра, кроме одного: бот продолжает работать)
+BATCH_PARSE_WORKERS = int(os.getenv("BATCH_PARSE_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+# Сколько отчетов одновременно отдано пулу на воркер (курсор Mongo не читается целиком)
+BATCH_PARSE_INFLIGHT_PER_WORKER = 4
+
+REPORT_EXTENSIONS = (".pdf", ".txt")
+
+
+def iter_directory(directory):
+    """Задания из папки: PDF извлекаются в воркере, .txt - уже извлеченный текст"""
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if os.path.isfile(path) and name.lower().endswith(REPORT_EXTENSIONS):
+            yield {"id": name, "path": path}
+
+
+def iter_mongo(query, limit=0, collection_name="documents"):
+    """Задания из коллекции documents: текст уже сохранен, извлекать PDF не нужно"""
+    from db import db
+
+    cursor = db[collection_name].find(query, {"text": 1}).batch_size(100)
+    if limit:
+        cursor = cursor.limit(limit)
+    for document in cursor:
+        yield {"id": str(document["_id"]), "text": document.get("text") or ""}
+
+
+def read_report_text(path):
+    """Текст отчета: .txt читаем как есть, PDF извлекаем как при загрузке (pdfminer, затем OCR)"""
+    if path.lower().endswith(".txt"):
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+
+    from ocr import ocr_file
+    from text_extractor import extract_text_mixed
+
+    text = extract_text_mixed(path)
+    if not text.strip():
+        text = ocr_file(path)
+    return text
+
+
+def process_report(job):
+    """
+    Разбирает один отчет (выполняется в воркере).
+    Исключения не пробрасываются: ошибка попадает в результат, пакет продолжается.
+    """
+    from collateral_parser import extract_collateral_info
+    from credit_parser import create_parser_chain
+    from format_detector import detect_format
+
+    result = {"id": job["id"], "ok": False, "timings": {}}
+    timings = result["timings"]
+    started = time.perf_counter()
+    try:
+        text = job.get("text")
+        if text is None:
+            stage = time.perf_counter()
+            text = read_report_text(job["path"])
+            timings["extract_s"] = round(time.perf_counter() - stage, 4)
+        result["text_length"] = len(text)
+
+        stage = time.perf_counter()
+        parsed = create_parser_chain().parse(text)
+        timings["parse_s"] = round(time.perf_counter() - stage, 4)
+
+        stage = time.perf_counter()
+        collaterals = extract_collateral_info(text)
+        timings["collateral_s"] = round(time.perf_counter() - stage, 4)
+
+        result["report_format"] = detect_format(text).report_format
+        if parsed:
+            parsed["collaterals"] = collaterals
+            result["ok"] = not parsed.get("parsing_error", False)
+        else:
+            result["error"] = "Ни один парсер не разобрал отчет"
+        result["data"] = parsed
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        result["traceback"] = traceback.format_exc()
+
+    timings["total_s"] = round(time.perf_counter() - started, 4)
+    return result
+
+
+def failed_result(job, error):
+    """Результат задания, которое не вернулось из воркера (воркер упал, результат не передался)"""
+    return {"id": job["id"], "ok": False, "timings": {"total_s": 0.0}, "error": f"{type(error).__name__}: {error}"}
+
+
+def run_batch(jobs, out, workers=BATCH_PARSE_WORKERS, on_result=None, process=process_report):
+    """
+    Разбирает задания в пуле процессов и пишет каждый результат строкой JSON в out.
+    Порядок строк - порядок готовности. Возвращает список кратких итогов по отчетам.
+    Задание, воркер которого упал, записывается как ошибка; пул пересоздается, пакет продолжается.
+    process - функция разбора одного задания (модульная, ее импортирует воркер).
+    """
+    summaries = []
+
+    def handle(result):
+        out.write(json.dumps(result, ensure_ascii=False, default=str) + "\n")
+        out.flush()
+        summary = {k: result.get(k) for k in ("id", "ok", "error", "report_format")}
+        summary["total_s"] = result["timings"]["total_s"]
+        summaries.append(summary)
+        if on_result:
+            on_result(result)
+
+    if workers <= 1:
+        for job in jobs:
+            handle(process(job))
+        return summaries
+
+    # spawn, а не fork: как и в OCR, не наследуем потоки и соединения родителя
+    context = multiprocessing.get_context("spawn")
+    max_inflight = workers * BATCH_PARSE_INFLIGHT_PER_WORKER
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    pending = {}  # future -> задание
+
+    def collect(done):
+        for future in done:
+            job = pending.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                # Воркер умер (память, сигнал) - все его незавершенные задания получают BrokenProcessPool
+                print(f"[ERROR] Отчет {job['id']} не разобран: {type(e).__name__}: {e}")
+                result = failed_result(job, e)
+            handle(result)
+
+    try:
+        for job in jobs:
+            if len(pending) >= max_inflight:
+                collect(wait(pending, return_when=FIRST_COMPLETED).done)
+            try:
+                future = executor.submit(process, job)
+            except BrokenProcessPool:
+                print("[WARN] Пул воркеров сломан, создаем новый и продолжаем пакет")
+                collect(wait(pending).done)
+                executor.shutdown(wait=False)
+                executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+                future = executor.submit(process, job)
+            pending[future] = job
+        collect(wait(pending).done)
+    finally:
+        executor.shutdown()
+
+    return summaries
+
+
+def print_result(result):
+    timings = result["timings"]
+    if result["ok"]:
+        data = result["data"]
+        print(
+            f"✅ {result['id']} [{result.get('report_format')}] {timings['total_s']:.3f} с, "
+            f"обязательств: {data.get('total_obligations', 0)}, долг: {data.get('total_debt', 0):,.2f}"
+        )
+    else:
+        print(f"❌ {result['id']} {timings['total_s']:.3f} с: {result.get('error') or 'parsing_error'}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Пакетный разбор кредитных отчетов в JSONL")
+    source = arg_parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("directory", nargs="?", help="Папка с PDF или .txt отчетов")
+    source.add_argument("--mongo", metavar="QUERY", help="Запрос (Extended JSON) к коллекции documents")
+    arg_parser.add_argument("--collection", default="documents", help="Коллекция с отчетами")
+    arg_parser.add_argument("--limit", type=int, default=0, help="Максимум документов из Mongo (0 - все)")
+    arg_parser.add_argument("--out", default="batch_parse_results.jsonl", help="Файл результатов JSONL")
+    arg_parser.add_argument("--workers", type=int, default=BATCH_PARSE_WORKERS, help="Количество процессов")
+    arg_parser.add_argument("--quiet", action="store_true", help="Не печатать строку на каждый отчет")
+    args = arg_parser.parse_args()
+
+    if args.mongo:
+        from bson import json_util
+        jobs = iter_mongo(json_util.loads(args.mongo), args.limit, args.collection)
+    else:
+        if not os.path.isdir(args.directory):
+            print(f"❌ Папка {args.directory} не найдена")
+            return 2
+        jobs = iter_directory(args.directory)
+
+    started = time.perf_counter()
+    with open(args.out, "w", encoding="utf-8") as out:
+        summaries = run_batch(jobs, out, args.workers, on_result=None if args.quiet else print_result)
+    elapsed = time.perf_counter() - started
+
+    if not summaries:
+        print("❌ Нет отчетов для разбора")
+        return 2
+
+    failed = [s for s in summaries if not s["ok"]]
+    slowest = sorted(summaries, key=lambda s: s["total_s"], reverse=True)[:5]
+    print("\n📊 ИТОГО:")
+    print(f"  Отчетов: {len(summaries)}, успешно: {len(summaries) - len(failed)}, ошибок: {len(failed)}")
+    print(f"  Время: {elapsed:.1f} с ({len(summaries) / elapsed:.1f} отчетов/с, воркеров: {args.workers})")
+    print("  Самые долгие: " + ", ".join(f"{s['id']} ({s['total_s']:.3f} с)" for s in slowest))
+    for s in failed:
+        print(f"  ❌ {s['id']}: {s['error'] or 'parsing_error'}")
+    print(f"💾 Результаты: {args.out}")
+
+    return 0 if not failed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
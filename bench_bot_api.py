@@ -0,0 +1,265 @@
+# bench_bot_api.py
+"""
+Нагрузочный тест бота на фейковом Bot API: сообщений в секунду у синхронного
+TeleBot (как в main.py), у нативного AsyncTeleBot и у AsyncTeleBot с синхронными
+обработчиками, перенесенными build_async_bot (так в async-режиме работает все,
+кроме /start).
+
+FakeBotAPI - aiohttp-сервер с методами getUpdates / sendMessage / getMe и т.п.:
+отдает заранее заготовленные обновления и отвечает на sendMessage с задержкой
+latency (имитация сети до api.telegram.org). Оба бота направляются на него через
+API_URL pyTelegramBotAPI, обработчик одинаковый: один ответ на сообщение.
+handler_ms - сколько синхронный обработчик работает сам (разбор, база) до ответа.
+
+Запуск:
+    python bench_bot_api.py --updates 500 --latency-ms 50 --handler-ms 20
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import threading
+import time
+from urllib.parse import parse_qsl
+
+import telebot
+from aiohttp import web
+from telebot import apihelper, asyncio_helper
+from telebot.async_telebot import AsyncTeleBot
+
+from async_bot import ASYNC_BOT_SYNC_THREADS, build_async_bot
+from webhook_server import fake_update
+
+FAKE_TOKEN = "123456:FAKE-TOKEN"
+
+
+class FakeBotAPI:
+    """Фейковый Bot API в отдельном потоке со своим циклом событий"""
+
+    def __init__(self, latency=0.05, host="127.0.0.1", port=0):
+        self.latency = latency
+        self.host = host
+        self.port = port
+        self.updates = []
+        self.sent = []
+        self._last_update_id = 0
+        self._condition = threading.Condition()
+        self._loop = None
+        self._runner = None
+        self._thread = None
+
+    @property
+    def api_url(self):
+        """Шаблон API_URL для pyTelegramBotAPI"""
+        return f"http://{self.host}:{self.port}/bot{{0}}/{{1}}"
+
+    def reset(self, count, chats=50, text="привет"):
+        """Новая порция обновлений для следующего бота (номера продолжаются, ответы обнуляются)"""
+        with self._condition:
+            start = self._last_update_id
+            self.updates = [fake_update(start + i + 1, 100000 + i % chats, text) for i in range(count)]
+            self._last_update_id += count
+            self.sent = []
+
+    def wait_sent(self, count, timeout=120):
+        with self._condition:
+            return self._condition.wait_for(lambda: len(self.sent) >= count, timeout)
+
+    async def _params(self, request):
+        params = dict(request.query)
+        if not request.can_read_body:
+            return params
+        if request.content_type == "application/json":
+            params.update(await request.json())
+        elif request.content_type == "application/x-www-form-urlencoded":
+            # AsyncTeleBot шлет форму и в GET-запросах, а request.post() читает тело только у POST
+            params.update(parse_qsl(await request.text()))
+        else:
+            params.update(await request.post())
+        return params
+
+    async def _handle(self, request):
+        method = request.match_info["method"]
+        params = await self._params(request)
+        if method == "getUpdates":
+            offset = int(params.get("offset") or 0)
+            limit = int(params.get("limit") or 100)
+            # Как в Bot API: offset подтверждает все обновления до него
+            self.updates = [u for u in self.updates if u["update_id"] >= offset]
+            pending = self.updates[:limit]
+            if not pending:
+                # Короткий long polling, чтобы бот не крутил пустые запросы
+                await asyncio.sleep(min(float(params.get("timeout") or 0), 0.2))
+            return web.json_response({"ok": True, "result": pending})
+        if method == "getMe":
+            return web.json_response({"ok": True, "result": {
+                "id": 123456, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot"}})
+        if method == "sendMessage":
+            await asyncio.sleep(self.latency)
+            chat_id = int(params["chat_id"])
+            with self._condition:
+                self.sent.append((chat_id, params.get("text"), time.perf_counter()))
+                message_id = len(self.sent)
+                self._condition.notify_all()
+            return web.json_response({"ok": True, "result": {
+                "message_id": message_id, "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"}, "text": params.get("text")}})
+        # deleteWebhook, answerCallbackQuery и прочее - просто успех
+        await asyncio.sleep(self.latency)
+        return web.json_response({"ok": True, "result": True})
+
+    def start(self):
+        started = threading.Event()
+
+        async def serve():
+            app = web.Application()
+            app.router.add_route("*", "/bot{token}/{method}", self._handle)
+            self._runner = web.AppRunner(app)
+            await self._runner.setup()
+            site = web.TCPSite(self._runner, self.host, self.port)
+            await site.start()
+            self.port = site._server.sockets[0].getsockname()[1]
+            started.set()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(serve())
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, daemon=True, name="fake-bot-api")
+        self._thread.start()
+        started.wait(10)
+        return self
+
+    def stop(self):
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result(10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(10)
+        self._loop = None
+
+
+def _sync_reply_bot(handler_delay=0.0, **kwargs):
+    """Синхронный TeleBot с обработчиком как в main.py: работа обработчика и ответ через Bot API"""
+    bot = telebot.TeleBot(FAKE_TOKEN, **kwargs)
+
+    @bot.message_handler(content_types=["text"])
+    def reply(message):
+        if handler_delay:
+            time.sleep(handler_delay)
+        bot.send_message(message.chat.id, "ответ")
+
+    return bot
+
+
+def _result(name, count, elapsed):
+    return {"bot": name, "messages": count, "seconds": round(elapsed, 3),
+            "messages_per_s": round(count / elapsed, 1)}
+
+
+def bench_sync(api, count, num_threads=2, handler_delay=0.0):
+    """Синхронный TeleBot с пулом обработчиков как в main.py (по умолчанию 2 потока)"""
+    apihelper.API_URL = api.api_url
+    bot = _sync_reply_bot(handler_delay, threaded=True, num_threads=num_threads)
+
+    api.reset(count)
+    started = time.perf_counter()
+    poller = threading.Thread(target=bot.polling, kwargs={"non_stop": True, "interval": 0, "timeout": 1},
+                              daemon=True)
+    poller.start()
+    try:
+        done = api.wait_sent(count)
+        elapsed = time.perf_counter() - started
+    finally:
+        bot.stop_polling()
+        poller.join(10)
+    if not done:
+        raise TimeoutError("TeleBot не ответил на все сообщения")
+    return _result("TeleBot", count, elapsed)
+
+
+async def _poll_until_sent(api, bot, count, name):
+    api.reset(count)
+    started = time.perf_counter()
+    polling = asyncio.create_task(bot.polling(non_stop=True, interval=0, timeout=1))
+    try:
+        done = await asyncio.get_running_loop().run_in_executor(None, api.wait_sent, count)
+        elapsed = time.perf_counter() - started
+    finally:
+        # Ответы на последние sendMessage еще в пути: остановка polling закрывает сессию бота
+        await asyncio.sleep(0.1)
+        polling.cancel()
+        try:
+            await polling
+        except asyncio.CancelledError:
+            pass
+        await bot.close_session()
+    if not done:
+        raise TimeoutError(f"{name} не ответил на все сообщения")
+    return _result(name, count, elapsed)
+
+
+async def _bench_async(api, count, handler_delay):
+    asyncio_helper.API_URL = api.api_url
+    bot = AsyncTeleBot(FAKE_TOKEN)
+
+    @bot.message_handler(content_types=["text"])
+    async def reply(message):
+        if handler_delay:
+            await asyncio.sleep(handler_delay)
+        await bot.send_message(message.chat.id, "ответ")
+
+    return await _poll_until_sent(api, bot, count, "AsyncTeleBot")
+
+
+def bench_async(api, count, handler_delay=0.0):
+    """Нативный async-обработчик (как /start в async_bot.py)"""
+    return asyncio.run(_bench_async(api, count, handler_delay))
+
+
+async def _bench_bridged(api, count, handler_delay, sync_threads):
+    asyncio_helper.API_URL = api.api_url
+    apihelper.API_URL = api.api_url
+    sync_bot = _sync_reply_bot(handler_delay, threaded=False)
+    bot = build_async_bot(sync_bot, sync_threads=sync_threads)
+    return await _poll_until_sent(api, bot, count, "AsyncBridged")
+
+
+def bench_bridged(api, count, handler_delay=0.0, sync_threads=ASYNC_BOT_SYNC_THREADS):
+    """Синхронный обработчик main.py, перенесенный build_async_bot (потоки + очередь по чатам)"""
+    return asyncio.run(_bench_bridged(api, count, handler_delay, sync_threads))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Сообщений в секунду: TeleBot против AsyncTeleBot")
+    arg_parser.add_argument("--updates", type=int, default=300, help="Сообщений на каждый бот")
+    arg_parser.add_argument("--latency-ms", type=float, default=50, help="Задержка ответа Bot API, мс")
+    arg_parser.add_argument("--handler-ms", type=float, default=0, help="Собственная работа обработчика, мс")
+    arg_parser.add_argument("--threads", type=int, default=2, help="Потоков обработчиков у TeleBot")
+    arg_parser.add_argument("--json", action="store_true", help="Вывести результат в JSON")
+    args = arg_parser.parse_args()
+
+    api = FakeBotAPI(latency=args.latency_ms / 1000).start()
+    try:
+        handler_delay = args.handler_ms / 1000
+        results = [
+            bench_sync(api, args.updates, args.threads, handler_delay),
+            bench_async(api, args.updates, handler_delay),
+            bench_bridged(api, args.updates, handler_delay),
+        ]
+    finally:
+        api.stop()
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        for result in results:
+            print(f"🤖 {result['bot']:<13} {result['messages']} сообщений за {result['seconds']:.2f} с "
+                  f"→ {result['messages_per_s']:.1f} сообщ./с")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
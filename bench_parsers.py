@@ -0,0 +1,132 @@
+# bench_parsers.py
+"""
+Микробенчмарк парсеров на извлеченных текстах отчетов (ПКБ, ГКБ, казахский).
+
+Для каждого текста выбирается тот же парсер, что выбрала бы цепочка
+create_parser_chain(), и замеряется время extract_data (без кэша парсинга).
+
+Запуск:
+    python bench_parsers.py debug_text_output_*.txt
+    python bench_parsers.py reports/*.txt --repeat 200 --save bench_before.json
+    python bench_parsers.py reports/*.txt --baseline bench_before.json
+    python bench_parsers.py gkb_report.txt --gkb-obligations 50
+"""
+
+import argparse
+import glob
+import json
+import os
+import statistics
+import sys
+import time
+
+import report_sections as rs
+from credit_parser import create_parser_chain
+
+
+def select_parser(text):
+    """Первый парсер цепочки, который берется за текст"""
+    parser = create_parser_chain()
+    while parser is not None:
+        if parser.can_parse(text):
+            return parser
+        parser = parser.next_parser
+    return None
+
+
+def make_gkb_report(template, obligations):
+    """
+    Отчет ГКБ с заданным числом действующих обязательств: блоки "Обязательство N"
+    из раздела действующих договоров шаблона повторяются по кругу с новыми номерами
+    договоров (чтобы не отсеялись как дубликаты). Остальной текст - как в шаблоне.
+    """
+    sections = rs.ReportSections(template)
+    bounds = sections.section(rs.GKB_ACTIVE, (rs.GKB_COMPLETED, rs.GKB_CURRENT_INFO), to_text_end=False)
+    if not bounds:
+        raise ValueError("В шаблоне нет раздела действующих договоров ГКБ")
+    section_start, section_end = bounds
+
+    blocks = list(sections.iter_numbered_blocks(rs.OBLIGATION, section_start, section_end))
+    if not blocks:
+        raise ValueError("В шаблоне нет обязательств в разделе действующих договоров")
+    head_end = blocks[0][1] - len(f"{rs.OBLIGATION} {blocks[0][0]}")
+
+    parts = [template[:head_end]]
+    for i in range(obligations):
+        _, body_start, body_end = blocks[i % len(blocks)]
+        body = template[body_start:body_end].replace("Номер договора: ", f"Номер договора: B{i + 1}-", 1)
+        parts.append(f"{rs.OBLIGATION} {i + 1}{body}")
+    parts.append(template[section_end:])
+    return "".join(parts)
+
+
+def bench_text(text, repeat):
+    """Время extract_data в миллисекундах: (имя парсера, список замеров)"""
+    parser = select_parser(text)
+    if parser is None:
+        return None, []
+
+    parser.extract_data(text)  # прогрев
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parser.extract_data(text)
+        timings.append((time.perf_counter() - start) * 1000)
+    return parser.__class__.__name__, timings
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Время парсинга отчета по каждому тексту")
+    arg_parser.add_argument("texts", nargs="*", help="Текстовые файлы отчетов (по умолчанию debug_text_output_*.txt)")
+    arg_parser.add_argument("--repeat", type=int, default=50, help="Повторов на отчет")
+    arg_parser.add_argument("--save", help="Сохранить медианы в JSON (для сравнения до/после)")
+    arg_parser.add_argument("--baseline", help="JSON предыдущего запуска для сравнения")
+    arg_parser.add_argument("--gkb-obligations", type=int,
+                            help="Замерить также отчет ГКБ с N обязательствами, собранный из текстов-шаблонов")
+    args = arg_parser.parse_args()
+
+    files = args.texts or sorted(glob.glob("debug_text_output_*.txt"))
+    if not files:
+        print("❌ Нет текстов для замера")
+        return 2
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    texts = []
+    for path in files:
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        name = os.path.basename(path)
+        texts.append((name, text))
+        if args.gkb_obligations and rs.GKB_ACTIVE in text:
+            texts.append((f"{name}@gkb{args.gkb_obligations}", make_gkb_report(text, args.gkb_obligations)))
+
+    results = {}
+    for name, text in texts:
+        parser_name, timings = bench_text(text, args.repeat)
+        if parser_name is None:
+            print(f"⚠️ {name}: ни один парсер не подошел")
+            continue
+
+        median = statistics.median(timings)
+        results[name] = {"parser": parser_name, "median_ms": round(median, 3), "min_ms": round(min(timings), 3)}
+
+        line = f"{name} [{parser_name}] медиана {median:.3f} мс, мин {min(timings):.3f} мс"
+        before = baseline.get(name)
+        if before:
+            line += f" (было {before['median_ms']:.3f} мс, x{before['median_ms'] / median:.2f})"
+        print(line)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"💾 Сохранено: {args.save}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+# bulk_reparse.py
+"""
+Массовый повторный разбор отчетов, сохраненных в коллекции documents.
+
+Курсор идет по documents в порядке _id (проекция только на text, batch_size),
+пачка отчетов разбирается в пуле процессов (batch_parse.process_report), а
+краткие итоги пишутся обратно в документы одним bulk_write на пачку.
+После каждой записанной пачки в коллекцию reparse_state сохраняется последний
+обработанный _id - прерванный запуск продолжается с него. Вместе с ним хранится
+хеш запроса и stale_only: продолжить запуск с другими условиями нельзя
+(нужен --restart или другое имя --job).
+
+Запуск:
+    python -m bulk_reparse --workers 4
+    python -m bulk_reparse --query '{"type": "credit_report"}' --job credit_reports
+    python -m bulk_reparse --stale-only        # только разобранные старой версией парсеров
+    python -m bulk_reparse --restart           # начать сначала, не продолжая сохраненный запуск
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+from bson import json_util
+from pymongo import UpdateOne
+
+from batch_parse import BATCH_PARSE_WORKERS, process_report
+from parse_cache import parser_code_version
+
+REPARSE_BATCH_SIZE = 200
+REPARSE_STATE_COLLECTION = "reparse_state"
+
+
+def parsed_summary(result):
+    """Краткие итоги разбора, которые сохраняются в документ"""
+    data = result.get("data") or {}
+    return {
+        "ok": result["ok"],
+        "error": result.get("error"),
+        "report_format": result.get("report_format"),
+        "total_debt": data.get("total_debt", 0.0),
+        "total_monthly_payment": data.get("total_monthly_payment", 0.0),
+        "total_obligations": data.get("total_obligations", 0),
+        "overdue_obligations": data.get("overdue_obligations", 0),
+        "creditors": [obligation.get("creditor") for obligation in data.get("obligations", [])],
+        "collaterals": len(data.get("collaterals") or []),
+        "parse_s": result["timings"].get("parse_s"),
+    }
+
+
+def query_hash(query, stale_only):
+    """Хеш условий запуска: по нему проверяется, что продолжается тот же самый запуск"""
+    conditions = json.dumps({"query": query or {}, "stale_only": bool(stale_only)}, sort_keys=True,
+                            default=json_util.default)
+    return hashlib.sha256(conditions.encode("utf-8")).hexdigest()
+
+
+def _iter_batches(cursor, batch_size):
+    batch = []
+    for document in cursor:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def reparse_documents(db, query=None, job="default", batch_size=REPARSE_BATCH_SIZE,
+                      workers=BATCH_PARSE_WORKERS, restart=False, stale_only=False, limit=0,
+                      collection_name="documents", on_batch=None):
+    """
+    Разбирает документы collection_name заново и сохраняет parsed_summary / parser_version / parsed_at.
+
+    Прогресс запуска job хранится в reparse_state: без restart обработка продолжается
+    после последнего записанного _id. Если сохраненный запуск job шел с другими query
+    или stale_only, поднимается ValueError. Возвращает итоговое состояние запуска.
+    """
+    documents = db[collection_name]
+    states = db[REPARSE_STATE_COLLECTION]
+    version = parser_code_version()
+    conditions_hash = query_hash(query, stale_only)
+
+    state = None if restart else states.find_one({"_id": job})
+    if state and state.get("query_hash") != conditions_hash:
+        raise ValueError(
+            f"Запуск {job} сохранен с другими условиями (query / stale_only): "
+            "продолжите его с теми же условиями, начните заново (restart) или выберите другое имя"
+        )
+    if not state:
+        state = {"_id": job, "last_id": None, "processed": 0, "failed": 0, "started_at": datetime.now(timezone.utc),
+                 "query_hash": conditions_hash}
+    state["parser_version"] = version
+    state["finished"] = False
+
+    conditions = [query or {}]
+    if state["last_id"] is not None:
+        conditions.append({"_id": {"$gt": state["last_id"]}})
+    if stale_only:
+        conditions.append({"parser_version": {"$ne": version}})
+    cursor = documents.find({"$and": conditions}, {"text": 1}).sort("_id", 1).batch_size(batch_size)
+    if limit:
+        cursor = cursor.limit(limit)
+
+    executor = None
+    if workers > 1:
+        # spawn, а не fork: как и в batch_parse, не наследуем соединения родителя
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        for batch in _iter_batches(cursor, batch_size):
+            jobs = [{"id": str(document["_id"]), "text": document.get("text") or ""} for document in batch]
+            if executor:
+                results = list(executor.map(process_report, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+            else:
+                results = [process_report(job) for job in jobs]
+
+            parsed_at = datetime.now(timezone.utc)
+            operations = [
+                UpdateOne(
+                    {"_id": document["_id"]},
+                    {"$set": {"parsed_summary": parsed_summary(result), "parser_version": version, "parsed_at": parsed_at}},
+                )
+                for document, result in zip(batch, results)
+            ]
+            documents.bulk_write(operations, ordered=False)
+
+            # Курсор идет по возрастанию _id: все документы до last_id уже записаны
+            state["last_id"] = batch[-1]["_id"]
+            state["processed"] += len(batch)
+            state["failed"] += sum(1 for result in results if not result["ok"])
+            state["updated_at"] = parsed_at
+            states.replace_one({"_id": job}, state, upsert=True)
+            if on_batch:
+                on_batch(state, results)
+    finally:
+        if executor:
+            executor.shutdown()
+
+    state["finished"] = True
+    states.replace_one({"_id": job}, state, upsert=True)
+    return state
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Повторный разбор отчетов из коллекции documents")
+    arg_parser.add_argument("--query", default="{}", help="Запрос (Extended JSON) к documents")
+    arg_parser.add_argument("--job", default="default", help="Имя запуска (прогресс хранится по нему)")
+    arg_parser.add_argument("--batch-size", type=int, default=REPARSE_BATCH_SIZE, help="Документов в пачке")
+    arg_parser.add_argument("--workers", type=int, default=BATCH_PARSE_WORKERS, help="Количество процессов")
+    arg_parser.add_argument("--limit", type=int, default=0, help="Максимум документов за запуск (0 - все)")
+    arg_parser.add_argument("--restart", action="store_true", help="Начать сначала, а не с последнего _id")
+    arg_parser.add_argument("--stale-only", action="store_true",
+                            help="Только документы, разобранные другой версией парсеров")
+    args = arg_parser.parse_args()
+
+    from credit_parser import get_reports_db
+
+    started = time.perf_counter()
+
+    def report_progress(state, results):
+        elapsed = time.perf_counter() - started
+        print(f"📦 до _id {state['last_id']}: обработано {state['processed']}, ошибок {state['failed']}, {elapsed:.1f} с")
+
+    try:
+        state = reparse_documents(
+            get_reports_db(), json_util.loads(args.query), job=args.job, batch_size=args.batch_size,
+            workers=args.workers, restart=args.restart, stale_only=args.stale_only, limit=args.limit,
+            on_batch=report_progress,
+        )
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 2
+    print(f"✅ Запуск {args.job} завершен: обработано {state['processed']}, ошибок {state['failed']}, "
+          f"версия парсеров {state['parser_version']}")
+    return 0 if not state["failed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,9 @@
 import re
 from typing import List, Dict
 
+import regex_patterns as rx
+from report_sections import index_sections
+
 def clean_number(value: str) -> float:
     """Преобразует строковое представление числа в float"""
     if not value:
@@ -24,11 +27,11 @@ def extract_collateral_info(text: str) -> List[Dict]:
         Список словарей с информацией по каждому залогу.
     """
     collateral_info = []
-    obligation_blocks = re.split(r"(?:Обязательство|КОНТРАКТ)\s+\d+", text)
 
-    for block in obligation_blocks:
-        collateral_match = re.search(r"Вид обеспечения:\s*([^\n\r]+).*?Стоимость обеспечения /валюта:\s*([\d\s.,]+)\s*KZT", block, re.DOTALL)
-        creditor_match = re.search(r"Кредитор:\s*(.+?)[\r\n]", block)
+    # Блоки между "Обязательство N" / "КОНТРАКТ N" из индекса разделов: ищем прямо в тексте по смещениям
+    for start, end in index_sections(text).blocks():
+        collateral_match = rx.COLLATERAL_TYPE_VALUE.search(text, start, end)
+        creditor_match = rx.COLLATERAL_CREDITOR.search(text, start, end)
         
         if collateral_match and creditor_match:
             kind = collateral_match.group(1).strip()
@@ -0,0 +1,121 @@
+# compare_extractors.py
+"""
+Сравнение быстрого пути PyMuPDF с pdfminer.six на корпусе сохраненных отчетов.
+
+Для каждого PDF текст извлекается обоими способами (без кэша), парсится
+цепочкой парсеров, и сравниваются obligations. Код выхода 1, если хотя бы
+один отчет разобран по-разному - тогда PDF_FAST_PATH включать нельзя.
+
+Запуск:
+    python compare_extractors.py temp/reports
+    python compare_extractors.py temp/reports --show-diff
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from credit_parser import GKBParser, PKBParser, create_parser_chain
+from text_extractor import extract_text_fast_pymupdf, extract_text_from_pdf
+
+
+def parse_obligations(text):
+    """Разбирает текст тем же парсером, что выбрала бы цепочка"""
+    gkb, pkb = GKBParser(), PKBParser()
+    if gkb.can_parse(text):
+        parser_name = "GKBParser"
+    elif pkb.can_parse(text):
+        parser_name = "PKBParser"
+    else:
+        parser_name = "chain"
+
+    result = create_parser_chain().parse(text) or {}
+    return parser_name, result.get("obligations", [])
+
+
+def compare_file(filepath):
+    """Сравнивает оба способа извлечения на одном PDF"""
+    start = time.perf_counter()
+    pdfminer_text = extract_text_from_pdf.uncached(filepath)
+    pdfminer_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fast_text = extract_text_fast_pymupdf.uncached(filepath)
+    fast_time = time.perf_counter() - start
+
+    pdfminer_parser, pdfminer_obligations = parse_obligations(pdfminer_text)
+    fast_parser, fast_obligations = parse_obligations(fast_text)
+
+    return {
+        "file": os.path.basename(filepath),
+        "parser": pdfminer_parser,
+        "same_parser": pdfminer_parser == fast_parser,
+        "identical": pdfminer_parser == fast_parser and pdfminer_obligations == fast_obligations,
+        "pdfminer_time": pdfminer_time,
+        "fast_time": fast_time,
+        "pdfminer_obligations": pdfminer_obligations,
+        "fast_obligations": fast_obligations,
+    }
+
+
+def print_diff(result):
+    """Показывает, какие обязательства разошлись"""
+    pdfminer_obls = result["pdfminer_obligations"]
+    fast_obls = result["fast_obligations"]
+    print(f"     обязательств: pdfminer={len(pdfminer_obls)}, pymupdf={len(fast_obls)}")
+    for i in range(max(len(pdfminer_obls), len(fast_obls))):
+        left = pdfminer_obls[i] if i < len(pdfminer_obls) else None
+        right = fast_obls[i] if i < len(fast_obls) else None
+        if left != right:
+            print(f"     #{i + 1} pdfminer: {left}")
+            print(f"     #{i + 1} pymupdf:  {right}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Сравнение PyMuPDF и pdfminer.six на корпусе отчетов")
+    arg_parser.add_argument("corpus", help="Папка с PDF кредитных отчетов")
+    arg_parser.add_argument("--show-diff", action="store_true", help="Показать различающиеся обязательства")
+    args = arg_parser.parse_args()
+
+    files = sorted(
+        os.path.join(args.corpus, name)
+        for name in os.listdir(args.corpus)
+        if name.lower().endswith(".pdf")
+    )
+    if not files:
+        print(f"❌ В папке {args.corpus} нет PDF файлов")
+        return 2
+
+    results = []
+    for filepath in files:
+        try:
+            result = compare_file(filepath)
+        except Exception as e:
+            print(f"❌ {os.path.basename(filepath)}: ошибка {e}")
+            results.append({"identical": False, "pdfminer_time": 0.0, "fast_time": 0.0})
+            continue
+
+        results.append(result)
+        mark = "✅" if result["identical"] else "❌"
+        print(
+            f"{mark} {result['file']} [{result['parser']}] "
+            f"pdfminer {result['pdfminer_time']:.2f} с, pymupdf {result['fast_time']:.2f} с"
+        )
+        if not result["identical"] and args.show_diff:
+            print_diff(result)
+
+    identical = sum(1 for r in results if r["identical"])
+    pdfminer_total = sum(r["pdfminer_time"] for r in results)
+    fast_total = sum(r["fast_time"] for r in results)
+    speedup = pdfminer_total / fast_total if fast_total else 0.0
+
+    print("\n📊 ИТОГО:")
+    print(f"  Совпадают obligations: {identical}/{len(results)}")
+    print(f"  pdfminer.six: {pdfminer_total:.2f} с, PyMuPDF: {fast_total:.2f} с (x{speedup:.1f})")
+
+    return 0 if identical == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
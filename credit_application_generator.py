@@ -627,24 +627,15 @@ def process_credit_report_with_applications(filepath, user_id):
     Эту функцию нужно добавить в document_processor.py
     """
     from document_processor import process_uploaded_file
+    from upload_pipeline import UploadPipeline
     
-    # Сначала обрабатываем как обычно
-    result = process_uploaded_file(filepath, user_id)
+    # Сначала обрабатываем как обычно (текст извлекается один раз)
+    pipeline = UploadPipeline(filepath, user_id)
+    result = process_uploaded_file(filepath, user_id, text=pipeline.text)
     
     if result.get("type") == "credit_report":
-        # Извлекаем данные из базы (если они там сохранены)
-        # Или парсим заново
-        from credit_parser import extract_credit_data_with_total
-        from text_extractor import extract_text_from_pdf
-        from ocr import ocr_file
-        
-        # Извлекаем текст
-        text = extract_text_from_pdf(filepath)
-        if not text.strip():
-            text = ocr_file(filepath)
-        
-        # Парсим данные
-        parsed_data = extract_credit_data_with_total(text)
+        # Парсим уже извлеченный текст, без повторного разбора PDF
+        parsed_data = pipeline.parsed_data
         
         # Генерируем заявления
         applications = generate_applications_for_all_creditors(parsed_data)
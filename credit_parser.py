@@ -1,5 +1,6 @@
 import re
 import os
+import threading
 from typing import Dict, List, Optional
 import logging
 from pymongo import MongoClient
@@ -8,6 +9,10 @@ from bson import ObjectId
 
 from collateral_parser import extract_collateral_info
 from improved_pkb_parser import FinalPKBParser
+from parse_cache import parse_cache
+import regex_patterns as rx
+from format_detector import detect_format
+import report_sections as rs
 
 # # Настройка логирования
 # logging.basicConfig(
@@ -42,6 +47,9 @@ def clean_number(value: str) -> float:
 class BaseParser:
     """Базовый класс для всех парсеров кредитных отчетов"""
     
+    # Формат из format_detector.FORMAT_ORDER, который обрабатывает парсер
+    report_format = None
+    
     def __init__(self):
         self.next_parser = None
     
@@ -52,9 +60,11 @@ class BaseParser:
     
     def parse(self, text: str) -> Optional[Dict]:
         """Пытается обработать отчет и передает запрос следующему парсеру, если не может"""
+        # Признаки ищутся один раз на текст (detect_format), звенья цепочки читают готовые баллы
         if self.can_parse(text):
             logger.info(f"Используется парсер {self.__class__.__name__}")
-            return self.extract_data(text)
+            # Повторный разбор того же текста (другой сценарий бота, другая цепочка) берется из кэша
+            return parse_cache.get_or_compute(text, self.__class__.__name__, lambda: self.extract_data(text))
         elif self.next_parser:
             logger.info(f"Парсер {self.__class__.__name__} передает управление следующему")
             return self.next_parser.parse(text)
@@ -64,7 +74,9 @@ class BaseParser:
     
     def can_parse(self, text: str) -> bool:
         """Определяет, может ли этот парсер обработать текст"""
-        raise NotImplementedError
+        if self.report_format is None:
+            raise NotImplementedError
+        return detect_format(text).accepts(self.report_format)
         
     def extract_data(self, text: str) -> Dict:
         """Извлекает данные из текста"""
@@ -305,8 +317,7 @@ class BaseParser:
         return personal_info
 # Детальный парсер (подробный отчет ПКБ)
 class DetailedParser(BaseParser):
-    def can_parse(self, text: str) -> bool:
-        return "ПОДРОБНАЯ ИНФОРМАЦИЯ ПО ДЕЙСТВУЮЩИМ ДОГОВОРАМ" in text or "ПОЛНЫЙ ПЕРСОНАЛЬНЫЙ КРЕДИТНЫЙ ОТЧЕТ" in text
+    report_format = "DETAILED"
     
     def extract_data(self, text: str) -> Dict:
         obligations = []
@@ -509,8 +520,7 @@ class DetailedParser(BaseParser):
 
 # Парсер для кратких отчетов
 class ShortParser(BaseParser):
-    def can_parse(self, text: str) -> bool:
-        return "ОБЩАЯ ИНФОРМАЦИЯ ПО ОБЯЗАТЕЛЬСТВАМ" in text or "Персональный кредитный отчет (краткая форма)" in text
+    report_format = "SHORT"
     
     def extract_data(self, text: str) -> Dict:
         obligations = []
@@ -698,16 +708,9 @@ class ShortParser(BaseParser):
 
 # Парсер для казахоязычных отчетов
 class KazakhParser(BaseParser):
-    def can_parse(self, text: str) -> bool:
-        # Проверяем наличие ключевых слов и отсутствие русских заголовков
-        has_kazakh_indicators = "ҚОЛДАНЫСТАҒЫ ШАРТТАР" in text
-        has_russian_indicators = "ПОДРОБНАЯ ИНФОРМАЦИЯ ПО ДЕЙСТВУЮЩИМ ДОГОВОРАМ" in text
-        
-        # Если есть и казахские, и русские индикаторы, считаем что это русский отчет
-        if has_kazakh_indicators and has_russian_indicators:
-            return False
-        
-        return has_kazakh_indicators
+    # Казахские заголовки без русских (если есть и те, и другие - это русский отчет)
+    report_format = "KAZAKH"
+    
     def extract_personal_info(self, text: str) -> Dict:
         """Извлекает личные данные из казахскоязычного отчета"""
         personal_info = {}
@@ -771,16 +774,23 @@ class KazakhParser(BaseParser):
         # Извлекаем личные данные
         personal_info = self.extract_personal_info(text)
         
-        # Ограничиваем текст только активными договорами
-        if "ҚОЛДАНЫСТАҒЫ ШАРТТАР" in text:
-            parts = text.split("ҚОЛДАНЫСТАҒЫ ШАРТТАР")
-            if len(parts) > 1:
-                text = parts[1]
+        # Ограничиваем текст только активными договорами:
+        # от первого "ҚОЛДАНЫСТАҒЫ ШАРТТАР" до следующего такого же заголовка или "АЯҚТАЛҒАН ШАРТТАР"
+        sections = rs.index_sections(text)
+        start, end = 0, len(text)
+        active_offsets = sections.offsets(rs.KZ_ACTIVE)
+        if active_offsets:
+            start = active_offsets[0] + len(rs.KZ_ACTIVE)
+            next_active = sections.find(rs.KZ_ACTIVE, start)
+            if next_active != -1:
+                end = next_active
+        
+        completed = sections.find(rs.KZ_COMPLETED, start, end)
+        if completed != -1:
+            end = completed
         
-        if "АЯҚТАЛҒАН ШАРТТАР" in text:
-            parts = text.split("АЯҚТАЛҒАН ШАРТТАР")
-            if len(parts) > 0:
-                text = parts[0]
+        obligation_spans = sections.blocks((rs.KZ_OBLIGATION,), start, end)
+        text = text[start:end]
         
         # Поиск общего количества действующих обязательств
         total_obligations_match = re.search(r"Қолданыстағы міндеттемелер\s*\((\d+)\)", text)
@@ -791,8 +801,8 @@ class KazakhParser(BaseParser):
         if total_debt_match:
             total_debt = self.clean_number(total_debt_match.group(1))
         
-        # Ищем блоки обязательств
-        obligation_blocks = re.split(r"Міндеттеме\s+\d+", text)
+        # Ищем блоки обязательств (границы "Міндеттеме N" из индекса разделов)
+        obligation_blocks = [text[block_start - start:block_end - start] for block_start, block_end in obligation_spans]
         if len(obligation_blocks) > 1:
             obligation_blocks = obligation_blocks[1:]  # Пропускаем первый блок
             logger.info(f"Найдено {len(obligation_blocks)} блоков обязательств")
@@ -1003,9 +1013,8 @@ class KazakhParser(BaseParser):
 
 # Универсальный парсер-заглушка
 class FallbackParser(BaseParser):
-    def can_parse(self, text: str) -> bool:
-        # Этот парсер всегда может обработать отчет (как последний в цепочке)
-        return True
+    # Этот парсер всегда может обработать отчет (как последний в цепочке)
+    report_format = "FALLBACK"
     
     def extract_data(self, text: str) -> Dict:
         logger.warning("Используется универсальный парсер-заглушка")
@@ -1050,8 +1059,8 @@ class FallbackParser(BaseParser):
                 except Exception:
                     continue
         
-        # Поиск кредиторов
-        creditors = set()
+        # Поиск кредиторов (dict вместо set: порядок как в отчете, без зависимости от PYTHONHASHSEED)
+        creditors = {}
         creditor_patterns = [
             r"(?:Кредитор|Банк):\s*(.+?)[\r\n]",
             r"Источник информации \(Кредитор\):\s*(.+?)[\r\n]"
@@ -1059,7 +1068,7 @@ class FallbackParser(BaseParser):
         
         for pattern in creditor_patterns:
             for match in re.finditer(pattern, text):
-                creditors.add(match.group(1).strip())
+                creditors.setdefault(match.group(1).strip(), None)
         
         # Если находим таблицу договоров
         try:
@@ -1107,10 +1116,7 @@ class FallbackParser(BaseParser):
 class PKBParser(BaseParser):
     """Точный парсер для отчетов ПКБ"""
     
-    def can_parse(self, text: str) -> bool:
-        return ("ПОЛНЫЙ ПЕРСОНАЛЬНЫЙ КРЕДИТНЫЙ ОТЧЕТ" in text or 
-                "ПЕРСОНАЛЬНЫЙ КРЕДИТНЫЙ РЕЙТИНГ" in text or
-                "ДОГОВОРЫ В КРЕДИТНОЙ ИСТОРИИ" in text)
+    report_format = "PKB"
     
     def extract_data(self, text: str) -> Dict:
     
@@ -1122,12 +1128,13 @@ class PKBParser(BaseParser):
         obligations = []
         
         # Ищем таблицу с действующими договорами
-        table_start = text.find("ИНФОРМАЦИЯ ПО ДЕЙСТВУЮЩИМ КРЕДИТНЫМ ДОГОВОРАМ")
+        sections = rs.index_sections(text)
+        table_start = sections.find(rs.PKB_ACTIVE)
         if table_start == -1:
             logger.info("Таблица не найдена")
             return obligations
         
-        table_end = text.find("Итого:", table_start)
+        table_end = sections.find(rs.TOTAL, table_start)
         if table_end == -1:
             logger.info("Конец таблицы не найден")
             return obligations
@@ -1162,7 +1169,7 @@ class PKBParser(BaseParser):
             logger.info(f"Парсинг строки {line_num}: {line[:100]}...")
             
             # Сначала извлекаем все суммы KZT по порядку
-            kzt_amounts = re.findall(r"([\d\s,\.]+)\s*KZT", line)
+            kzt_amounts = rx.KZT_AMOUNT.findall(line)
             if len(kzt_amounts) < 4:
                 logger.warning(f"Недостаточно сумм в строке {line_num}: {len(kzt_amounts)}")
                 return None
@@ -1178,10 +1185,10 @@ class PKBParser(BaseParser):
             clean_line = line
             
             # Удаляем тип финансирования в начале
-            clean_line = re.sub(r'^(Займ|Кредитная карта)\s+', '', clean_line)
+            clean_line = rx.PKB_ROW_LOAN_TYPE.sub('', clean_line)
             
             # Находим кредитора до "Заёмщик"
-            creditor_match = re.search(r'^(.*?)\s+Заёмщик', clean_line)
+            creditor_match = rx.PKB_ROW_CREDITOR.search(clean_line)
             if not creditor_match:
                 logger.warning(f"Не найден кредитор в строке {line_num}")
                 return None
@@ -1189,7 +1196,7 @@ class PKBParser(BaseParser):
             creditor = creditor_match.group(1).strip()
             
             # Очищаем название кредитора от лишних пробелов
-            creditor = re.sub(r'\s+', ' ', creditor).strip()
+            creditor = rx.WHITESPACE.sub(' ', creditor).strip()
             
             # Извлекаем дни просрочки - ищем число перед KZT или в конце строки
             overdue_days = 0
@@ -1200,7 +1207,7 @@ class PKBParser(BaseParser):
                 remaining_line = remaining_line.replace(f"{kzt_amount} KZT", "", 1)
             
             # Ищем числа в оставшейся части
-            remaining_numbers = re.findall(r'\b(\d{1,4})\b', remaining_line)
+            remaining_numbers = rx.PKB_ROW_NUMBER.findall(remaining_line)
             if remaining_numbers:
                 # Берем наибольшее число как дни просрочки (обычно это самое большое число)
                 overdue_days = max(int(num) for num in remaining_numbers[-3:])  # Последние 3 числа
@@ -1245,24 +1252,11 @@ class GKBParser(BaseParser):
     Извлекает ВСЕ данные для банкротства: номера договоров, даты, суммы
     """
     
+    report_format = "GKB"
+    
     def can_parse(self, text: str) -> bool:
-        # Признаки отчета ГКБ
-        gkb_indicators = [
-            "Государственное кредитное бюро",
-            "Персональный кредитный отчет",
-            "Номер договора:",
-            "Дата начала срока действия контракта:",
-            "Обязательство 1"
-        ]
-        
-        # Должно быть хотя бы 3 признака ГКБ
-        gkb_score = sum(1 for indicator in gkb_indicators if indicator in text)
-        
-        # И НЕ должно быть признаков ПКБ
-        pkb_indicators = ["ПОЛНЫЙ ПЕРСОНАЛЬНЫЙ КРЕДИТНЫЙ ОТЧЕТ", "Итого:"]
-        pkb_score = sum(1 for indicator in pkb_indicators if indicator in text)
-        
-        is_gkb = gkb_score >= 3 and pkb_score == 0
+        # Хотя бы 3 признака ГКБ и НИ ОДНОГО признака ПКБ (format_detector)
+        is_gkb = super().can_parse(text)
         
         if is_gkb:
             logger.info("🎯 Определен формат ГКБ - используем специализированный парсер")
@@ -1322,7 +1316,7 @@ class GKBParser(BaseParser):
         personal_info = {}
         
         # ФИО
-        name_match = re.search(r'Фамилия:\s*([^\n]+)\s+Имя:\s*([^\n]+)\s+Отчество:\s*([^\n]+)', text)
+        name_match = rx.GKB_NAME.search(text)
         if name_match:
             surname, name, patronymic = name_match.groups()
             personal_info['last_name'] = surname.strip()
@@ -1331,22 +1325,22 @@ class GKBParser(BaseParser):
             personal_info['full_name'] = f"{surname.strip()} {name.strip()} {patronymic.strip()}"
         
         # ИИН
-        iin_match = re.search(r'ИИН:\s*(\d+)', text)
+        iin_match = rx.GKB_IIN.search(text)
         if iin_match:
             personal_info['iin'] = iin_match.group(1)
         
         # Телефон
-        phone_match = re.search(r'Моб\. тел\.:\s*(\d+)', text)
+        phone_match = rx.GKB_PHONE.search(text)
         if phone_match:
             personal_info['mobile_phone'] = phone_match.group(1)
         
         # Email
-        email_match = re.search(r'E-mail:\s*([^\s\n]+)', text)
+        email_match = rx.GKB_EMAIL.search(text)
         if email_match:
             personal_info['email'] = email_match.group(1)
         
         # Адрес
-        address_match = re.search(r'Постоянное место жительства.*?Улица:\s*([^\n]+)', text, re.DOTALL)
+        address_match = rx.GKB_ADDRESS.search(text)
         if address_match:
             personal_info['address'] = address_match.group(1).strip()
         
@@ -1363,69 +1357,68 @@ class GKBParser(BaseParser):
         
         obligations = []
         
-        # 1. Находим раздел с действующими обязательствами
-        active_section = re.search(
-            r'ПОДРОБНАЯ ИНФОРМАЦИЯ ПО ДЕЙСТВУЮЩИМ ДОГОВОРАМ(.*?)(?=ПОДРОБНАЯ ИНФОРМАЦИЯ О ЗАВЕРШЕННЫХ ДОГОВОРАХ|Текущие сведения)',
-            text, 
-            re.DOTALL
+        # 1. Находим раздел с действующими обязательствами (по индексу разделов, без копии текста)
+        sections = rs.index_sections(text)
+        active_section = sections.section(
+            rs.GKB_ACTIVE, (rs.GKB_COMPLETED, rs.GKB_CURRENT_INFO), to_text_end=False
         )
         
         if not active_section:
             logger.warning("❌ Раздел действующих обязательств ГКБ не найден")
             return obligations
         
-        active_text = active_section.group(1)
+        section_start, section_end = active_section
         
         # 2. СПОСОБ 1: Ищем обычные обязательства (с заголовком "Обязательство N")
+        # Границы блоков берутся из индекса маркеров, повторы (кредитор + договор) не парсим
         # print(f"🔍 Ищем обязательства СТАНДАРТНЫМ способом...")
-        obligation_pattern = r'Обязательство\s+(\d+)(.*?)(?=Обязательство\s+\d+|$)'
-        standard_matches = re.finditer(obligation_pattern, active_text, re.DOTALL)
+        seen_pairs = set()
         
         standard_count = 0
-        for match in standard_matches:
-            obligation_num = match.group(1)
-            obligation_text = match.group(2)
-            
-            obligation_data = self.parse_gkb_single_obligation(obligation_text, obligation_num)
+        for obligation_num, block_start, block_end in sections.iter_numbered_blocks(
+                rs.OBLIGATION, section_start, section_end):
+            key = self._gkb_block_key(text, block_start, block_end)
+            if key in seen_pairs:
+                if DEBUG_PRINT:
+                    print(f"  ⚠️  Пропускаем дубликат: {key[0]} (договор: {key[1]})")
+                continue
+            
+            obligation_data = self.parse_gkb_single_obligation(text[block_start:block_end], obligation_num)
             if obligation_data:
                 obligations.append(obligation_data)
+                if key:
+                    seen_pairs.add(key)
                 standard_count += 1
                 # print(f"  ✅ Найдено стандартное обязательство #{obligation_num}")
         
         # print(f"📊 Стандартным способом найдено: {standard_count} обязательств")
         
         # ✅ ИСПРАВЛЕНИЕ: Создаем набор пар (кредитор + номер_договора) для проверки дубликатов
-        seen_pairs = {(obl['creditor'], obl['contract_number']) for obl in obligations}
+        seen_pairs.update((obl['creditor'], obl['contract_number']) for obl in obligations)
         
         # 3. СПОСОБ 2: Если мало найдено - включаем РЕЗЕРВНЫЙ поиск
         if len(obligations) < 10:  # Если меньше 10 - ищем дополнительно
             # print(f"⚠️  Мало обязательств! Включаем РЕЗЕРВНЫЙ поиск...")
             
             # Ищем блоки, которые начинаются с "Кредитор:" и заканчиваются "Количество дней просрочки:"
-            fallback_pattern = r'(Кредитор:.*?)(?=Кредитор:|$)'
-            fallback_matches = re.finditer(fallback_pattern, active_text, re.DOTALL)
+            fallback_blocks = sections.iter_blocks_from(rs.CREDITOR, section_start, section_end)
             
             fallback_count = 0
             
-            for i, match in enumerate(fallback_matches):
-                fallback_text = match.group(1)
-                
+            for i, (block_start, block_end) in enumerate(fallback_blocks):
                 # Проверяем, что в блоке есть нужные поля
-                if ('Номер договора:' in fallback_text and 
-                    'Количество дней просрочки:' in fallback_text):
+                if (text.find('Номер договора:', block_start, block_end) != -1 and 
+                    text.find('Количество дней просрочки:', block_start, block_end) != -1):
                     
                     # ✅ ИСПРАВЛЕНИЕ: Извлекаем И кредитора И номер договора
-                    creditor_match = re.search(r'Кредитор:\s*(.+)', fallback_text)
-                    contract_match = re.search(r'Номер договора:\s*(.+)', fallback_text)
+                    key = self._gkb_block_key(text, block_start, block_end)
                     
-                    if creditor_match and contract_match:
-                        creditor_name = creditor_match.group(1).strip().strip('"')
-                        contract_num = contract_match.group(1).strip()
+                    if key:
+                        creditor_name, contract_num = key
                         
                         # ✅ ИСПРАВЛЕНИЕ: Проверяем пару (кредитор + договор), а не только кредитора
-                        key = (creditor_name, contract_num)
-                        
                         if key not in seen_pairs:
+                            fallback_text = text[block_start:block_end]
                             obligation_data = self.parse_gkb_single_obligation(fallback_text, f"R{i+1}")
                             if obligation_data and obligation_data.get('debt_amount', 0) > 0:
                                 obligations.append(obligation_data)
@@ -1441,6 +1434,14 @@ class GKBParser(BaseParser):
         # print(f"🎯 ИТОГО найдено обязательств: {len(obligations)}")
         
         return obligations
+    
+    def _gkb_block_key(self, text: str, start: int, end: int) -> Optional[tuple]:
+        """(кредитор, номер договора) блока text[start:end] без копирования блока; None, если чего-то нет"""
+        creditor_match = rx.GKB_CREDITOR.search(text, start, end)
+        contract_match = rx.GKB_CONTRACT_NUMBER.search(text, start, end)
+        if not (creditor_match and contract_match):
+            return None
+        return creditor_match.group(1).strip().strip('"'), contract_match.group(1).strip()
     def parse_gkb_single_obligation(self, text: str, obligation_num: str) -> Optional[Dict]:
         """Парсит ОДНО обязательство ГКБ с извлечением ВСЕХ данных для банкротства"""
         
@@ -1451,7 +1452,7 @@ class GKBParser(BaseParser):
         
         try:
             # 1. КРЕДИТОР
-            creditor_match = re.search(r'Кредитор:\s*(.+)', text)
+            creditor_match = rx.GKB_CREDITOR.search(text)
             if creditor_match:
                 creditor = creditor_match.group(1).strip().strip('"')
                 obligation['creditor'] = creditor
@@ -1460,7 +1461,7 @@ class GKBParser(BaseParser):
                 obligation['creditor'] = "Неизвестно"
             
             # 2. НОМЕР ДОГОВОРА (КРИТИЧЕСКИ ВАЖНО!)
-            contract_match = re.search(r'Номер договора:\s*(.+)', text)
+            contract_match = rx.GKB_CONTRACT_NUMBER.search(text)
             if contract_match:
                 obligation['contract_number'] = contract_match.group(1).strip()
             else:
@@ -1468,12 +1469,12 @@ class GKBParser(BaseParser):
                 obligation['contract_number'] = "НЕ НАЙДЕН"
             
             # 3. ДАТА ОБРАЗОВАНИЯ ЗАДОЛЖЕННОСТИ (КРИТИЧЕСКИ ВАЖНО!)
-            start_date_match = re.search(r'Дата начала срока действия контракта:\s*(\d{2}\.\d{2}\.\d{4})', text)
+            start_date_match = rx.GKB_START_DATE.search(text)
             if start_date_match:
                 obligation['debt_origin_date'] = start_date_match.group(1)
             else:
                 # Пробуем альтернативные варианты
-                issue_date_match = re.search(r'Дата фактической выдачи:\s*(\d{2}\.\d{2}\.\d{4})', text)
+                issue_date_match = rx.GKB_ISSUE_DATE.search(text)
                 if issue_date_match:
                     obligation['debt_origin_date'] = issue_date_match.group(1)
                 else:
@@ -1488,10 +1489,10 @@ class GKBParser(BaseParser):
                 return float(val.replace(' ', '').replace(',', '.'))
 
             # Ищем все возможные суммы
-            outstanding_match = re.search(r'Остаток задолженности.*?([\d\s]+\d(?:[,\.]\d+)?)\s*KZT', text)
-            future_payment_match = re.search(r'Сумма предстоящих платежей.*?([\d\s]+\d(?:[,\.]\d+)?)\s*KZT', text)
-            contract_sum_match = re.search(r'Сумма [Кк]редитного договора.*?([\d\s]+\d(?:[,\.]\d+)?)\s*KZT', text)
-            overdue_match = re.search(r'Сумма просроченных взносов.*?([\d\s]+\d(?:[,\.]\d+)?)\s*KZT', text)
+            outstanding_match = rx.GKB_OUTSTANDING.search(text)
+            future_payment_match = rx.GKB_FUTURE_PAYMENTS.search(text)
+            contract_sum_match = rx.GKB_CONTRACT_SUM.search(text)
+            overdue_match = rx.GKB_OVERDUE_SUM.search(text)
 
             # Словарь кандидатов в порядке приоритета
             candidates = {
@@ -1532,35 +1533,35 @@ class GKBParser(BaseParser):
                 print(f"  ❌ Все суммы равны нулю")
 
             # 5. ПРОСРОЧЕННАЯ ЗАДОЛЖЕННОСТЬ
-            overdue_match = re.search(r'Сумма просроченных взносов.*?(\d+(?:\.\d+)?)\s*KZT', text)
+            overdue_match = rx.GKB_OVERDUE_AMOUNT.search(text)
             if overdue_match:
                 obligation['overdue_amount'] = float(overdue_match.group(1))
             else:
                 obligation['overdue_amount'] = 0.0
             
             # 6. ДНИ ПРОСРОЧКИ
-            overdue_days_match = re.search(r'Количество дней просрочки:\s*(\d+)', text)
+            overdue_days_match = rx.OVERDUE_DAYS_FIELD.search(text)
             if overdue_days_match:
                 obligation['overdue_days'] = int(overdue_days_match.group(1))
             else:
                 obligation['overdue_days'] = 0
             
             # 7. ТИП КРЕДИТА
-            loan_type_match = re.search(r'Вид финансирования:\s*(.+)', text)
+            loan_type_match = rx.GKB_LOAN_TYPE.search(text)
             if loan_type_match:
                 obligation['loan_type'] = loan_type_match.group(1).strip()
             else:
                 obligation['loan_type'] = "Неизвестно"
             
             # 8. ПРОЦЕНТНАЯ СТАВКА
-            interest_match = re.search(r'Годовая эффективная ставка вознаграждения:\s*(\d+\.\d+)\s*%', text)
+            interest_match = rx.GKB_INTEREST_RATE.search(text)
             if interest_match:
                 obligation['interest_rate'] = float(interest_match.group(1))
             else:
                 obligation['interest_rate'] = 0.0
             
             # 9. ЕЖЕМЕСЯЧНЫЙ ПЛАТЕЖ
-            monthly_payment_match = re.search(r'Сумма ежемесячного платежа.*?(\d+(?:\.\d+)?)\s*KZT', text)
+            monthly_payment_match = rx.GKB_MONTHLY_PAYMENT.search(text)
             if monthly_payment_match:
                 obligation['monthly_payment'] = float(monthly_payment_match.group(1))
             else:
@@ -1898,6 +1899,18 @@ def create_parser_chain():
     
     return gkb  # Возвращаем первый парсер в цепочке
 
+def empty_parse_result() -> Dict:
+    """Результат для отчета, который не удалось распарсить"""
+    return {
+        "personal_info": {},
+        "total_debt": 0.0,
+        "total_monthly_payment": 0.0,
+        "total_obligations": 0,
+        "overdue_obligations": 0,
+        "obligations": [],
+        "parsing_error": True
+    }
+
 def extract_credit_data_with_total(text: str) -> Dict:
     """Основная функция для извлечения данных из кредитного отчета"""
     parser = create_parser_chain()
@@ -1905,31 +1918,35 @@ def extract_credit_data_with_total(text: str) -> Dict:
     
     if not result:
         logger.error("Не удалось распарсить кредитный отчет")
-        return {
-            "personal_info": {},
-            "total_debt": 0.0,
-            "total_monthly_payment": 0.0,
-            "total_obligations": 0,
-            "overdue_obligations": 0,
-            "obligations": [],
-            "parsing_error": True
-        }
+        return empty_parse_result()
     # Добавляем извлечённые залоги
-    result["collaterals"] = extract_collateral_info(text)
+    result["collaterals"] = parse_cache.get_or_compute(text, "collaterals", lambda: extract_collateral_info(text))
 
     return result
 
+# Один клиент MongoDB на процесс: у MongoClient свой пул соединений,
+# новый клиент на каждый отчет - это новое подключение и handshake
+_mongo_client = None
+_mongo_client_lock = threading.Lock()
+
+
+def get_reports_db():
+    """База telegram_bot через общий для процесса MongoClient (создается при первом обращении)"""
+    global _mongo_client
+    if _mongo_client is None:
+        with _mongo_client_lock:
+            if _mongo_client is None:
+                _mongo_client = MongoClient(os.getenv("MONGO_URI"))
+    return _mongo_client["telegram_bot"]
+
 # Новая функция: Парсинг отчета напрямую из MongoDB
 def parse_credit_report_from_mongodb(report_id, collection_name="documents"):
     """Парсит кредитный отчет напрямую из MongoDB независимо от языка отчета"""
     try:
-        # Подключение к MongoDB
-        client = MongoClient(os.getenv("MONGO_URI"))
-        db = client["telegram_bot"]
-        collection = db[collection_name]
+        collection = get_reports_db()[collection_name]
         
-        # Этап 1: Получаем документ
-        document = collection.find_one({"_id": ObjectId(report_id)})
+        # Этап 1: Получаем документ (нужен только текст)
+        document = collection.find_one({"_id": ObjectId(report_id)}, {"text": 1})
         
         if not document:
             logger.error(f"Документ с ID {report_id} не найден в коллекции {collection_name}")
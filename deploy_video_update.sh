@@ -24,6 +24,9 @@ fi
 echo "🔄 3. Обновляем базу данных..."
 python seed_video_production.py
 
+echo "📚 Обновляем индекс базы знаний юриста (только если docs/ изменились)..."
+python legal_engine.py --build-index
+
 echo "🔄 4. Перезапускаем бота..."
 pkill -f "python main.py"
 sleep 2
@@ -3,7 +3,7 @@
 from pymongo import MongoClient
 import os
 from datetime import datetime
-from text_extractor import extract_text_from_pdf_enhanced as extract_text_from_pdf
+from text_extractor import extract_text_mixed as extract_text_from_pdf
 from ocr import ocr_file, detect_document_type
 from dotenv import load_dotenv
 import hashlib
@@ -30,14 +30,19 @@ docs_collection = db['documents']
 
 # В файле document_processor.py замените функцию process_uploaded_file:
 
-def process_uploaded_file(filepath, user_id):
-    # 1. Извлекаем текст из PDF с улучшенными параметрами
-    text = extract_text_from_pdf(filepath)  # Теперь использует pdfminer.six
-    
-    # 2. Если текста нет — используем OCR
-    if not text.strip():
-        print(f"[INFO] Основное извлечение не дало результата, используем OCR...")
-        text = ocr_file(filepath)
+def process_uploaded_file(filepath, user_id, text=None):
+    """
+    Определяет тип загруженного документа (в DEBUG сохраняет извлеченный текст в файл).
+    Если текст уже извлечен (UploadPipeline), повторно PDF не разбираем.
+    """
+    if text is None:
+        # 1. Извлекаем текст из PDF с улучшенными параметрами
+        text = extract_text_from_pdf(filepath)  # pdfminer.six + OCR только страниц-сканов
+        
+        # 2. Если текста нет — используем OCR
+        if not text.strip():
+            print(f"[INFO] Основное извлечение не дало результата, используем OCR...")
+            text = ocr_file(filepath)
     
     # Остальной код остается без изменений...
     if DEBUG_MODE:
@@ -58,3 +63,10 @@ def process_uploaded_file(filepath, user_id):
             # print(f"[DEBUG] Текст сохранен в {debug_filename}")
         except Exception as debug_error:
             print(f"[ERROR] Не удалось сохранить debug файл: {debug_error}")
+
+    # 3. Определяем тип документа
+    doc_type = detect_document_type(text)
+
+    return {
+        "type": doc_type
+    }
@@ -0,0 +1,172 @@
+# format_detector.py
+"""
+Определение формата кредитного отчета: каждый признак ищется в тексте один раз.
+
+Раньше каждый парсер цепочки (GKB → PKB → Detailed → Short → Kazakh → Fallback)
+сам искал свои строки-признаки в тексте, и одни и те же признаки искались
+по несколько раз. Здесь каждый признак ищется в тексте не больше одного раза,
+результат запоминается для текста, а парсеры цепочки только читают его
+(правила те же, что были в can_parse).
+
+Regex-альтернация по всем признакам и Aho-Corasick на чистом Python оказались
+в 4-20 раз медленнее встроенного поиска подстроки (str.__contains__) на тексте
+отчета, поэтому признаки ищутся им.
+
+Диагностика:
+    python format_detector.py report.txt
+"""
+
+import json
+import sys
+
+from text_memo import RecentTexts
+
+GKB_INDICATORS = (
+    "Государственное кредитное бюро",
+    "Персональный кредитный отчет",
+    "Номер договора:",
+    "Дата начала срока действия контракта:",
+    "Обязательство 1",
+)
+# Признаки ПКБ, при которых отчет не считается отчетом ГКБ
+GKB_EXCLUDE_INDICATORS = (
+    "ПОЛНЫЙ ПЕРСОНАЛЬНЫЙ КРЕДИТНЫЙ ОТЧЕТ",
+    "Итого:",
+)
+PKB_INDICATORS = (
+    "ПОЛНЫЙ ПЕРСОНАЛЬНЫЙ КРЕДИТНЫЙ ОТЧЕТ",
+    "ПЕРСОНАЛЬНЫЙ КРЕДИТНЫЙ РЕЙТИНГ",
+    "ДОГОВОРЫ В КРЕДИТНОЙ ИСТОРИИ",
+)
+DETAILED_INDICATORS = (
+    "ПОДРОБНАЯ ИНФОРМАЦИЯ ПО ДЕЙСТВУЮЩИМ ДОГОВОРАМ",
+    "ПОЛНЫЙ ПЕРСОНАЛЬНЫЙ КРЕДИТНЫЙ ОТЧЕТ",
+)
+SHORT_INDICATORS = (
+    "ОБЩАЯ ИНФОРМАЦИЯ ПО ОБЯЗАТЕЛЬСТВАМ",
+    "Персональный кредитный отчет (краткая форма)",
+)
+KAZAKH_INDICATORS = (
+    "ҚОЛДАНЫСТАҒЫ ШАРТТАР",
+)
+# Русский заголовок, при котором казахский парсер отказывается от отчета
+KAZAKH_EXCLUDE_INDICATORS = (
+    "ПОДРОБНАЯ ИНФОРМАЦИЯ ПО ДЕЙСТВУЮЩИМ ДОГОВОРАМ",
+)
+
+# Порядок форматов в create_parser_chain()
+FORMAT_ORDER = ("GKB", "PKB", "DETAILED", "SHORT", "KAZAKH", "FALLBACK")
+
+ALL_INDICATORS = tuple(dict.fromkeys(
+    GKB_INDICATORS + GKB_EXCLUDE_INDICATORS + PKB_INDICATORS + DETAILED_INDICATORS
+    + SHORT_INDICATORS + KAZAKH_INDICATORS + KAZAKH_EXCLUDE_INDICATORS
+))
+
+# Признаки, которые содержатся внутри другого признака
+_CONTAINED = {
+    indicator: tuple(other for other in ALL_INDICATORS if other != indicator and other in indicator)
+    for indicator in ALL_INDICATORS
+}
+
+_detections = RecentTexts(max_items=4)
+
+
+class FormatDetection:
+    """
+    Признаки, баллы по форматам и итоговый формат отчета.
+
+    Признаки ищутся лениво и не больше одного раза на текст: звенья цепочки
+    спрашивают только свои признаки, как и раньше в can_parse, но уже
+    найденные другими звеньями признаки повторно не ищутся.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self._found = {}
+
+    def has(self, indicator: str) -> bool:
+        """Есть ли признак в тексте"""
+        found = self._found.get(indicator)
+        if found is None:
+            # Признак, содержащий другой признак, не ищем, если вложенного нет
+            found = all(self.has(part) for part in _CONTAINED[indicator]) and indicator in self.text
+            self._found[indicator] = found
+        return found
+
+    def _count(self, indicators) -> int:
+        return sum(1 for indicator in indicators if self.has(indicator))
+
+    def accepts(self, report_format: str) -> bool:
+        """Подходит ли отчет парсеру формата report_format"""
+        if report_format == "GKB":
+            # Хотя бы 3 признака ГКБ и ни одного признака ПКБ
+            if any(self.has(indicator) for indicator in GKB_EXCLUDE_INDICATORS):
+                return False
+            return self._count(GKB_INDICATORS) >= 3
+        if report_format == "PKB":
+            return any(self.has(indicator) for indicator in PKB_INDICATORS)
+        if report_format == "DETAILED":
+            return any(self.has(indicator) for indicator in DETAILED_INDICATORS)
+        if report_format == "SHORT":
+            return any(self.has(indicator) for indicator in SHORT_INDICATORS)
+        if report_format == "KAZAKH":
+            # Если есть и казахские, и русские заголовки - это русский отчет
+            return (any(self.has(indicator) for indicator in KAZAKH_INDICATORS)
+                    and not any(self.has(indicator) for indicator in KAZAKH_EXCLUDE_INDICATORS))
+        if report_format == "FALLBACK":
+            return True
+        raise ValueError(f"Неизвестный формат отчета: {report_format}")
+
+    @property
+    def report_format(self) -> str:
+        """Формат, который выберет полная цепочка парсеров"""
+        for report_format in FORMAT_ORDER:
+            if self.accepts(report_format):
+                return report_format
+        return "FALLBACK"
+
+    @property
+    def found(self) -> frozenset:
+        """Все признаки, найденные в тексте (ищет оставшиеся)"""
+        return frozenset(indicator for indicator in ALL_INDICATORS if self.has(indicator))
+
+    @property
+    def scores(self) -> dict:
+        """Число найденных признаков по каждому формату (для диагностики)"""
+        return {
+            "GKB": self._count(GKB_INDICATORS),
+            "GKB_EXCLUDE": self._count(GKB_EXCLUDE_INDICATORS),
+            "PKB": self._count(PKB_INDICATORS),
+            "DETAILED": self._count(DETAILED_INDICATORS),
+            "SHORT": self._count(SHORT_INDICATORS),
+            "KAZAKH": self._count(KAZAKH_INDICATORS),
+            "KAZAKH_EXCLUDE": self._count(KAZAKH_EXCLUDE_INDICATORS),
+        }
+
+    def as_dict(self) -> dict:
+        return {
+            "format": self.report_format,
+            "scores": self.scores,
+            "found": sorted(self.found),
+        }
+
+
+def find_indicators(text: str) -> frozenset:
+    """Все признаки форматов, которые есть в тексте"""
+    return detect_format(text).found
+
+
+def detect_format(text: str) -> FormatDetection:
+    """
+    Определение формата для текста. Для недавних текстов возвращается то же
+    определение, поэтому звенья одной цепочки не сканируют текст заново.
+    """
+    return _detections.get_or_create(text, FormatDetection)
+
+
+if __name__ == "__main__":
+    for path in sys.argv[1:]:
+        with open(path, encoding="utf-8") as f:
+            result = detect_format(f.read()).as_dict()
+        print(path)
+        print(json.dumps(result, ensure_ascii=False, indent=2))
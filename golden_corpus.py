@@ -0,0 +1,254 @@
+# golden_corpus.py
+"""
+Эталонный корпус кредитных отчетов для регрессионных тестов парсеров.
+
+В golden_corpus/ лежат обезличенные извлеченные тексты (<имя>.txt) и ожидаемый
+результат цепочки парсеров (<имя>.expected.json): формат, obligations,
+total_debt, overdue_obligations и collaterals. baseline_timings.json - медианы
+времени разбора каждым парсером на машине, где гоняются тесты производительности.
+Проверяет корпус test_golden_corpus.py; сравнение скорости с базой включается
+GOLDEN_SPEED_TESTS=1 (нужен pytest-benchmark из requirements-dev.txt) и имеет смысл
+только на той же машине, где сохранена база.
+
+Запуск:
+    python golden_corpus.py --add debug_text_output_123.txt gkb_big   # обезличить и добавить текст
+    python golden_corpus.py --update            # пересохранить ожидаемые результаты (смотреть git diff!)
+    python golden_corpus.py --save-baseline     # пересохранить базовые замеры времени
+    python golden_corpus.py --pdf short         # PDF из текста корпуса (для тестов извлечения)
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+import time
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden_corpus")
+BASELINE_FILE = os.path.join(CORPUS_DIR, "baseline_timings.json")
+
+# Поля результата, которые сверяются с эталоном
+COMPARED_FIELDS = ("total_debt", "total_obligations", "overdue_obligations", "obligations", "collaterals")
+
+# Какой парсер (и каким методом) разбирает отчет каждого формата
+FORMAT_PARSERS = {
+    "GKB": "GKBParser",
+    "PKB": "FinalPKBParser",
+    "DETAILED": "DetailedParser",
+    "SHORT": "ShortParser",
+    "KAZAKH": "KazakhParser",
+    "FALLBACK": "FallbackParser",
+}
+
+# ========== Обезличивание ==========
+
+# Значения субъекта отчета: каждое найденное значение заменяется во всем тексте
+_PERSONAL_FIELDS = [
+    re.compile(r"^(?:Фамилия|Имя|Отчество|Тегі|Аты|Әкесінің аты):[ \t]*([^\n]+)$", re.MULTILINE),
+    re.compile(r"^(?:ИИН|ЖСН|Дата рождения|Туған күні|Регистрационный ID):[ \t]*([^\n]+)$", re.MULTILINE),
+    re.compile(r"^(?:Моб\. тел\.|Раб\.тел\.|Дом\.тел\.|E-mail):[ \t]*([^\n]+)$", re.MULTILINE),
+    re.compile(r"Номер кредитного отчета:\s*(\d+)"),
+]
+# Номера договоров и документов: заменяются номером по порядку в том же формате,
+# чтобы разные договоры остались разными (парсеры сверяют пары кредитор - договор)
+_ACCOUNT_FIELDS = [
+    re.compile(r"^(?:Код контракта|Номер договора|Номер родительского контракта|Номер счета|IBAN):[ \t]*([^\n]+)$",
+               re.MULTILINE),
+    re.compile(r"^(?:Номер документа|НОМЕР ДОКУМЕНТА|Номер):[ \t]*([^\n]*\d[^\n]*)$", re.MULTILINE),
+    re.compile(r"^Удостоверение\s+личности\s+(\d{6,})$", re.MULTILINE),
+]
+# Адрес: значение может продолжаться на следующей непустой строке
+_STREET = re.compile(r"^Улица:[ \t]*([^\n]+)\n\s*\n?([^\n:]*)$", re.MULTILINE)
+_DEBUG_HEADER = re.compile(r"\A=== DEBUG OUTPUT.*?\n={20,}\n+", re.DOTALL)
+_NO_DATA = "Нет данных"
+
+
+def _placeholder(value):
+    """Цифры -> нули (формат дат и номеров сохраняется), остальное -> «Аноним»"""
+    if re.fullmatch(r"[\d\s.+()-]+", value):
+        return re.sub(r"\d", "0", value)
+    return "Аноним"
+
+
+def _numbered_placeholder(value, number):
+    """Цифры значения -> порядковый номер с ведущими нулями, буквы и разделители остаются"""
+    width = len(re.findall(r"\d", value))
+    if width < len(str(number)):
+        return re.sub(r"\d", "0", value) + f"-{number}"
+    digits = iter(str(number).zfill(width))
+    return re.sub(r"\d", lambda _: next(digits), value)
+
+
+def anonymize(text):
+    """
+    Убирает персональные данные субъекта (ФИО, ИИН, контакты, адрес, номера отчета)
+    и номера договоров, счетов и документов
+    """
+    text = _DEBUG_HEADER.sub("", text)
+
+    accounts = {}
+    for pattern in _ACCOUNT_FIELDS:
+        for match in pattern.finditer(text):
+            value = match.group(1).strip()
+            if value and value != _NO_DATA and value not in accounts:
+                accounts[value] = None
+    # Номера по порядку первого появления: результат не зависит от запуска
+    first_seen = sorted(accounts, key=text.find)
+    replacements = {value: _numbered_placeholder(value, number) for number, value in enumerate(first_seen, 1)}
+
+    values = set()
+    for pattern in _PERSONAL_FIELDS:
+        for match in pattern.finditer(text):
+            values.add(match.group(1).strip())
+    for match in _STREET.finditer(text):
+        for line in match.groups():
+            values.update(word for word in re.findall(r"[^\s,.]+", line) if len(word) >= 5 and word[0].isupper())
+    values.discard(_NO_DATA)
+    values.discard("")
+
+    for value in values - replacements.keys():
+        replacement = _placeholder(value)
+        replacements[value] = replacement
+        replacements.setdefault(value.upper(), replacement)
+
+    if not replacements:
+        return text
+    # Один проход, длинные значения первыми: замена не попадает внутрь другой замены
+    pattern = re.compile("|".join(re.escape(value) for value in sorted(replacements, key=len, reverse=True)))
+    return pattern.sub(lambda match: replacements[match.group(0)], text)
+
+
+# ========== Корпус ==========
+
+def load_cases():
+    """Список (имя, текст, ожидаемый результат) в алфавитном порядке"""
+    cases = []
+    for name in sorted(os.listdir(CORPUS_DIR)):
+        if not name.endswith(".txt"):
+            continue
+        case = name[:-len(".txt")]
+        with open(os.path.join(CORPUS_DIR, name), encoding="utf-8") as f:
+            text = f.read()
+        expected = None
+        expected_path = os.path.join(CORPUS_DIR, f"{case}.expected.json")
+        if os.path.exists(expected_path):
+            with open(expected_path, encoding="utf-8") as f:
+                expected = json.load(f)
+        cases.append((case, text, expected))
+    return cases
+
+
+def parse_case(text):
+    """Результат цепочки парсеров в виде, который хранится в эталоне"""
+    from credit_parser import extract_credit_data_with_total
+    from format_detector import detect_format
+
+    result = extract_credit_data_with_total(text)
+    report_format = detect_format(text).report_format
+    actual = {"format": report_format, "parser": FORMAT_PARSERS[report_format]}
+    for field in COMPARED_FIELDS:
+        actual[field] = result.get(field)
+    # Через JSON, чтобы сравнивать с эталоном в одинаковом виде (кортежи, float)
+    return json.loads(json.dumps(actual, ensure_ascii=False, default=str))
+
+
+def parser_function(parser_name):
+    """Функция разбора текста отдельным парсером (без цепочки и кэша)"""
+    import credit_parser
+    from improved_pkb_parser import FinalPKBParser
+
+    if parser_name == "FinalPKBParser":
+        return FinalPKBParser().parse
+    return getattr(credit_parser, parser_name)().extract_data
+
+
+def time_parser(parser_name, text, repeat=30):
+    """Медиана времени разбора в миллисекундах (после одного прогрева)"""
+    parse = parser_function(parser_name)
+    parse(text)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(text)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def load_baseline():
+    if not os.path.exists(BASELINE_FILE):
+        return {}
+    with open(BASELINE_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_sample_pdf(text, path, lines_per_page=15, font_size=8, line_step=14):
+    """
+    PDF из текста корпуса: строка текста = строка PDF, lines_per_page строк на странице.
+    Шрифт - встроенный в PyMuPDF шрифт с кириллицей, в файл попадает только подмножество глифов.
+    """
+    import fitz  # PyMuPDF
+
+    font = fitz.Font("cjk")
+    lines = text.splitlines()
+    with fitz.open() as doc:
+        for start in range(0, len(lines), lines_per_page):
+            page = doc.new_page()
+            page.insert_font(fontname="F0", fontbuffer=font.buffer)
+            for i, line in enumerate(lines[start:start + lines_per_page]):
+                page.insert_text((40, 50 + i * line_step), line, fontname="F0", fontsize=font_size)
+        doc.subset_fonts()
+        doc.save(path, garbage=4, deflate=True)
+
+
+def _write_json(path, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Эталонный корпус отчетов для тестов парсеров")
+    arg_parser.add_argument("--add", nargs=2, metavar=("TEXT", "NAME"), help="Обезличить текст и добавить в корпус")
+    arg_parser.add_argument("--update", action="store_true", help="Пересохранить ожидаемые результаты")
+    arg_parser.add_argument("--save-baseline", action="store_true", help="Пересохранить базовые замеры времени")
+    arg_parser.add_argument("--pdf", metavar="NAME", help="Сохранить golden_corpus/NAME.pdf из NAME.txt")
+    arg_parser.add_argument("--repeat", type=int, default=30, help="Повторов на замер")
+    args = arg_parser.parse_args()
+
+    if not (args.add or args.update or args.save_baseline or args.pdf):
+        arg_parser.print_help()
+        return 2
+
+    if args.add:
+        source, name = args.add
+        with open(source, encoding="utf-8") as f:
+            text = anonymize(f.read())
+        with open(os.path.join(CORPUS_DIR, f"{name}.txt"), "w", encoding="utf-8") as f:
+            f.write(text)
+        _write_json(os.path.join(CORPUS_DIR, f"{name}.expected.json"), parse_case(text))
+        print(f"✅ Добавлен {name}: проверьте обезличивание и {name}.expected.json")
+
+    if args.update:
+        for name, text, _ in load_cases():
+            _write_json(os.path.join(CORPUS_DIR, f"{name}.expected.json"), parse_case(text))
+            print(f"💾 {name}.expected.json")
+
+    if args.save_baseline:
+        baseline = {}
+        for name, text, expected in load_cases():
+            parser_name = (expected or parse_case(text))["parser"]
+            baseline[name] = {"parser": parser_name, "median_ms": round(time_parser(parser_name, text, args.repeat), 4)}
+            print(f"⏱ {name} [{parser_name}] {baseline[name]['median_ms']:.3f} мс")
+        _write_json(BASELINE_FILE, baseline)
+
+    if args.pdf:
+        with open(os.path.join(CORPUS_DIR, f"{args.pdf}.txt"), encoding="utf-8") as f:
+            write_sample_pdf(f.read(), os.path.join(CORPUS_DIR, f"{args.pdf}.pdf"))
+        print(f"📄 {args.pdf}.pdf")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
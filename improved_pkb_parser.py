@@ -4,6 +4,8 @@ import os
 from typing import Dict, List, Optional
 
 from collateral_parser import extract_collateral_info
+import regex_patterns as rx
+import report_sections as rs
 
 
 # Настройка логирования
@@ -25,7 +27,7 @@ def clean_number(value: str) -> float:
     if not value:
         return 0.0
     # Убираем все нечисловые символы кроме точки и запятой
-    cleaned = re.sub(r'[^\d.,]', '', str(value))
+    cleaned = rx.NON_NUMERIC.sub('', str(value))
     # Заменяем запятую на точку для дробной части
     cleaned = cleaned.replace(',', '.')
     # Убираем лишние точки (оставляем только последнюю как разделитель дробной части)
@@ -52,10 +54,7 @@ class FinalPKBParser:
         personal_info = {}
         
         # Извлечение ФИО и даты рождения из заголовка
-        header_match = re.search(
-            r'(\d{2}\.\d{2}\.\d{4} \d{2}:\d{2}:\d{2})\s*\n([А-ЯЁІӘӨҰҚҢҮҺ\s]+)\s*\((\d{2}\.\d{2}\.\d{4}) г\.р\.\)',
-            text
-        )
+        header_match = rx.PKB_HEADER.search(text)
         
         if header_match:
             full_name_raw = header_match.group(2).strip()
@@ -65,17 +64,17 @@ class FinalPKBParser:
             personal_info["birth_date"] = birth_date
         
         # ИИН
-        iin_match = re.search(r'ИИН:\s*(\d{12})', text)
+        iin_match = rx.PKB_IIN.search(text)
         if iin_match:
             personal_info["iin"] = iin_match.group(1)
         
         # Адрес
-        address_match = re.search(r'МЕСТО ЖИТЕЛЬСТВА:\s*([^\n]+)', text)
+        address_match = rx.PKB_ADDRESS.search(text)
         if address_match:
             personal_info["address"] = address_match.group(1).strip()
         
         # Номер документа
-        doc_match = re.search(r'НОМЕР ДОКУМЕНТА:\s*(\d+)', text)
+        doc_match = rx.PKB_DOCUMENT_NUMBER.search(text)
         if doc_match:
             personal_info["document_number"] = doc_match.group(1)
         
@@ -92,15 +91,8 @@ class FinalPKBParser:
         }
         
         # Паттерны для поиска чисел перед ключевыми фразами
-        patterns = [
-            (r"(\d+)\s+Действующие договоры без просрочки", "active_without_overdue"),
-            (r"(\d+)\s+Действующие договоры с просрочкой", "active_with_overdue"),
-            (r"(\d+)\s+Завершенные договоры без просрочки", "completed_without_overdue"),
-            (r"(\d+)\s+Завершенные договоры с просрочкой", "completed_with_overdue")
-        ]
-        
-        for pattern, key in patterns:
-            match = re.search(pattern, text)
+        for pattern, key in rx.PKB_CONTRACT_SUMMARY:
+            match = pattern.search(text)
             if match:
                 summary[key] = int(match.group(1))
                 self.logger.info(f"Найдено {key}: {summary[key]}")
@@ -121,22 +113,18 @@ class FinalPKBParser:
         }
         
         # Ищем таблицу активных договоров и строку "Итого:" в ней
-        active_section = re.search(
-            r'ИНФОРМАЦИЯ ПО ДЕЙСТВУЮЩИМ КРЕДИТНЫМ ДОГОВОРАМ.*?Итого:\s*\n(.*?)(?=ИНФОРМАЦИЯ|$)',
-            text, 
-            re.DOTALL
-        )
+        active_section = rx.PKB_ACTIVE_TOTALS.search(text)
         
         if not active_section:
             # Альтернативный поиск
-            active_section = re.search(r"Итого:\s*(.+?)(?:\n|\r\n|$)", text)
+            active_section = rx.PKB_TOTALS_LINE.search(text)
         
         if active_section:
             itogo_line = active_section.group(1)
             self.logger.info(f"Найдена строка Итого для АКТИВНЫХ договоров: {itogo_line}")
             
             # Извлекаем все суммы в KZT из строки
-            amounts = re.findall(r"([\d\s.,]+)\s*KZT", itogo_line)
+            amounts = rx.KZT_AMOUNT.findall(itogo_line)
             self.logger.info(f"Найденные суммы в итоговой строке: {amounts}")
             
             if len(amounts) >= 6:  # В отчете 6 сумм в итоговой строке
@@ -158,8 +146,8 @@ class FinalPKBParser:
             if not value:
                 return 0.0
             # Убираем даты из строки
-            value = re.sub(r"\b\d{1,2}\.\d{1,2}\.\d{4}\b", "", str(value))
-            cleaned = re.sub(r"[^\d.,]", "", value)
+            value = rx.DATE_IN_TEXT.sub("", str(value))
+            cleaned = rx.NON_NUMERIC.sub("", value)
             cleaned = cleaned.replace(",", ".")
             if '.' in cleaned:
                 parts = cleaned.split('.')
@@ -172,27 +160,20 @@ class FinalPKBParser:
 
         def split_by_creditor_markers(text: str) -> List[str]:
             # Разбиваем по началу договоров
-            parts = re.split(r"(?=(?:Займ|Кредит)\s+[^\n]+)", text)
+            parts = rx.PKB_CREDITOR_SPLIT.split(text)
             return [p.strip() for p in parts if p.strip()]
 
         def parse_creditor_block(block: str) -> Optional[Dict]:
             try:
                 # Убираем даты из блока
-                block = re.sub(r"\b\d{1,2}\.\d{1,2}\.\d{4}\b", "", block)
+                block = rx.DATE_IN_TEXT.sub("", block)
                 
                 # ИСПРАВЛЕНО: Улучшенный поиск названия кредитора
                 creditor_match = None
                 
-                # Паттерн 1: Кредитная карта/Займ + название + Заёмщик
-                patterns = [
-                    r'(?:Кредитная карта|Займ|Кредит)\s+(.*?)\s+Заёмщик',  # Основной паттерн включая "Кредитная карта"
-                    r'\b(АО|ТОО|СФК)\s+["""«][^"""«»]+["""»]',                   # ✅ Добавлен СФК
-                    r'\b(АО|ТОО|СФК)\s+"[^"]+?"',                               # ✅ Добавлен СФК
-                    r'\b(АО|ТОО|СФК)\s+[^\n\r\t]+?(?=\s+Заёмщик)',             # ✅ Добавлен СФК
-                ]
-                
-                for pattern in patterns:
-                    creditor_match = re.search(pattern, block, re.DOTALL)
+                # Паттерн 1: Кредитная карта/Займ + название + Заёмщик, затем АО/ТОО/СФК
+                for pattern in rx.PKB_CREDITOR_NAME:
+                    creditor_match = pattern.search(block)
                     if creditor_match:
                         if len(creditor_match.groups()) > 0:
                             creditor = creditor_match.group(1).strip()
@@ -203,10 +184,10 @@ class FinalPKBParser:
                 if not creditor_match:
                     creditor = "Неизвестный"
                 # Убираем переносы строк и лишние пробелы
-                creditor = re.sub(r'\s+', ' ', creditor).strip()
+                creditor = rx.WHITESPACE.sub(' ', creditor).strip()
                 
                 # Извлекаем все суммы KZT
-                kzt_values = re.findall(r"([\d\s.,]+)\s*KZT", block)
+                kzt_values = rx.KZT_AMOUNT.findall(block)
                 amounts = [clean_number_local(val) for val in kzt_values]
                 
                 if len(amounts) < 4:
@@ -223,14 +204,14 @@ class FinalPKBParser:
                 overdue_days = 0
                 
                 # Метод 1: Ищем в детальной секции "Количество дней просрочки: XXX"
-                detailed_days_match = re.search(r'Количество дней просрочки:\s*(\d+)', block)
+                detailed_days_match = rx.OVERDUE_DAYS_FIELD.search(block)
                 if detailed_days_match:
                     overdue_days = int(detailed_days_match.group(1))
                     self.logger.info(f"Найдены дни просрочки (детальная секция): {overdue_days}")
                 else:
                     # Метод 2: Ищем паттерн "число пробел число" для дней типа "1 156"
                     # Структура: ... KZT [дни_часть1] [дни_часть2] [штрафы/статус]
-                    spaced_days_match = re.search(r'KZT\s+(\d{1,2})\s+(\d{2,3})\s+(?:0\s*KZT|-)', block)
+                    spaced_days_match = rx.PKB_SPACED_DAYS.search(block)
                     if spaced_days_match:
                         part1 = spaced_days_match.group(1)
                         part2 = spaced_days_match.group(2)
@@ -241,7 +222,7 @@ class FinalPKBParser:
                     
                     # Метод 3: Ищем одно число после KZT (без пробелов)
                     if overdue_days == 0:
-                        single_days_match = re.search(r'KZT\s+(\d{3,4})\s+(?:0\s*KZT|-)', block)
+                        single_days_match = rx.PKB_SINGLE_DAYS.search(block)
                         if single_days_match:
                             candidate_days = int(single_days_match.group(1))
                             if 30 <= candidate_days <= 3000:
@@ -251,11 +232,11 @@ class FinalPKBParser:
                     # Метод 4: Поиск всех чисел в строке и фильтрация
                     if overdue_days == 0:
                         # Ищем все числа, исключая суммы KZT
-                        text_without_kzt = re.sub(r'[\d\s.,]+\s*KZT', ' REMOVED_KZT ', block)
+                        text_without_kzt = rx.KZT_AMOUNT_SPAN.sub(' REMOVED_KZT ', block)
                         
                         # Ищем отдельные числа и пары чисел
-                        single_numbers = re.findall(r'\b(\d{3,4})\b', text_without_kzt)
-                        paired_numbers = re.findall(r'\b(\d{1,2})\s+(\d{2,3})\b', text_without_kzt)
+                        single_numbers = rx.PKB_SINGLE_NUMBER.findall(text_without_kzt)
+                        paired_numbers = rx.PKB_PAIRED_NUMBER.findall(text_without_kzt)
                         
                         # Проверяем пары чисел (приоритет)
                         for pair in paired_numbers:
@@ -279,12 +260,12 @@ class FinalPKBParser:
                 last_payment_date = ""
                 
                 # Поиск суммы последнего платежа
-                payment_amount_match = re.search(r'Сумма последнего платежа:\s*([\d.,]+)\s*KZT', block)
+                payment_amount_match = rx.PKB_LAST_PAYMENT_AMOUNT.search(block)
                 if payment_amount_match:
                     last_payment_amount = clean_number_local(payment_amount_match.group(1))
                 
                 # Поиск даты последнего платежа  
-                payment_date_match = re.search(r'Дата последнего платежа:\s*(\d{2}\.\d{2}\.\d{4})', block)
+                payment_date_match = rx.PKB_LAST_PAYMENT_DATE.search(block)
                 if payment_date_match:
                     last_payment_date = payment_date_match.group(1)
                 
@@ -307,18 +288,15 @@ class FinalPKBParser:
                 self.logger.error(f"Ошибка парсинга блока кредитора: {e}")
                 return None
 
-        # Находим секцию активных договоров
-        active_section_match = re.search(
-            r'ИНФОРМАЦИЯ ПО ДЕЙСТВУЮЩИМ КРЕДИТНЫМ ДОГОВОРАМ(.*?)(?=ИНФОРМАЦИЯ ИЗ ДОПОЛНИТЕЛЬНЫХ|ЗАВЕРШЕННЫЕ ДОГОВОРЫ|$)',
-            text,
-            re.DOTALL
-        )
+        # Находим секцию активных договоров (по индексу разделов)
+        sections = rs.index_sections(text)
+        active_section = sections.section(rs.PKB_ACTIVE, (rs.PKB_ADDITIONAL, rs.PKB_COMPLETED))
         
-        if not active_section_match:
+        if not active_section:
             self.logger.warning("Не найдена секция с активными договорами")
             return []
         
-        active_text = active_section_match.group(1)
+        active_text = sections.slice(active_section)
         self.logger.info("Работаем только с секцией активных договоров")
         
         # Разбиваем на блоки и парсим
@@ -466,18 +444,18 @@ class FinalPKBParser:
         """
         def improved_normalize_creditor_name(name: str) -> str:
             # Унификация кавычек и очистка формы собственности
-            name = re.sub(r'[«»„“”]', '"', name)
+            name = rx.CREDITOR_QUOTES.sub('"', name)
             name = name.replace('""', '"')
-            name = re.sub(r'\b(тоо|ао|оао|зао|ооо|сфк)\b', '', name, flags=re.IGNORECASE)
-            name = re.sub(r'\bс правом обратного выкупа\b', '', name, flags=re.IGNORECASE)
-            name = re.sub(r'[^\w\s"()-]', '', name)  # удаляем лишние символы кроме букв/цифр/скобок
-            name = re.sub(r'\s+', ' ', name).strip(' "\n\r')
+            name = rx.CREDITOR_LEGAL_FORM.sub('', name)
+            name = rx.CREDITOR_BUYBACK.sub('', name)
+            name = rx.CREDITOR_EXTRA_CHARS.sub('', name)  # удаляем лишние символы кроме букв/цифр/скобок
+            name = rx.WHITESPACE.sub(' ', name).strip(' "\n\r')
             return name.lower()
 
         def normalize_display_name(name: str) -> str:
-            name = re.sub(r'[«»„“”]', '"', name)
+            name = rx.CREDITOR_QUOTES.sub('"', name)
             name = name.replace('""', '"')
-            name = re.sub(r'\bс правом обратного выкупа\b', '', name, flags=re.IGNORECASE)
+            name = rx.CREDITOR_BUYBACK.sub('', name)
             return name.strip(' "\'\n\r')
 
         groups = {}
@@ -506,9 +484,9 @@ class FinalPKBParser:
 
     def _normalize_creditor_display(self, name: str) -> str:
         """Нормализует имя кредитора для вывода пользователю"""
-        name = re.sub(r'[«»„“”]', '"', name)
+        name = rx.CREDITOR_QUOTES.sub('"', name)
         name = name.replace('""', '"')
-        name = re.sub(r'\bс правом обратного выкупа\b', '', name, flags=re.IGNORECASE)
+        name = rx.CREDITOR_BUYBACK.sub('', name)
         name = name.strip(' "\')')
         return name.strip()
 
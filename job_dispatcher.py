@@ -0,0 +1,249 @@
+# job_dispatcher.py
+"""
+Диспетчер тяжелых задач бота, чтобы обработчики Telegram не занимали потоки polling.
+
+Задача пользователя (обработчик целиком: скачивание, запросы к LLM, ответы в чат)
+выполняется в пуле потоков DISPATCHER_IO_WORKERS. Одновременно у пользователя
+может быть не больше DISPATCHER_PER_USER_LIMIT задач, лишние отклоняются.
+CPU-шаги внутри задачи (извлечение текста, OCR, парсинг, генерация PDF) уходят
+в пул процессов DISPATCHER_CPU_WORKERS через run_cpu: функция и аргументы
+должны сериализоваться pickle (функции уровня модуля, данные без объектов Mongo).
+Ответ пользователю отправляет сама задача, когда получает результат run_cpu.
+
+OCR внутри CPU-шага выполняется в том же процессе пула (OCR_WORKERS=1): вложенный
+пул OCR в каждом процессе дал бы порядка cpu_count² процессов. Если процесс пула
+умер (например, OOM на большом скане), пул пересоздается при следующем шаге.
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+import sys
+import traceback
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Потоков для задач пользователей (ожидание Telegram, Mongo, LLM)
+DISPATCHER_IO_WORKERS = int(os.getenv("DISPATCHER_IO_WORKERS", "16"))
+# Процессов для CPU-шагов (0 - выполнять в потоке задачи, без пула процессов)
+DISPATCHER_CPU_WORKERS = int(os.getenv("DISPATCHER_CPU_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+# Сколько задач одного пользователя может быть в очереди и в работе одновременно
+DISPATCHER_PER_USER_LIMIT = int(os.getenv("DISPATCHER_PER_USER_LIMIT", "1"))
+
+
+class UserLimitExceeded(Exception):
+    """У пользователя уже выполняется максимум задач"""
+
+
+class _KindStats:
+    def __init__(self):
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.wait_s = 0.0
+        self.run_s = 0.0
+
+    def as_dict(self):
+        finished = self.completed + self.failed
+        return {
+            "queued": self.queued,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_wait_s": round(self.wait_s / finished, 3) if finished else 0.0,
+            "avg_run_s": round(self.run_s / finished, 3) if finished else 0.0,
+        }
+
+
+class JobDispatcher:
+    """
+    Пул потоков для задач пользователей и пул процессов для CPU-шагов.
+    Пулы создаются при первой задаче: импорт модуля и создание диспетчера ничего не запускают.
+    """
+
+    def __init__(self, io_workers=DISPATCHER_IO_WORKERS, cpu_workers=DISPATCHER_CPU_WORKERS,
+                 per_user_limit=DISPATCHER_PER_USER_LIMIT):
+        self.io_workers = io_workers
+        self.cpu_workers = cpu_workers
+        self.per_user_limit = per_user_limit
+        self._lock = threading.Lock()
+        self._io_executor = None
+        self._cpu_executor = None
+        self._active = defaultdict(int)  # user_id -> задач в очереди и в работе
+        self._stats = defaultdict(_KindStats)
+        self.rejected = 0
+        self.cpu_pool_restarts = 0
+
+    def _io_pool(self):
+        with self._lock:
+            if self._io_executor is None:
+                self._io_executor = ThreadPoolExecutor(max_workers=self.io_workers, thread_name_prefix="bot-job")
+            return self._io_executor
+
+    def _cpu_pool(self):
+        with self._lock:
+            if self._cpu_executor is None:
+                # spawn, а не fork: как в ocr.py и batch_parse, не наследуем соединения и потоки бота
+                self._cpu_executor = ProcessPoolExecutor(
+                    max_workers=self.cpu_workers, mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_cpu_worker
+                )
+            return self._cpu_executor
+
+    def _drop_cpu_pool(self, executor):
+        """Сломанный пул (умер процесс) больше не принимает задачи: следующий шаг создаст новый"""
+        with self._lock:
+            if self._cpu_executor is not executor:
+                return  # пул уже пересоздан другой задачей
+            self._cpu_executor = None
+            self.cpu_pool_restarts += 1
+        print("[WARN] Процесс пула CPU-шагов завершился аварийно, пул будет создан заново")
+        executor.shutdown(wait=False)
+
+    def submit(self, user_id, fn, *args, kind="job", **kwargs):
+        """
+        Ставит задачу пользователя в пул потоков и возвращает Future.
+        Если у пользователя уже per_user_limit задач, бросает UserLimitExceeded.
+        Исключения задачи логируются; Future хранит их для вызывающего.
+        """
+        with self._lock:
+            if self.per_user_limit and self._active[user_id] >= self.per_user_limit:
+                self.rejected += 1
+                raise UserLimitExceeded(f"У пользователя {user_id} уже {self._active[user_id]} задач")
+            self._active[user_id] += 1
+            self._stats[kind].queued += 1
+        submitted = time.perf_counter()
+
+        def run():
+            started = time.perf_counter()
+            self._started(kind, started - submitted)
+            try:
+                result = fn(*args, **kwargs)
+            except Exception:
+                print(f"[ERROR] Задача {kind} пользователя {user_id} завершилась ошибкой:\n{traceback.format_exc()}")
+                self._finished(kind, time.perf_counter() - started, ok=False, user_id=user_id)
+                raise
+            self._finished(kind, time.perf_counter() - started, ok=True, user_id=user_id)
+            return result
+
+        try:
+            return self._io_pool().submit(run)
+        except Exception:
+            with self._lock:
+                self._release(user_id)
+                self._stats[kind].queued -= 1
+            raise
+
+    def run_cpu(self, fn, *args, kind=None, **kwargs):
+        """
+        Выполняет CPU-шаг в пуле процессов и ждет результат (вызывается из задачи пользователя).
+        Исключение шага пробрасывается вызывающему.
+        """
+        kind = f"cpu:{kind or fn.__name__}"
+        submitted = time.perf_counter()
+        with self._lock:
+            self._stats[kind].queued += 1
+        if self.cpu_workers <= 0:
+            self._started(kind, 0.0)
+            started = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception:
+                self._finished(kind, time.perf_counter() - started, ok=False)
+                raise
+            self._finished(kind, time.perf_counter() - started, ok=True)
+            return result
+
+        # time.time(), а не perf_counter: время начала сравнивается с временем в процессе пула
+        submitted_at = time.time()
+        executor = self._cpu_pool()
+        try:
+            result, started_at, run_s = executor.submit(_timed_call, fn, args, kwargs).result()
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                self._drop_cpu_pool(executor)
+            # Время ожидания в очереди процессов неизвестно: считаем все время выполнением
+            self._started(kind, 0.0)
+            self._finished(kind, time.perf_counter() - submitted, ok=False)
+            raise
+        self._started(kind, max(0.0, started_at - submitted_at))
+        self._finished(kind, run_s, ok=True)
+        return result
+
+    def _started(self, kind, wait_s):
+        with self._lock:
+            stats = self._stats[kind]
+            stats.queued -= 1
+            stats.running += 1
+            stats.wait_s += wait_s
+
+    def _finished(self, kind, run_s, ok, user_id=None):
+        with self._lock:
+            stats = self._stats[kind]
+            stats.running -= 1
+            stats.run_s += run_s
+            if ok:
+                stats.completed += 1
+            else:
+                stats.failed += 1
+            if user_id is not None:
+                self._release(user_id)
+
+    def _release(self, user_id):
+        """Уменьшает счетчик задач пользователя (вызывается под _lock)"""
+        self._active[user_id] -= 1
+        if self._active[user_id] <= 0:
+            del self._active[user_id]
+
+    def active_jobs(self, user_id):
+        with self._lock:
+            return self._active.get(user_id, 0)
+
+    def stats(self):
+        """
+        Глубина очередей и время задач по видам (для /cache_stats и логов).
+        Для cpu:* queued - шаги, отправленные в пул процессов и еще не завершенные.
+        """
+        with self._lock:
+            kinds = {kind: stats.as_dict() for kind, stats in sorted(self._stats.items())}
+            return {
+                "queued": sum(stats["queued"] for stats in kinds.values()),
+                "running": sum(stats["running"] for stats in kinds.values()),
+                "rejected": self.rejected,
+                "cpu_pool_restarts": self.cpu_pool_restarts,
+                "active_users": len(self._active),
+                "kinds": kinds,
+            }
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executors = [self._io_executor, self._cpu_executor]
+            self._io_executor = self._cpu_executor = None
+        for executor in executors:
+            if executor is not None:
+                executor.shutdown(wait=wait)
+
+
+def _init_cpu_worker():
+    """Инициализация процесса пула: OCR без вложенного пула процессов"""
+    os.environ["OCR_WORKERS"] = "1"
+    if "ocr" in sys.modules:
+        sys.modules["ocr"].OCR_WORKERS = 1
+
+
+def _timed_call(fn, args, kwargs):
+    """Выполняется в процессе пула: результат, время начала (unix) и длительность"""
+    started_at = time.time()
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, started_at, time.perf_counter() - started
+
+
+job_dispatcher = JobDispatcher()
@@ -0,0 +1,217 @@
+# job_queue.py
+"""
+Надежная очередь задач в MongoDB (коллекция jobs) для обработки загрузок вне процесса бота.
+
+Бот кладет задачу (enqueue), воркеры (python -m worker, на любых машинах с
+доступом к той же базе) атомарно забирают ее через find_one_and_update.
+Забранная задача заблокирована на visibility timeout: если воркер упал и не
+продлил блокировку (heartbeat), задачу заберет другой воркер. Ошибка задачи -
+повтор с экспоненциальной задержкой, после max_attempts попыток - статус failed.
+
+Статусы: queued -> running -> done | queued (повтор) | failed.
+
+Обработчик получает payload и JobProgress: выполненные шаги (отправленные
+сообщения, файлы) записываются в задачу, и повтор после ошибки или падения
+воркера их пропускает.
+"""
+
+import os
+import random
+import socket
+import traceback
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from dotenv import load_dotenv
+from pymongo import ASCENDING, ReturnDocument
+
+load_dotenv()
+
+# Бот отдает PDF воркерам через очередь (нужен запущенный python -m worker), иначе обрабатывает сам
+JOB_QUEUE_ENABLED = os.getenv("JOB_QUEUE_ENABLED", "False").lower() == "true"
+JOBS_COLLECTION = os.getenv("JOBS_COLLECTION", "jobs")
+# Сколько секунд задача принадлежит забравшему ее воркеру без продления
+JOB_VISIBILITY_TIMEOUT = int(os.getenv("JOB_VISIBILITY_TIMEOUT", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+# Задержка перед повтором: base * 2^(попытка - 1), не больше max
+JOB_RETRY_BASE_DELAY = float(os.getenv("JOB_RETRY_BASE_DELAY", "10"))
+JOB_RETRY_MAX_DELAY = float(os.getenv("JOB_RETRY_MAX_DELAY", "900"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def get_jobs_collection():
+    """Коллекция jobs в базе бота (то же подключение, что и documents)"""
+    from credit_parser import get_reports_db
+    return get_reports_db()[JOBS_COLLECTION]
+
+
+def ensure_indexes(jobs):
+    """Индексы под выборку задачи в claim (создание идемпотентно)"""
+    jobs.create_index([("status", ASCENDING), ("run_at", ASCENDING)])
+    jobs.create_index([("status", ASCENDING), ("locked_until", ASCENDING)])
+
+
+def new_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+def retry_delay(attempts, base=JOB_RETRY_BASE_DELAY, max_delay=JOB_RETRY_MAX_DELAY):
+    """Экспоненциальная задержка перед следующей попыткой (+ до 10% случайного разброса)"""
+    delay = min(max_delay, base * 2 ** max(0, attempts - 1))
+    return delay * (1 + random.random() * 0.1)
+
+
+def enqueue(jobs, job_type, payload, max_attempts=JOB_MAX_ATTEMPTS, now=None):
+    """Ставит задачу в очередь, возвращает ее _id"""
+    now = now or datetime.now(timezone.utc)
+    job = {
+        "type": job_type,
+        "payload": payload,
+        "status": QUEUED,
+        "attempts": 0,
+        "max_attempts": max_attempts,
+        "run_at": now,
+        "locked_by": None,
+        "locked_until": None,
+        "created_at": now,
+        "updated_at": now,
+        "error": None,
+        "progress": {},
+    }
+    return jobs.insert_one(job).inserted_id
+
+
+def claim(jobs, worker_id, visibility_timeout=JOB_VISIBILITY_TIMEOUT, job_types=None, now=None):
+    """
+    Атомарно забирает самую раннюю готовую задачу: в очереди и с наступившим run_at
+    или зависшую (running с истекшей блокировкой). Возвращает документ задачи или None.
+    """
+    now = now or datetime.now(timezone.utc)
+    query = {"$or": [
+        {"status": QUEUED, "run_at": {"$lte": now}},
+        {"status": RUNNING, "locked_until": {"$lt": now}},
+    ]}
+    if job_types:
+        query["type"] = {"$in": list(job_types)}
+    return jobs.find_one_and_update(
+        query,
+        {
+            "$set": {
+                "status": RUNNING,
+                "locked_by": worker_id,
+                "locked_until": now + timedelta(seconds=visibility_timeout),
+                "updated_at": now,
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("run_at", ASCENDING)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def _owned(job):
+    """Условие «задача все еще у этого воркера» (блокировку могли перехватить после таймаута)"""
+    return {"_id": job["_id"], "status": RUNNING, "locked_by": job["locked_by"]}
+
+
+def heartbeat(jobs, job, visibility_timeout=JOB_VISIBILITY_TIMEOUT, now=None):
+    """Продлевает блокировку долгой задачи; False, если задачу уже забрал другой воркер"""
+    now = now or datetime.now(timezone.utc)
+    result = jobs.update_one(
+        _owned(job), {"$set": {"locked_until": now + timedelta(seconds=visibility_timeout), "updated_at": now}}
+    )
+    return result.matched_count == 1
+
+
+def complete(jobs, job, result=None, now=None):
+    now = now or datetime.now(timezone.utc)
+    jobs.update_one(
+        _owned(job),
+        {"$set": {"status": DONE, "result": result, "locked_until": None, "finished_at": now, "updated_at": now}},
+    )
+
+
+def fail(jobs, job, error, now=None):
+    """
+    Ошибка попытки: повтор через retry_delay или, если попытки кончились, статус failed.
+    Возвращает новый статус задачи.
+    """
+    now = now or datetime.now(timezone.utc)
+    if job["attempts"] >= job.get("max_attempts", JOB_MAX_ATTEMPTS):
+        update = {"status": FAILED, "finished_at": now}
+    else:
+        update = {"status": QUEUED, "run_at": now + timedelta(seconds=retry_delay(job["attempts"]))}
+    update.update({"error": error, "locked_until": None, "updated_at": now})
+    jobs.update_one(_owned(job), {"$set": update})
+    return update["status"]
+
+
+class JobProgress:
+    """
+    Выполненные шаги задачи (поле progress документа jobs).
+    Без jobs - только в памяти: тот же обработчик работает и вне очереди.
+    """
+
+    def __init__(self, jobs=None, job=None):
+        self.jobs = jobs
+        self.job = job or {}
+        self.attempt = self.job.get("attempts", 1)
+        self.max_attempts = self.job.get("max_attempts", 1)
+        self.values = dict(self.job.get("progress") or {})
+
+    @property
+    def is_retry(self):
+        return self.attempt > 1
+
+    @property
+    def is_last_attempt(self):
+        return self.attempt >= self.max_attempts
+
+    def done(self, step):
+        return step in self.values
+
+    def get(self, step, default=None):
+        return self.values.get(step, default)
+
+    def mark(self, step, value=True):
+        """Отмечает шаг выполненным (сразу пишет в задачу, если она еще у этого воркера)"""
+        self.values[step] = value
+        if self.jobs is not None:
+            self.jobs.update_one(
+                _owned(self.job), {"$set": {f"progress.{step}": value, "updated_at": datetime.now(timezone.utc)}}
+            )
+
+
+def run_job(jobs, job, handlers):
+    """
+    Выполняет забранную задачу обработчиком handlers[type](payload, progress) и записывает итог.
+    Возвращает статус задачи после выполнения.
+    """
+    if job["attempts"] > job.get("max_attempts", JOB_MAX_ATTEMPTS):
+        # Зависшая задача, которую забирали уже слишком много раз (воркер падал на ней)
+        return fail(jobs, job, "Превышено число попыток (воркер не завершал задачу)")
+
+    handler = handlers.get(job["type"])
+    if handler is None:
+        return fail(jobs, dict(job, attempts=job.get("max_attempts", JOB_MAX_ATTEMPTS)),
+                    f"Нет обработчика для задачи типа {job['type']}")
+    try:
+        result = handler(job["payload"], JobProgress(jobs, job))
+    except Exception as e:
+        print(f"[ERROR] Задача {job['_id']} ({job['type']}), попытка {job['attempts']}: {e}")
+        traceback.print_exc()
+        return fail(jobs, job, f"{type(e).__name__}: {e}")
+    complete(jobs, job, result)
+    return DONE
+
+
+def queue_stats(jobs):
+    """Количество задач по статусам"""
+    counts = {status: 0 for status in (QUEUED, RUNNING, DONE, FAILED)}
+    for row in jobs.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]):
+        counts[row["_id"]] = row["count"]
+    return counts
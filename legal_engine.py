@@ -1,126 +1,323 @@
+# legal_engine.py
+"""
+RAG по базе знаний о банкротстве (docs/) для ответов юриста в боте.
+
+Векторное хранилище строится при деплое, а не при импорте:
+    python legal_engine.py --build-index
+Обновление инкрементальное: эмбеддятся только новые фрагменты измененных
+файлов docs/, фрагменты удаленных файлов убираются из коллекции.
 
-import bs4
+Импорт модуля ничего не читает и не ходит в сеть: LLM, Chroma и retriever
+создаются при первом вопросе (get_llm / get_retriever, потокобезопасно).
+Если индекс еще не построен, он строится при первом обращении.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+from colorama import Fore
 from dotenv import load_dotenv
-from langchain import hub
-from operator import itemgetter
-from langchain_community.document_loaders import WebBaseLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
-import os
-from langchain_community.document_loaders import TextLoader
-from langchain_core.documents import Document
-from langchain.load import dumps, loads
-from langchain_anthropic import ChatAnthropic
 
-
-from langchain_community.vectorstores import Chroma
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from answer_cache import ANSWER_CACHE_ENABLED, SemanticAnswerCache
+from text_cache import LRUCache
 from utils import format_qa_pair, format_qa_pairs
 
-from colorama import Fore
-import warnings
-import os
-import hashlib
-
 warnings.filterwarnings("ignore")
 
 load_dotenv()
 
-# LLM
-# llm = ChatOpenAI(model="gpt-4-turbo")
-# llm = ChatOpenAI(model="gpt-3.5-turbo")
+# Пути к документам и индексу
+docs_path = "./docs"  # путь к папке с документами
+persist_directory = "./chroma_db"
+hash_file = "./docs_hash.txt"
+# Манифест индекса: файл -> хеш содержимого и id его фрагментов в Chroma
+manifest_file = "./chroma_db/docs_manifest.json"
 
-llm = ChatAnthropic(
-    model="claude-3-5-sonnet-20241022",  # Можно использовать другую модель, например claude-3-7-sonnet-latest
-    temperature=0.2,
-    max_tokens=4000,
-    # Не используем anthropic_api_key, поскольку библиотека сама возьмет ключ из переменных окружения
-)
+EMBEDDING_MODEL = "text-embedding-3-large"
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 50
+# Сколько запросов к LLM / поиску по подвопросам идет одновременно (1 - последовательно, как раньше)
+LEGAL_ENGINE_WORKERS = int(os.getenv("LEGAL_ENGINE_WORKERS", "4"))
+# Фрагментов на одну поисковую формулировку (как у vectorstore.as_retriever() по умолчанию)
+RETRIEVER_K = 4
+# Сколько формулировок помнит кэш поиска (формулировка -> id найденных фрагментов)
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "512"))
 
-# # 1. Load legal documents
-# docs = []
-# for filename in os.listdir("docs"):
-#     if filename.endswith(".txt"):
-#         loader = TextLoader(os.path.join("docs", filename), encoding='utf-8')
-#         docs.extend(loader.load())
+_init_lock = threading.Lock()
+_llm = None
+_vectorstore = None
+_retriever = None
 
-docs_path = "./docs"  # путь к папке с документами
-docs = []
+# Кэш поиска: (формулировка, k) -> id фрагментов и id фрагмента -> Document; сбрасывается в build_index
+_search_cache = LRUCache(RETRIEVAL_CACHE_SIZE)
+_chunk_cache = LRUCache(RETRIEVAL_CACHE_SIZE * RETRIEVER_K)
 
-for filename in os.listdir(docs_path):
-    if filename.endswith(".txt"):
-        with open(os.path.join(docs_path, filename), "r", encoding="utf-8") as f:
-            content = f.read()
-            docs.append(Document(page_content=content, metadata={"source": filename}))
-            # print(Fore.YELLOW + f"[LOG] Загружен документ: {filename}" + Fore.RESET)
 
+# LLM
+# llm = ChatOpenAI(model="gpt-4-turbo")
+# llm = ChatOpenAI(model="gpt-3.5-turbo")
+
+def get_llm():
+    """Модель для всех цепочек (создается при первом обращении)"""
+    global _llm
+    if _llm is None:
+        with _init_lock:
+            if _llm is None:
+                from langchain_anthropic import ChatAnthropic
+
+                _llm = ChatAnthropic(
+                    model="claude-3-5-sonnet-20241022",  # Можно использовать другую модель, например claude-3-7-sonnet-latest
+                    temperature=0.2,
+                    max_tokens=4000,
+                    # Не используем anthropic_api_key, поскольку библиотека сама возьмет ключ из переменных окружения
+                )
+    return _llm
+
+
+# 1. Load legal documents
+def load_documents(path=docs_path):
+    """Все .txt из папки с документами"""
+    docs = []
+    for filename in sorted(os.listdir(path)):
+        if filename.endswith(".txt"):
+            with open(os.path.join(path, filename), "r", encoding="utf-8") as f:
+                content = f.read()
+                docs.append(Document(page_content=content, metadata={"source": filename}))
+                # print(Fore.YELLOW + f"[LOG] Загружен документ: {filename}" + Fore.RESET)
+    return docs
 
 
 # 2. Split into chunks
-text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-    chunk_size=500,
-    chunk_overlap=50
-)
-splits = text_splitter.split_documents(docs)
-# print(Fore.YELLOW + f"[LOG] Всего фрагментов после разбиения: {len(splits)}" + Fore.RESET)
-for s in splits[:3]:
-    print(Fore.LIGHTBLACK_EX + s.page_content[:200] + "..." + Fore.RESET)
+def split_documents(docs):
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
 
+    text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP
+    )
+    return text_splitter.split_documents(docs)
+    # print(Fore.YELLOW + f"[LOG] Всего фрагментов после разбиения: {len(splits)}" + Fore.RESET)
 
-# 3. Create vectorstore
-# # Пути для хранения
-persist_directory = "./chroma_db"
-hash_file = "./docs_hash.txt"
 
+# 3. Create vectorstore
 # Функция для вычисления хеша документов
 def get_documents_hash(documents):
     """Создает хеш-сумму для всех документов"""
     content = "".join([doc.page_content for doc in documents])
     return hashlib.md5(content.encode()).hexdigest()
 
-# Получаем текущий хеш документов
-current_hash = get_documents_hash(splits)
 
-# Проверяем, нужно ли обновлять embeddings
-need_update = True
-if os.path.exists(hash_file):
-    with open(hash_file, "r") as f:
-        stored_hash = f.read().strip()
-    
-    # Если хеш не изменился, обновление не требуется
-    if current_hash == stored_hash and os.path.exists(persist_directory):
-        need_update = False
-        print(Fore.GREEN + f"[LOG] Документы не изменились, используем существующие embeddings" + Fore.RESET)
+def _embeddings():
+    from langchain_openai import OpenAIEmbeddings
+    return OpenAIEmbeddings(model=EMBEDDING_MODEL)
+
+
+def open_vectorstore(embedding=None, directory=None):
+    from langchain_community.vectorstores import Chroma
+    return Chroma(persist_directory=directory or persist_directory, embedding_function=embedding or _embeddings())
+
+
+def _file_sha256(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _chunk_ids(source, chunks):
+    """
+    Id фрагмента - хеш файла-источника и текста фрагмента (+ номер повтора того же текста в файле).
+    Неизмененные фрагменты измененного файла сохраняют id и не эмбеддятся заново.
+    """
+    ids = []
+    seen = {}
+    for chunk in chunks:
+        digest = hashlib.sha256(f"{source}\0{chunk.page_content}".encode("utf-8")).hexdigest()[:32]
+        repeat = seen.get(digest, 0)
+        seen[digest] = repeat + 1
+        ids.append(f"{digest}-{repeat}")
+    return ids
+
+
+def _load_manifest(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_manifest(path, manifest):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+def update_index(vectorstore, path=docs_path, manifest_path=manifest_file, splitter=None, force=False):
+    """
+    Приводит коллекцию Chroma в соответствие с docs/ по манифесту (файл -> хеш содержимого, id фрагментов).
+    Эмбеддятся и добавляются только новые фрагменты, фрагменты измененных и удаленных файлов удаляются.
+    Без манифеста, при force или смене модели / параметров разбиения коллекция пересобирается целиком.
+    Возвращает счетчики {"files_changed", "files_removed", "chunks_added", "chunks_deleted"}.
+    """
+    settings = {"embedding_model": EMBEDDING_MODEL, "chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP}
+    manifest = None if force else _load_manifest(manifest_path)
+    if manifest is None or manifest.get("settings") != settings:
+        # Полная пересборка: удаляем все, что есть в коллекции (в том числе фрагменты без манифеста)
+        existing_ids = vectorstore.get(include=[])["ids"]
+        if existing_ids:
+            vectorstore.delete(ids=existing_ids)
+        manifest = {"settings": settings, "files": {}}
+
+    stats = {"files_changed": 0, "files_removed": 0, "chunks_added": 0, "chunks_deleted": 0}
+    old_files = manifest["files"]
+    new_files = {}
+
+    for filename in sorted(os.listdir(path)):
+        if not filename.endswith(".txt"):
+            continue
+        file_hash = _file_sha256(os.path.join(path, filename))
+        old = old_files.get(filename)
+        if old and old["sha256"] == file_hash:
+            new_files[filename] = old
+            continue
+
+        stats["files_changed"] += 1
+        with open(os.path.join(path, filename), "r", encoding="utf-8") as f:
+            document = Document(page_content=f.read(), metadata={"source": filename})
+        chunks = splitter.split_documents([document]) if splitter else split_documents([document])
+        ids = _chunk_ids(filename, chunks)
+        for chunk, chunk_id in zip(chunks, ids):
+            chunk.metadata["chunk_id"] = chunk_id
+
+        old_ids = set(old["chunk_ids"]) if old else set()
+        stale_ids = sorted(old_ids - set(ids))
+        if stale_ids:
+            vectorstore.delete(ids=stale_ids)
+            stats["chunks_deleted"] += len(stale_ids)
+        fresh = [(chunk, chunk_id) for chunk, chunk_id in zip(chunks, ids) if chunk_id not in old_ids]
+        if fresh:
+            vectorstore.add_documents([chunk for chunk, _ in fresh], ids=[chunk_id for _, chunk_id in fresh])
+            stats["chunks_added"] += len(fresh)
+        new_files[filename] = {"sha256": file_hash, "chunk_ids": ids}
+
+    for filename in sorted(set(old_files) - set(new_files)):
+        stats["files_removed"] += 1
+        removed_ids = old_files[filename]["chunk_ids"]
+        if removed_ids:
+            vectorstore.delete(ids=removed_ids)
+            stats["chunks_deleted"] += len(removed_ids)
+
+    manifest["files"] = new_files
+    _save_manifest(manifest_path, manifest)
+    return stats
+
+
+def docs_hash(manifest_path=manifest_file):
+    """Хеш текущего состояния базы знаний (по манифесту индекса)"""
+    manifest = _load_manifest(manifest_path) or {"files": {}}
+    content = "".join(f"{name}:{entry['sha256']}\n" for name, entry in sorted(manifest["files"].items()))
+    return hashlib.md5(content.encode()).hexdigest()
 
-# Создаем или загружаем векторное хранилище
-if need_update:
-    print(Fore.YELLOW + f"[LOG] Документы изменились или хранилище не существует. Создаем новые embeddings..." + Fore.RESET)
-    
-    # Создаем embeddings и сохраняем в Chroma
-    vectorstore = Chroma.from_documents(
-        documents=splits, 
-        embedding=OpenAIEmbeddings(model="text-embedding-3-large"),
-        persist_directory=persist_directory
-    )
-    
-    # Сохраняем векторное хранилище и хеш
-    vectorstore.persist()
-    with open(hash_file, "w") as f:
-        f.write(current_hash)
-    
-    print(Fore.GREEN + f"[LOG] Создано новое векторное хранилище в {persist_directory}" + Fore.RESET)
-else:
-    # Загружаем существующее хранилище
-    embedding_function = OpenAIEmbeddings(model="text-embedding-3-large")
-    vectorstore = Chroma(
-        persist_directory=persist_directory, 
-        embedding_function=embedding_function
-    )
-    print(Fore.GREEN + f"[LOG] Загружено существующее векторное хранилище из {persist_directory}" + Fore.RESET)
 
-# Создаем retriever как обычно
-retriever = vectorstore.as_retriever()
+def _read_hash_file():
+    try:
+        with open(hash_file, "r") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def current_docs_hash():
+    """Хеш базы знаний, по которой построен индекс (docs_hash.txt пишет build_index)"""
+    return _read_hash_file() or docs_hash()
+
+
+# Кэш ответов на похожие вопросы; сбрасывается при изменении базы знаний
+answer_cache = SemanticAnswerCache(_embeddings, current_docs_hash)
+
+
+def build_index(force=False):
+    """
+    Обновляет векторное хранилище по docs/ (только измененные файлы) и сохраняет хеш документов.
+    Возвращает открытое хранилище. Запускается при деплое: python legal_engine.py --build-index
+    """
+    vectorstore = open_vectorstore()
+    stats = update_index(vectorstore, force=force)
+    _search_cache.clear()
+    _chunk_cache.clear()
+    if hasattr(vectorstore, "persist"):
+        vectorstore.persist()
+    # Перезаписываем только при изменении: по mtime файла кэш ответов отбрасывает ответы по старой базе
+    current_hash = docs_hash()
+    if _read_hash_file() != current_hash:
+        with open(hash_file, "w") as f:
+            f.write(current_hash)
+
+    if stats["files_changed"] or stats["files_removed"]:
+        print(
+            Fore.YELLOW + f"[LOG] Индекс обновлен: файлов изменено {stats['files_changed']}, удалено {stats['files_removed']}, "
+            f"фрагментов добавлено {stats['chunks_added']}, удалено {stats['chunks_deleted']}" + Fore.RESET
+        )
+    else:
+        print(Fore.GREEN + f"[LOG] Документы не изменились, используем существующие embeddings" + Fore.RESET)
+    return vectorstore
+
+
+def get_vectorstore():
+    """Векторное хранилище: открывается готовый индекс, без чтения docs/ и без проверки хеша"""
+    global _vectorstore
+    if _vectorstore is None:
+        with _init_lock:
+            if _vectorstore is None:
+                if os.path.exists(persist_directory) and os.path.exists(manifest_file):
+                    _vectorstore = open_vectorstore()
+                    print(Fore.GREEN + f"[LOG] Загружено существующее векторное хранилище из {persist_directory}" + Fore.RESET)
+                else:
+                    print(Fore.YELLOW + "[WARN] Индекс не построен при деплое (python legal_engine.py --build-index), строим сейчас" + Fore.RESET)
+                    _vectorstore = build_index()
+    return _vectorstore
+
+
+def get_retriever():
+    """Retriever по базе знаний (создается при первом обращении)"""
+    global _retriever
+    if _retriever is None:
+        vectorstore = get_vectorstore()
+        with _init_lock:
+            if _retriever is None:
+                _retriever = vectorstore.as_retriever()
+    return _retriever
+
+
+def seed_answer_cache(users_collection):
+    """Заполняет кэш ответов из users.answers (только ответы, данные после последнего изменения docs/)"""
+    since = os.path.getmtime(hash_file) if os.path.exists(hash_file) else None
+    return answer_cache.seed_from_users(users_collection, since=since)
+
+
+def warm_up(users_collection=None):
+    """
+    Заранее открывает индекс и создает LLM (например, в фоновом потоке после старта бота).
+    Если передана коллекция пользователей, по ней заполняется кэш ответов.
+    """
+    get_retriever()
+    get_llm()
+    if users_collection is not None and ANSWER_CACHE_ENABLED:
+        try:
+            seed_answer_cache(users_collection)
+        except Exception as e:
+            print(Fore.YELLOW + f"[WARN] Не удалось заполнить кэш ответов: {e}" + Fore.RESET)
+
 
 # 1. DECOMPOSITION
 # template = """Вы эксперт по банкротству в Казахстане. 
@@ -159,32 +356,91 @@ prompt_decomposition = ChatPromptTemplate.from_template(template)
 
 def generate_multi_queries_for_subquestion(question):
     """Создаёт 5 формулировок одного подвопроса"""
-    chain = prompt_decomposition | llm | StrOutputParser() | (lambda x: x.split("\n"))
+    chain = prompt_decomposition | get_llm() | StrOutputParser() | (lambda x: x.split("\n"))
     return chain.invoke({"question": question})
 
-def get_unique_union(documents: list[list]):
-    """Объединить списки документов и удалить дубликаты"""
-    flattened = [dumps(doc) for sublist in documents for doc in sublist]
-    unique_docs = list(set(flattened))
-    return [loads(doc) for doc in unique_docs]
+def _document_key(doc):
+    """Id фрагмента (metadata chunk_id из update_index), для старых фрагментов - источник и текст"""
+    chunk_id = doc.metadata.get("chunk_id") or doc.id
+    if chunk_id:
+        return chunk_id
+    return hashlib.sha256(f"{doc.metadata.get('source')}\0{doc.page_content}".encode("utf-8")).hexdigest()
 
-def retrieve_documents(sub_questions):
-    """Для каждого подвопроса → 5 формулировок → поиск → объединение"""
+
+def get_unique_union(documents: list[list]):
+    """Объединить списки документов и удалить дубликаты (по id фрагмента, в порядке первого появления)"""
+    unique_docs = {}
+    for sublist in documents:
+        for doc in sublist:
+            unique_docs.setdefault(_document_key(doc), doc)
+    return list(unique_docs.values())
+
+
+def _cached_search(search, k):
+    chunk_ids = _search_cache.get((search, k))
+    if chunk_ids is None:
+        return None
+    docs = [_chunk_cache.get(chunk_id) for chunk_id in chunk_ids]
+    return None if any(doc is None for doc in docs) else docs
+
+
+def _search_by_vectors(vectorstore, vectors, k):
+    """
+    Списки документов для каждого вектора. У langchain Chroma нет поиска по нескольким
+    векторам разом, поэтому, пока у хранилища есть коллекция chromadb (_collection - не
+    публичный API), ищем одним запросом к ней; иначе - по запросу на вектор.
+    """
+    if not hasattr(vectorstore, "_collection"):
+        return [vectorstore.similarity_search_by_vector(vector, k=k) for vector in vectors]
+
+    results = vectorstore._collection.query(query_embeddings=vectors, n_results=k, include=["documents", "metadatas"])
+    return [
+        [Document(page_content=text, metadata=metadata or {}, id=chunk_id)
+         for chunk_id, text, metadata in zip(ids, texts, metadatas)]
+        for ids, texts, metadatas in zip(results["ids"], results["documents"], results["metadatas"])
+    ]
+
+
+def search_documents(searches, k=RETRIEVER_K):
+    """
+    Поиск фрагментов сразу для нескольких формулировок. Формулировки, которых нет в кэше,
+    эмбеддятся одним запросом embed_documents и ищутся в Chroma одним запросом с несколькими
+    векторами, если хранилище это позволяет (вместо запроса эмбеддинга и поиска на каждую формулировку).
+    Возвращает списки документов в порядке searches; пустые строки ничего не находят.
+    """
+    found = {"": []}
+    misses = []
+    for search in dict.fromkeys(search.strip() for search in searches):
+        if not search:
+            continue
+        docs = _cached_search(search, k)
+        if docs is None:
+            misses.append(search)
+        else:
+            found[search] = docs
+
+    if misses:
+        vectorstore = get_vectorstore()
+        vectors = vectorstore.embeddings.embed_documents(misses)
+        for search, docs in zip(misses, _search_by_vectors(vectorstore, vectors, k)):
+            chunk_ids = []
+            for doc in docs:
+                chunk_id = _document_key(doc)
+                _chunk_cache.set(chunk_id, doc)
+                chunk_ids.append(chunk_id)
+            _search_cache.set((search, k), chunk_ids)
+            found[search] = docs
+
+    return [found[search.strip()] for search in searches]
+
+
+def _retrieve_sequential(sub_questions):
     all_retrieved_docs = {}
 
     for sub_q in sub_questions:
         # print(Fore.BLUE + f"[LOG] Запрос: {sub_q}" + Fore.RESET)
         multi_qs = generate_multi_queries_for_subquestion(sub_q)
-
-        doc_lists = []
-        for q in multi_qs:
-            docs_found = retriever.get_relevant_documents(q)
-            # print(Fore.LIGHTMAGENTA_EX + f"[RETRIEVER] Запрос: {q} — Найдено документов: {len(docs_found)}" + Fore.RESET)
-            for d in docs_found[:1]:
-                # print(Fore.LIGHTCYAN_EX + f"Фрагмент: {d.page_content[:100]}..." + Fore.RESET)
-                 pass  # или оставь print, если нужно временно
-            doc_lists.append(docs_found)
-        
+        doc_lists = search_documents(multi_qs)
         unique_docs = get_unique_union(doc_lists)
         all_retrieved_docs[sub_q] = unique_docs  # 🔥 Вставь это!
         # print(Fore.YELLOW + f"[LOG] Уникальных документов для подвопроса: {len(unique_docs)}" + Fore.RESET)
@@ -192,13 +448,41 @@ def retrieve_documents(sub_questions):
     return all_retrieved_docs
 
 
+def _retrieve_concurrent(sub_questions, max_workers):
+    """
+    То же, что _retrieve_sequential, но запросы к LLM за формулировками (по одному на подвопрос)
+    идут параллельно, не больше max_workers одновременно, а формулировки всех подвопросов
+    ищутся одним пакетом search_documents.
+    """
+    unique_sub_questions = list(dict.fromkeys(sub_questions))
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="legal-rag") as executor:
+        multi_qs_lists = list(executor.map(generate_multi_queries_for_subquestion, unique_sub_questions))
+    searches = [q for multi_qs in multi_qs_lists for q in multi_qs]
+    found_lists = iter(search_documents(searches))
+
+    all_retrieved_docs = {}
+    for sub_q, multi_qs in zip(unique_sub_questions, multi_qs_lists):
+        doc_lists = [next(found_lists) for _ in multi_qs]
+        all_retrieved_docs[sub_q] = get_unique_union(doc_lists)
+    return all_retrieved_docs
+
+
+def retrieve_documents(sub_questions, max_workers=None):
+    """Для каждого подвопроса → 5 формулировок → поиск → объединение (порядок подвопросов сохраняется)"""
+    max_workers = LEGAL_ENGINE_WORKERS if max_workers is None else max_workers
+    if max_workers <= 1:
+        return _retrieve_sequential(sub_questions)
+    return _retrieve_concurrent(sub_questions, max_workers)
+
+
 def generate_sub_questions(query):
     """ generate sub questions based on user query"""
     pass 
     # Chain
     generate_queries_decomposition = (
         prompt_decomposition 
-        | llm 
+        | get_llm() 
         | StrOutputParser()
         | (lambda x: x.split("\n"))
     ) 
@@ -244,7 +528,7 @@ def generate_qa_pairs(retrieved_docs_dict):
             "context": context
         }
 
-        generate_qa = prompt_qa | llm | StrOutputParser()
+        generate_qa = prompt_qa | get_llm() | StrOutputParser()
         # print(Fore.LIGHTYELLOW_EX + "[CONTEXT] " + context[:500] + "..." + Fore.RESET)
         answer = generate_qa.invoke(inputs)
        
@@ -262,18 +546,24 @@ def generate_qa_pairs(retrieved_docs_dict):
 # 3. ANSWER INDIVIDUALY
 
 # RAG prompt = https://smith.langchain.com/hub/rlm/rag-prompt
-prompt_rag = hub.pull("rlm/rag-prompt")
+# Локальная копия: hub.pull при импорте ходил в сеть на каждом старте бота
+prompt_rag = ChatPromptTemplate.from_template(
+    "You are an assistant for question-answering tasks. Use the following pieces of retrieved context "
+    "to answer the question. If you don't know the answer, just say that you don't know. "
+    "Use three sentences maximum and keep the answer concise.\n"
+    "Question: {question} \nContext: {context} \nAnswer:"
+)
 
 
 def retrieve_and_rag(prompt_rag, sub_questions):
     """RAG on each sub-question"""
     rag_results = []
     for sub_question in sub_questions:
-        retrieved_docs = retriever.get_relevant_documents(sub_question)
+        retrieved_docs = get_retriever().invoke(sub_question)
 
         answer_chain = (
             prompt_rag
-            | llm
+            | get_llm()
             | StrOutputParser()
         )
         answer = answer_chain.invoke({"question": sub_question, "context": retrieved_docs})
@@ -305,28 +595,81 @@ template = """Вот набор пар вопрос-ответ из базы з
 prompt = ChatPromptTemplate.from_template(template)
 
 
-def query(query_text, progress_callback=lambda x: None):
+def query(query_text, progress_callback=lambda x: None, timings=None, use_cache=ANSWER_CACHE_ENABLED,
+          on_answer_update=None):
+    """
+    Ответ юриста на вопрос пользователя.
+    Ответ на тот же или очень похожий вопрос берется из answer_cache (use_cache=False - всегда заново).
+    on_answer_update (если передан) получает накопленный текст итогового ответа по мере генерации.
+    timings (если передан dict) заполняется временем этапов в секундах:
+    cache_s, sub_questions_s, retrieval_s, qa_pairs_s, final_s, total_s (и first_token_s при потоковом ответе).
+    """
+    timings = {} if timings is None else timings
+    started = stage_started = time.perf_counter()
+
+    question_vector = None
+    if use_cache:
+        try:
+            cached_answer, question_vector = answer_cache.lookup(query_text)
+        except Exception as e:
+            print(Fore.YELLOW + f"[WARN] Кэш ответов недоступен: {e}" + Fore.RESET)
+            cached_answer = None
+        timings["cache_s"] = round(time.perf_counter() - started, 3)
+        stage_started = time.perf_counter()
+        if cached_answer is not None:
+            timings["total_s"] = timings["cache_s"]
+            print(Fore.CYAN + f"[LOG] legal_engine.query: ответ из кэша, {answer_cache.stats()}" + Fore.RESET)
+            return cached_answer
+
+    def stage_done(name):
+        nonlocal stage_started
+        now = time.perf_counter()
+        timings[name] = round(now - stage_started, 3)
+        stage_started = now
+
     # Шаг 1: генерация подвопросов
     progress_callback("🔍 Генерирую юридические подвопросы...")
     sub_questions = generate_sub_questions(query_text)
+    stage_done("sub_questions_s")
 
-    # Шаг 2: поиск документов
+    # Шаг 2: поиск документов (формулировки и поиск по подвопросам - параллельно)
     progress_callback("📚 Ищу релевантные документы...")
     retrieved_docs_dict = retrieve_documents(sub_questions)
+    stage_done("retrieval_s")
 
-    # Шаг 3: генерация Q/A по документам
+    # Шаг 3: генерация Q/A по документам (последовательно: каждый ответ видит предыдущие пары)
     progress_callback("⚖️ Анализирую законодательство и судебную практику...")
     q_a_pairs = generate_qa_pairs(retrieved_docs_dict)
+    stage_done("qa_pairs_s")
 
     # Шаг 4: итоговый ответ
     progress_callback("🧠 Формирую итоговый юридический вывод...")
     final_rag_chain = (
         prompt
-        | llm
+        | get_llm()
         | StrOutputParser()
     )
 
-    return final_rag_chain.invoke({"question": query_text, "context": q_a_pairs})
+    final_inputs = {"question": query_text, "context": q_a_pairs}
+    if on_answer_update is None:
+        answer = final_rag_chain.invoke(final_inputs)
+    else:
+        answer = ""
+        for chunk in final_rag_chain.stream(final_inputs):
+            if "first_token_s" not in timings:
+                timings["first_token_s"] = round(time.perf_counter() - started, 3)
+            answer += chunk
+            on_answer_update(answer)
+    stage_done("final_s")
+    timings["total_s"] = round(time.perf_counter() - started, 3)
+    print(Fore.CYAN + "[LOG] legal_engine.query: " + ", ".join(f"{k}={v}" for k, v in timings.items()) + Fore.RESET)
+
+    if use_cache:
+        try:
+            answer_cache.store(query_text, answer, vector=question_vector)
+        except Exception as e:
+            print(Fore.YELLOW + f"[WARN] Не удалось сохранить ответ в кэш: {e}" + Fore.RESET)
+    return answer
 
 # def query(query_text, progress_callback=lambda x: None):
 #     print(f"[DEBUG] Начинаем обработку запроса: {query_text[:100]}...")
@@ -401,4 +744,22 @@ def query(query_text, progress_callback=lambda x: None):
 #         print(f"[ERROR] 💥 ОШИБКА В ШАГЕ 4 (final_rag_chain): {e}")
 #         import traceback
 #         traceback.print_exc()
-#         raise e
\ No newline at end of file
+#         raise e
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Индекс базы знаний юриста (docs/ -> Chroma)")
+    arg_parser.add_argument("--build-index", action="store_true", help="Обновить индекс по измененным файлам docs/")
+    arg_parser.add_argument("--force", action="store_true", help="Пересобрать индекс, даже если docs/ не менялись")
+    args = arg_parser.parse_args()
+
+    if not (args.build_index or args.force):
+        arg_parser.print_help()
+        return 2
+
+    build_index(force=args.force)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
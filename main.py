@@ -6,16 +6,23 @@ from pymongo import MongoClient
 from admin_consultation import DEBUG_MODE, AdminConsultationManager, ConsultationNotificationScheduler
 from bankruptcy_calculator import analyze_credit_report_for_bankruptcy
 from collateral_parser import extract_collateral_info
-from legal_engine import query
+from legal_engine import query, warm_up as warm_up_legal_engine
+from telegram_stream import StreamingMessage
 from datetime import datetime, timezone, timedelta
 from telebot import types
 from document_processor import process_uploaded_file
 from credit_parser import FallbackParser, GKBParser, PKBParser, format_summary
 import time
+import threading
 import requests
 from pydub import AudioSegment
 import openai
 from creditor_handler import process_all_creditors_request
+from upload_pipeline import UploadPipeline, analyze_upload_cached
+from user_registration import admin_notification_text, new_user_record, restored_access_text, welcome_text
+from job_dispatcher import UserLimitExceeded, job_dispatcher
+from job_queue import JOB_QUEUE_ENABLED, JobProgress, enqueue, get_jobs_collection
+from types import SimpleNamespace
 from smart_handler import SmartHandler
 from videocourse.video_courses import VideoCourseManager
 
@@ -26,6 +33,8 @@ load_dotenv()
 print(f"[INFO] Текущий режим: {os.getenv('ENV', 'prod')}")
 
 BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+# polling (по умолчанию), webhook (см. webhook_server.py) или async (AsyncTeleBot, см. async_bot.py)
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
 bot = telebot.TeleBot(BOT_TOKEN)
 CHANNEL_ID = -1002684584475  # ID канала для проверки связи
 smart_handler = SmartHandler(bot)
@@ -1209,6 +1218,84 @@ def handle_reschedule_cancel(call, booking_id):
     )
 
 
+def dispatch_user_job(message, handler, kind):
+    """
+    Выполняет тяжелый обработчик в job_dispatcher, чтобы не держать потоки polling.
+    Если у пользователя уже обрабатывается запрос, отвечает, что нужно подождать.
+    """
+    try:
+        job_dispatcher.submit(message.from_user.id, handler, message, kind=kind)
+    except UserLimitExceeded:
+        bot.reply_to(message, "⏳ Ваш предыдущий запрос еще обрабатывается. Дождитесь ответа и повторите.")
+
+
+def enqueue_document_job(message, kind):
+    """
+    Ставит обработку PDF в очередь jobs (ее выполняет python -m worker).
+    Задача хранит сообщение целиком: файл скачивается по file_id, ответ уходит в тот же чат.
+    """
+    user_id = message.from_user.id
+    state = user_states.get(user_id)
+    payload = {"kind": kind, "state": state, "message": message.json}
+    try:
+        enqueue(get_jobs_collection(), "telegram_document", payload)
+    except Exception as e:
+        print(f"[ERROR] Не удалось поставить задачу в очередь, обрабатываем в боте: {e}")
+        handler = handle_credit_report_pdf if kind == "credit_report" else handle_creditors_list_pdf
+        dispatch_user_job(message, handler, kind)
+        return
+    # Воркер меняет состояние только в своем процессе: переводим пользователя дальше здесь,
+    # иначе следующий PDF снова уйдет в очередь
+    set_document_state(user_id, completed_document_state(state) if kind == "credit_report" else None)
+    bot.reply_to(message, "📥 Файл принят в обработку. Результат придет в этот чат.")
+
+
+def completed_document_state(state):
+    """Состояние пользователя после обработки кредитного отчета в режиме state"""
+    return {
+        "waiting_bankruptcy_report": "bankruptcy_analysis_completed",
+        "waiting_creditors_list": "creditors_list_completed",
+        "waiting_credit_report": "credit_report_completed",
+    }.get(state)
+
+
+def set_document_state(user_id, state):
+    """Записывает состояние после обработки PDF (None - сбросить)"""
+    if state:
+        # После анализа даем пользователю время на изучение результата
+        user_states[user_id] = state
+    else:
+        user_states.pop(user_id, None)
+
+
+def send_document_status(chat_id, text, progress):
+    """
+    Сообщение о ходе обработки PDF. При повторе задачи из очереди редактируется
+    сообщение, отправленное прошлой попыткой, а не присылается новое.
+    """
+    message_id = progress.get("status_message_id")
+    if message_id is not None:
+        try:
+            bot.edit_message_text(chat_id=chat_id, message_id=message_id, text=text)
+        except Exception as e:
+            if "message is not modified" not in str(e):
+                message_id = None  # сообщение удалено - отправим новое
+        if message_id is not None:
+            return SimpleNamespace(message_id=message_id)
+    status_msg = bot.send_message(chat_id, text)
+    progress.mark("status_message_id", status_msg.message_id)
+    return status_msg
+
+
+def report_document_error(message, status_message_id, error):
+    """Сообщает пользователю об ошибке обработки PDF (в сообщении о статусе, если оно есть)"""
+    text = f"❌ Произошла ошибка: {str(error)}\nПопробуйте позже или обратитесь к администратору."
+    try:
+        bot.edit_message_text(chat_id=message.chat.id, message_id=status_message_id, text=text)
+    except:
+        bot.send_message(message.chat.id, text)
+
+
 def send_long_message(bot, chat_id, text, reply_markup=None, parse_mode=None):
     """Отправляет длинные сообщения по частям"""
     
@@ -1261,6 +1348,9 @@ def send_long_message(bot, chat_id, text, reply_markup=None, parse_mode=None):
         import time
         time.sleep(0.3)
 
+# Кому приходит уведомление о /start (в синхронном и async-режиме)
+START_ADMIN_IDS = [7920066963, 827743984]
+
 @bot.message_handler(commands=['start'])
 def main(message):
     user_id = message.from_user.id
@@ -1270,73 +1360,27 @@ def main(message):
     # Проверка: есть ли пользователь в базе
     existing_user = users_collection.find_one({"user_id": user_id})
     if not existing_user:
-        # Проверяем, есть ли пользователь в коллекции миграции
-        migration_collection = db["user_migration"]
-        old_user = migration_collection.find_one({"user_id": user_id})
-        
-        if old_user:
-            # Восстанавливаем данные пользователя из коллекции миграции
-            restored_user = {
-                "user_id": user_id,
-                "first_name": first_name,
-                "last_name": last_name,
-                "access": old_user.get("access", False),
-                "message_limit": old_user.get("message_limit", 0),
-                "initial_message_limit": old_user.get("initial_message_limit", 0),
-                "messages": old_user.get("messages", []),
-                "created_at": old_user.get("created_at", datetime.now(timezone.utc)),
-                "migrated_at": datetime.now(timezone.utc),
-                "is_migrated": True
-            }
-            users_collection.insert_one(restored_user)
-            
-            # Отправляем уведомление о восстановлении
-            if old_user.get("access", False):
-                bot.send_message(
-                    message.chat.id,
-                    "🔄 **Данные восстановлены!**\n\n"
-                    f"✅ Ваш доступ к боту был восстановлен\n"
-                    f"💬 Лимит сообщений: {old_user.get('message_limit', 0)}\n\n"
-                    "Добро пожаловать обратно!",
-                    parse_mode='Markdown'
-                )
-        else:
-            # Добавляем нового пользователя
-            users_collection.insert_one({
-                "user_id": user_id,
-                "first_name": first_name,
-                "last_name": last_name,
-                "access": False,
-                "message_limit": 0,
-                "messages": [],
-                "created_at": datetime.now(timezone.utc)
-            })
+        # Восстанавливаем данные из коллекции миграции или добавляем нового пользователя
+        old_user = db["user_migration"].find_one({"user_id": user_id})
+        users_collection.insert_one(new_user_record(user_id, first_name, last_name, old_user))
+        
+        # Отправляем уведомление о восстановлении
+        restored_text = restored_access_text(old_user)
+        if restored_text:
+            bot.send_message(message.chat.id, restored_text, parse_mode='Markdown')
     # 🛠 Заменили ручную разметку на универсальную
     markup = create_main_menu()
     
-    welcome_text = (
-        f"👋 Добро пожаловать, {first_name}!\n\n"
-        "🤖 Я ваш персональный юридический ассистент.\n"
-        "Выберите нужную услугу:"
-    )
-    
     bot.send_message(
         message.chat.id,
-        welcome_text,
+        welcome_text(first_name),
         reply_markup=markup
     )
     
     # Уведомление админу
-    ADMIN_USER_IDS = [7920066963, 827743984]
-    if user_id not in ADMIN_USER_IDS:
-        timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
-        admin_text = (
-            "🆕 Новый пользователь:\n"
-            f"👤 Имя: {first_name} {last_name}\n"
-            f"🆔 ID: {user_id}\n"
-            f"🕒 Время: {timestamp}"
-        )
-        for admin_id in ADMIN_USER_IDS:
+    admin_text = admin_notification_text(user_id, first_name, last_name, START_ADMIN_IDS)
+    if admin_text:
+        for admin_id in START_ADMIN_IDS:
             try:
                 bot.send_message(admin_id, admin_text)
             except Exception as e:
@@ -1749,15 +1793,20 @@ def handle_course_selection(call):
         parse_mode='Markdown'
     )
 # Модифицировать функцию handle_credit_report_pdf:
-def handle_credit_report_pdf(message):
-    """Обработка PDF файла кредитного отчета с генерацией заявлений И банкротным анализом"""
+def handle_credit_report_pdf(message, state=None, progress=None, raise_errors=False):
+    """
+    Обработка PDF файла кредитного отчета с генерацией заявлений И банкротным анализом.
+    Для задач из очереди (worker.py): state - состояние пользователя на момент загрузки,
+    progress - уже выполненные шаги прошлых попыток, raise_errors - пробросить ошибку
+    для повтора вместо ответа пользователю.
+    """
     user_id = message.from_user.id
-    current_state = user_states.get(user_id)
+    current_state = state or user_states.get(user_id)
+    progress = progress or JobProgress()
+    status_msg = None
     
     # Определяем тип обработки по состоянию пользователя
     is_bankruptcy_mode = current_state == "waiting_bankruptcy_report"
-    is_creditors_list_mode = current_state == "waiting_creditors_list"
-    is_credit_report_mode = current_state == "waiting_credit_report"
     
     try:
         # Проверяем, что это PDF файл
@@ -1771,14 +1820,16 @@ def handle_credit_report_pdf(message):
         
         # Отправляем сообщение о начале обработки
         if is_bankruptcy_mode:
-            status_msg = bot.send_message(
+            status_msg = send_document_status(
                 message.chat.id, 
-                "⏳ Анализирую ваш кредитный отчет для определения процедуры банкротства...\n📄 Извлекаю текст из PDF..."
+                "⏳ Анализирую ваш кредитный отчет для определения процедуры банкротства...\n📄 Извлекаю текст из PDF...",
+                progress
             )
         else:
-            status_msg = bot.send_message(
+            status_msg = send_document_status(
                 message.chat.id, 
-                "⏳ Обрабатываю ваш кредитный отчет...\n📄 Извлекаю текст из PDF..."
+                "⏳ Обрабатываю ваш кредитный отчет...\n📄 Извлекаю текст из PDF...",
+                progress
             )
         
         # Сохраняем файл во временную папку
@@ -1803,70 +1854,22 @@ def handle_credit_report_pdf(message):
                 text="⏳ Обрабатываю ваш кредитный отчет...\n🔍 Анализирую содержимое..."
             )
         
-        # Импортируем необходимые модули
-        from text_extractor import extract_text_from_pdf
-        from ocr import ocr_file
-        from credit_parser import extract_credit_data_with_total
-        
-        # # Извлекаем текст из PDF
-        # text = extract_text_from_pdf(file_path)
-        # if not text.strip():
-        #     text = ocr_file(file_path)
-        
-        # # Парсим кредитный отчет
-        # parsed_data = extract_credit_data_with_total(text)
+        # Извлекаем текст один раз (в пуле процессов): тот же текст и результат парсинга
+        # используются для ответа, банкротного анализа и заявлений
         if is_bankruptcy_mode:
-            # 🧮 БАНКРОТНЫЙ КАЛЬКУЛЯТОР: используем GKBParser для точности
-            # print(f"[INFO] Банкротный режим: используем цепочку парсеров для файла {file_path}")
-            
-            # Импортируем цепочку парсеров (как в document_processor.py)
-            from text_extractor import extract_text_from_pdf
-            from ocr import ocr_file
-            
-            
-            # Извлекаем текст из PDF
-            text = extract_text_from_pdf(file_path)
-            if not text.strip():
-                text = ocr_file(file_path)
-            
-            # Создаем цепочку парсеров (как в document_processor.py)
-            gkb_parser = GKBParser()
-            pkb_parser = PKBParser()
-            fallback_parser = FallbackParser()
-            
-            # Устанавливаем цепочку: GKB -> PKB -> Emergency
-            gkb_parser.set_next(pkb_parser).set_next(fallback_parser)
-            
-            # Запускаем парсинг через цепочку
-            # print(f"[INFO] Запускаем цепочку парсеров для банкротного анализа...")
-            parsed_data = gkb_parser.parse(text)
-            
-            parsed_data["collaterals"] = extract_collateral_info(text)
-            # print(f"[INFO] Результат парсинга: {len(parsed_data.get('obligations', []))} обязательств найдено")
-            
+            # 🧮 БАНКРОТНЫЙ КАЛЬКУЛЯТОР: цепочка GKB -> PKB -> Fallback для точности
+            chain = UploadPipeline.BANKRUPTCY_CHAIN
         else:
-            # 📊 ОБЫЧНЫЙ РЕЖИМ: используем старый парсинг (не трогаем)
-            # if DEBUG_MODE: print(f"[INFO] Обычный режим: используем старую логику парсинга")
-            
-            # Импортируем старые модули
-            from text_extractor import extract_text_from_pdf
-            from ocr import ocr_file
-            from credit_parser import extract_credit_data_with_total
-            
-            # Извлекаем текст из PDF (старая логика)
-            text = extract_text_from_pdf(file_path)
-            if not text.strip():
-                text = ocr_file(file_path)
-            
-            # Парсим кредитный отчет (старая логика)
-            parsed_data = extract_credit_data_with_total(text)
-        # 🆕 ДОБАВИТЬ ЭТИ СТРОКИ - СОХРАНЕНИЕ В БД:
-        # Сохраняем в БД (однократно)  
+            # 📊 ОБЫЧНЫЙ РЕЖИМ: полная цепочка парсеров + залоги
+            chain = UploadPipeline.FULL_CHAIN
+        upload = analyze_upload_cached(job_dispatcher.run_cpu, file_path, user_id, chain)
+        parsed_data = upload["parsed_data"]
+
+        # Тип документа и отладочная копия текста (без повторного извлечения)
         try:
-            process_uploaded_file(file_path, user_id)
-            # if DEBUG_MODE: print(f"[INFO] Кредитный отчет пользователя {user_id} сохранен в БД")
+            process_uploaded_file(file_path, user_id, text=upload["text"])
         except Exception as save_error:
-            print(f"[ERROR] Ошибка сохранения в БД: {save_error}")
+            print(f"[ERROR] Ошибка обработки документа: {save_error}")
 
         if is_bankruptcy_mode:
             # РЕЖИМ БАНКРОТНОГО КАЛЬКУЛЯТОРА
@@ -1879,22 +1882,24 @@ def handle_credit_report_pdf(message):
             markup.add(types.InlineKeyboardButton("🔙 Главное меню", callback_data="back_to_menu"))
             markup.add(types.InlineKeyboardButton("📊 Проверить другой отчет", callback_data="bankruptcy_calculator"))
             
-            # Отправляем результат банкротного анализа
-            bot.edit_message_text(
-                chat_id=message.chat.id,
-                message_id=status_msg.message_id,
-                text="✅ **Банкротный анализ завершен**",
-                parse_mode='Markdown'
-            )
+            # Отправляем результат банкротного анализа (повтор задачи его не дублирует)
+            if not progress.done("result_sent"):
+                bot.edit_message_text(
+                    chat_id=message.chat.id,
+                    message_id=status_msg.message_id,
+                    text="✅ **Банкротный анализ завершен**",
+                    parse_mode='Markdown'
+                )
             
-            # Отправляем детальный анализ
-            send_long_message(
-                bot=bot,   
-                chat_id=message.chat.id,
-                text=bankruptcy_analysis,
-                reply_markup=markup,
-                parse_mode='Markdown'
-            )
+                # Отправляем детальный анализ
+                send_long_message(
+                    bot=bot,   
+                    chat_id=message.chat.id,
+                    text=bankruptcy_analysis,
+                    reply_markup=markup,
+                    parse_mode='Markdown'
+                )
+                progress.mark("result_sent")
             
         else:
             # ОБЫЧНЫЙ РЕЖИМ ПРОВЕРКИ КРЕДИТНОГО ОТЧЕТА
@@ -1909,7 +1914,7 @@ def handle_credit_report_pdf(message):
             # ЗАМЕНИТЕ старый блок try/except на этот новый:
             try:
                 from credit_application_generator import generate_applications_from_parsed_data
-                result = generate_applications_from_parsed_data(parsed_data, user_id)
+                result = job_dispatcher.run_cpu(generate_applications_from_parsed_data, parsed_data, user_id)
                 # print(f"[INFO] Результат генерации: статус={result.get('status')}, заявлений={result.get('applications_count', 0)}")
             except Exception as generation_error:
                 print(f"[ERROR] Ошибка генерации заявлений: {generation_error}")
@@ -1933,45 +1938,51 @@ def handle_credit_report_pdf(message):
             # Отправляем анализ кредитного отчета
             if result and "message" in result:
                 
-                # ДОБАВЬТЕ эту проверку статуса в самом начале:
-                if result.get('status') == 'error':
-                    # Если ошибка генерации, все равно показываем анализ отчета
-                    send_long_message(
-                        bot=bot,
-                        chat_id=message.chat.id,
-                        text=f"✅ **Анализ завершен**\n\n{result['message']}\n\n⚠️ Заявления не сгенерированы из-за ошибки.",
-                        reply_markup=markup,
-                        parse_mode='Markdown'
-                    )
+                if not progress.done("result_sent"):
+                    # ДОБАВЬТЕ эту проверку статуса в самом начале:
+                    if result.get('status') == 'error':
+                        # Если ошибка генерации, все равно показываем анализ отчета
+                        send_long_message(
+                            bot=bot,
+                            chat_id=message.chat.id,
+                            text=f"✅ **Анализ завершен**\n\n{result['message']}\n\n⚠️ Заявления не сгенерированы из-за ошибки.",
+                            reply_markup=markup,
+                            parse_mode='Markdown'
+                        )
                     
-                    # Показываем банкротный анализ
-                    bankruptcy_analysis = analyze_credit_report_for_bankruptcy(parsed_data)
-                    bot.send_message(
-                        chat_id=message.chat.id,
-                        text=f"🧮 **ДОПОЛНИТЕЛЬНО: Банкротный анализ**\n\n{bankruptcy_analysis}",
-                        parse_mode='Markdown'
-                    )
+                        # Показываем банкротный анализ
+                        bankruptcy_analysis = analyze_credit_report_for_bankruptcy(parsed_data)
+                        bot.send_message(
+                            chat_id=message.chat.id,
+                            text=f"🧮 **ДОПОЛНИТЕЛЬНО: Банкротный анализ**\n\n{bankruptcy_analysis}",
+                            parse_mode='Markdown'
+                        )
                     
-                else:
-                    # ОРИГИНАЛЬНЫЙ КОД остается БЕЗ ИЗМЕНЕНИЙ:
-                    send_long_message(
-                        bot=bot,
-                        chat_id=message.chat.id,
-                        text=f"✅ **Анализ завершен**\n\n{result['message']}",
-                        reply_markup=markup,
-                        parse_mode='Markdown'
-                    )
+                    else:
+                        # ОРИГИНАЛЬНЫЙ КОД остается БЕЗ ИЗМЕНЕНИЙ:
+                        send_long_message(
+                            bot=bot,
+                            chat_id=message.chat.id,
+                            text=f"✅ **Анализ завершен**\n\n{result['message']}",
+                            reply_markup=markup,
+                            parse_mode='Markdown'
+                        )
+                    progress.mark("result_sent")
                 
                 # Отправляем сгенерированные заявления (если есть)
                 if result.get('applications'):
                     applications = result['applications']
-                    bot.send_message(
-                        chat_id=message.chat.id,
-                        text=f"📄 Генерирую {len(applications)} заявлений к кредиторам..."
-                    )
+                    if not progress.done("applications_notice"):
+                        bot.send_message(
+                            chat_id=message.chat.id,
+                            text=f"📄 Генерирую {len(applications)} заявлений к кредиторам..."
+                        )
+                        progress.mark("applications_notice")
                     
                     # Отправляем каждое заявление как отдельный PDF
                     for i, app in enumerate(applications, 1):
+                        if progress.done(f"application_{i}"):
+                            continue
                         try:
                             temp_pdf_path = f"temp/application_{i}_{user_id}.pdf"
                             with open(temp_pdf_path, 'wb') as f:
@@ -1984,6 +1995,7 @@ def handle_credit_report_pdf(message):
                                     caption=f"📋 Заявление #{i}: {app['creditor']}\n💰 Сумма долга: {app['debt_amount']:,.2f} ₸",
                                     visible_file_name=app['filename']
                                 )
+                            progress.mark(f"application_{i}")
                             
                             # Удаляем временный файл
                             try:
@@ -2004,39 +2016,45 @@ def handle_credit_report_pdf(message):
                     # )
                     
                     # Итоговое сообщение
-                    bot.send_message(
-                        chat_id=message.chat.id,
-                        text=f"✅ **Готово!**\n\n"
-                             f"📊 Отчет проанализирован\n"
-                             f"📄 Отправлено {len(applications)} заявлений\n"
-                             f"🧮 Проведен банкротный анализ\n\n"
-                             f"💡 **Что делать дальше:**\n"
-                             f"1. Распечатайте заявления\n"  
-                             f"2. Подпишите и поставьте дату\n"
-                             f"3. Отправьте кредиторам по почте\n"
-                             f"4. Рассмотрите рекомендации по банкротству",
-                        parse_mode='Markdown'
-                    )
+                    if not progress.done("summary_sent"):
+                        bot.send_message(
+                            chat_id=message.chat.id,
+                            text=f"✅ **Готово!**\n\n"
+                                 f"📊 Отчет проанализирован\n"
+                                 f"📄 Отправлено {len(applications)} заявлений\n"
+                                 f"🧮 Проведен банкротный анализ\n\n"
+                                 f"💡 **Что делать дальше:**\n"
+                                 f"1. Распечатайте заявления\n"  
+                                 f"2. Подпишите и поставьте дату\n"
+                                 f"3. Отправьте кредиторам по почте\n"
+                                 f"4. Рассмотрите рекомендации по банкротству",
+                            parse_mode='Markdown'
+                        )
+                        progress.mark("summary_sent")
                     
                     # НЕ сбрасываем состояние здесь - оно установится в конце функции
                     pass
                 else:
                     # Если заявления не сгенерированы, все равно показываем банкротный анализ
-                    bankruptcy_analysis = analyze_credit_report_for_bankruptcy(parsed_data)
+                    if not progress.done("bankruptcy_sent"):
+                        bankruptcy_analysis = analyze_credit_report_for_bankruptcy(parsed_data)
+                        
+                        bot.send_message(
+                            chat_id=message.chat.id,
+                            text=f"🧮 **ДОПОЛНИТЕЛЬНО: Банкротный анализ**\n\n{bankruptcy_analysis}",
+                            parse_mode='Markdown'
+                        )
+                        progress.mark("bankruptcy_sent")
                     
+                    # Состояние будет установлено в конце функции
+            else:
+                if not progress.done("result_sent"):
                     bot.send_message(
                         chat_id=message.chat.id,
-                        text=f"🧮 **ДОПОЛНИТЕЛЬНО: Банкротный анализ**\n\n{bankruptcy_analysis}",
-                        parse_mode='Markdown'
+                        text="❌ Не удалось обработать файл.\nПроверьте, что это корректный кредитный отчет.",
+                        reply_markup=markup
                     )
-                    
-                    # Состояние будет установлено в конце функции
-            else:
-                bot.send_message(
-                    chat_id=message.chat.id,
-                    text="❌ Не удалось обработать файл.\nПроверьте, что это корректный кредитный отчет.",
-                    reply_markup=markup
-                )
+                    progress.mark("result_sent")
                 # Состояние будет установлено в конце функции при любом исходе
         
         # Удаляем исходный временный файл
@@ -2051,42 +2069,29 @@ def handle_credit_report_pdf(message):
         except:
             pass
         
-        # Сбрасываем состояние пользователя
-        if is_bankruptcy_mode:
-            # После банкротного анализа даем пользователю время на изучение результата
-            user_states[user_id] = "bankruptcy_analysis_completed"
-        elif is_creditors_list_mode:
-            # После создания списка кредиторов даем пользователю время на изучение
-            user_states[user_id] = "creditors_list_completed"
-        elif is_credit_report_mode:
-            # После проверки кредитного отчета даем пользователю время на изучение
-            user_states[user_id] = "credit_report_completed"
-        else:
-            user_states.pop(user_id, None)
+        # Сбрасываем состояние пользователя (для задач из очереди это уже сделал бот при постановке)
+        set_document_state(user_id, completed_document_state(current_state))
         
         # Логируем успешную обработку
         mode = "банкротного анализа" if is_bankruptcy_mode else "кредитного отчета"
         # if DEBUG_MODE: print(f"[INFO] Успешно обработан {mode} пользователя {user_id}")
         
     except Exception as e:
+        if raise_errors:
+            raise
         print(f"[ERROR] Ошибка при обработке: {e}")
         import traceback
         traceback.print_exc()
-        try:
-            bot.edit_message_text(
-                chat_id=message.chat.id,
-                message_id=status_msg.message_id,
-                text=f"❌ Произошла ошибка: {str(e)}\nПопробуйте позже или обратитесь к администратору."
-            )
-        except:
-            bot.send_message(
-                message.chat.id,
-                f"❌ Произошла ошибка: {str(e)}\nПопробуйте позже или обратитесь к администратору."
-            )
+        report_document_error(message, status_msg.message_id if status_msg else None, e)
 
-def handle_creditors_list_pdf(message):
-    """Обработка PDF файла для создания списка кредиторов"""
+def handle_creditors_list_pdf(message, progress=None, raise_errors=False):
+    """
+    Обработка PDF файла для создания списка кредиторов.
+    progress и raise_errors - для задач из очереди (см. handle_credit_report_pdf).
+    """
     user_id = message.from_user.id
+    progress = progress or JobProgress()
+    status_msg = None
     
     try:
         # Проверяем, что это PDF файл
@@ -2099,9 +2104,10 @@ def handle_creditors_list_pdf(message):
             return
         
         # Отправляем сообщение о начале обработки
-        status_msg = bot.send_message(
+        status_msg = send_document_status(
             message.chat.id, 
-            "⏳ Создаю список кредиторов...\n📄 Извлекаю данные из PDF..."
+            "⏳ Создаю список кредиторов...\n📄 Извлекаю данные из PDF...",
+            progress
         )
         
         # Сохраняем файл во временную папку
@@ -2119,8 +2125,8 @@ def handle_creditors_list_pdf(message):
             text="⏳ Создаю список кредиторов...\n🔍 Анализирую кредиторов..."
         )
         
-        # Обрабатываем файл через нашу функцию
-        result = process_all_creditors_request(file_path, user_id)
+        # Обрабатываем файл через нашу функцию (извлечение, парсинг и PDF - в пуле процессов)
+        result = job_dispatcher.run_cpu(process_all_creditors_request, file_path, user_id)
         
         # Обновляем статус
         bot.edit_message_text(
@@ -2134,36 +2140,39 @@ def handle_creditors_list_pdf(message):
             pdf_path = result["pdf_path"]
             creditors_count = result["creditors_count"]
             
-            with open(pdf_path, 'rb') as pdf_file:
-                bot.send_document(
+            # Повтор задачи из очереди не присылает список второй раз
+            if not progress.done("result_sent"):
+                with open(pdf_path, 'rb') as pdf_file:
+                    bot.send_document(
+                        chat_id=message.chat.id,
+                        document=pdf_file,
+                        caption=f"📋 **Список кредиторов**\n\n"
+                               f"👥 Найдено кредиторов: {creditors_count}\n"
+                               f"📄 Готово для приложения к заявлению о банкротстве\n\n"
+                               f"💡 **Как использовать:**\n"
+                               f"1. Распечатайте документ\n"
+                               f"2. Приложите к заявлению о банкротстве\n"
+                               f"3. Подайте в суд или используйте для процедуры",
+                        visible_file_name="Список_кредиторов.pdf",
+                        parse_mode='Markdown'
+                    )
+            
+                # Создаем кнопки для навигации
+                markup = types.InlineKeyboardMarkup()
+                markup.add(types.InlineKeyboardButton("🔙 Главное меню", callback_data="back_to_menu"))
+                markup.add(types.InlineKeyboardButton("📋 Создать еще один список", callback_data="creditors_list"))
+                markup.add(types.InlineKeyboardButton("🧮 Банкротный калькулятор", callback_data="bankruptcy_calculator"))
+            
+                # Финальное сообщение
+                bot.send_message(
                     chat_id=message.chat.id,
-                    document=pdf_file,
-                    caption=f"📋 **Список кредиторов**\n\n"
-                           f"👥 Найдено кредиторов: {creditors_count}\n"
-                           f"📄 Готово для приложения к заявлению о банкротстве\n\n"
-                           f"💡 **Как использовать:**\n"
-                           f"1. Распечатайте документ\n"
-                           f"2. Приложите к заявлению о банкротстве\n"
-                           f"3. Подайте в суд или используйте для процедуры",
-                    visible_file_name="Список_кредиторов.pdf",
+                    text="✅ **Список кредиторов готов!**\n\n"
+                         "📋 PDF документ содержит полную информацию о всех ваших кредиторах.\n"
+                         "🎯 Этот документ можно использовать в процедуре банкротства.",
+                    reply_markup=markup,
                     parse_mode='Markdown'
                 )
-            
-            # Создаем кнопки для навигации
-            markup = types.InlineKeyboardMarkup()
-            markup.add(types.InlineKeyboardButton("🔙 Главное меню", callback_data="back_to_menu"))
-            markup.add(types.InlineKeyboardButton("📋 Создать еще один список", callback_data="creditors_list"))
-            markup.add(types.InlineKeyboardButton("🧮 Банкротный калькулятор", callback_data="bankruptcy_calculator"))
-            
-            # Финальное сообщение
-            bot.send_message(
-                chat_id=message.chat.id,
-                text="✅ **Список кредиторов готов!**\n\n"
-                     "📋 PDF документ содержит полную информацию о всех ваших кредиторах.\n"
-                     "🎯 Этот документ можно использовать в процедуре банкротства.",
-                reply_markup=markup,
-                parse_mode='Markdown'
-            )
+                progress.mark("result_sent")
             
             # Удаляем временный PDF
             try:
@@ -2210,21 +2219,13 @@ def handle_creditors_list_pdf(message):
         # if DEBUG_MODE: print(f"[INFO] Создан список кредиторов для пользователя {user_id}")
         
     except Exception as e:
+        if raise_errors:
+            raise
         print(f"[ERROR] Ошибка создания списка кредиторов: {e}")
         import traceback
         traceback.print_exc()
         
-        try:
-            bot.edit_message_text(
-                chat_id=message.chat.id,
-                message_id=status_msg.message_id,
-                text=f"❌ Произошла ошибка: {str(e)}\nПопробуйте позже или обратитесь к администратору."
-            )
-        except:
-            bot.send_message(
-                message.chat.id,
-                f"❌ Произошла ошибка: {str(e)}\nПопробуйте позже или обратитесь к администратору."
-            )
+        report_document_error(message, status_msg.message_id if status_msg else None, e)
 
 def handle_payment_receipt(message):
     """Обработка чека об оплате (существующая логика)"""
@@ -2424,6 +2425,46 @@ def migration_status(message):
     except Exception as e:
         bot.reply_to(message, f"❌ Ошибка при получении статуса миграции: {str(e)}")
 
+@bot.message_handler(commands=['cache_stats'])
+def cache_stats(message):
+    """Показывает статистику кэшей обработки отчетов"""
+    ADMIN_USER_IDS = [7920066963, 827743984]
+    if message.from_user.id not in ADMIN_USER_IDS:
+        bot.reply_to(message, "⛔ У вас нет прав для выполнения этой команды.")
+        return
+
+    from text_cache import text_cache
+    from parse_cache import parse_cache
+    stats = text_cache.stats()
+    parse_stats = parse_cache.stats()
+    jobs = job_dispatcher.stats()
+    job_lines = "\n".join(
+        f"• {kind}: в работе {kind_stats['running']}, в очереди {kind_stats['queued']}, "
+        f"готово {kind_stats['completed']}, ошибок {kind_stats['failed']}, "
+        f"ожидание {kind_stats['avg_wait_s']} с, выполнение {kind_stats['avg_run_s']} с"
+        for kind, kind_stats in jobs["kinds"].items()
+    ) or "• задач еще не было"
+
+    response = (
+        f"📊 Кэш извлеченного текста PDF\n\n"
+        f"🧠 Попаданий в памяти: {stats['memory_hits']}\n"
+        f"💾 Попаданий на диске: {stats['disk_hits']}\n"
+        f"❌ Промахов: {stats['misses']}\n"
+        f"📈 Hit rate: {stats['hit_rate'] * 100:.1f}%\n"
+        f"📦 Записей в памяти: {stats['memory_items']}\n"
+        f"🧹 Удалено с диска (срок/размер): {stats['disk_pruned']}\n\n"
+        f"🧩 Кэш результатов парсинга в процессе бота (версия {parse_stats['version']}, у воркеров пула свой)\n\n"
+        f"✅ Попаданий: {parse_stats['hits']}\n"
+        f"❌ Промахов: {parse_stats['misses']}\n"
+        f"📈 Hit rate: {parse_stats['hit_rate'] * 100:.1f}%\n"
+        f"📦 Записей: {parse_stats['items']}\n\n"
+        f"⚙️ Фоновые задачи\n\n"
+        f"⏳ В очереди: {jobs['queued']}, в работе: {jobs['running']}, "
+        f"отклонено по лимиту: {jobs['rejected']}, перезапусков пула процессов: {jobs['cpu_pool_restarts']}\n"
+        f"{job_lines}"
+    )
+    bot.send_message(message.chat.id, response)
+
 @bot.message_handler(commands=['notify_old_users'])
 def notify_old_users(message):
     """Отправляет уведомление старым пользователям о необходимости обновления"""
@@ -3080,8 +3121,14 @@ def handle_lawyer_question(message):
             except Exception as e:
                 print(f"[WARN] Не удалось обновить статус: {e}")
 
+        # Итоговый ответ дописывается в статусное сообщение по мере генерации
+        answer_stream = StreamingMessage(
+            bot, message.chat.id, status_msg.message_id,
+            send_long=lambda long_text: send_long_message(bot, message.chat.id, long_text),
+        )
+
         # Получаем ответ от юридического движка
-        answer = query(text, progress_callback=progress_callback)
+        answer = query(text, progress_callback=progress_callback, on_answer_update=answer_stream.update)
 
         # Сохраняем ответ
         users_collection.update_one(
@@ -3104,11 +3151,7 @@ def handle_lawyer_question(message):
         remaining = user.get("message_limit", 1) - 1
         final_answer = f"{answer}\n\n📝 Осталось вопросов: {remaining}"
         
-        bot.edit_message_text(
-            chat_id=message.chat.id,
-            message_id=status_msg.message_id,
-            text=final_answer
-        )
+        answer_stream.finish(final_answer)
         
     except Exception as e:
         print(f"[ERROR] {e}")
@@ -3228,11 +3271,17 @@ def handle_document(message):
     # Проверяем состояние пользователя
     if current_state in ["waiting_credit_report", "waiting_bankruptcy_report"]:
         # Обработка кредитного отчета (включая банкротный анализ)
-        handle_credit_report_pdf(message)
+        if JOB_QUEUE_ENABLED:
+            enqueue_document_job(message, "credit_report")
+        else:
+            dispatch_user_job(message, handle_credit_report_pdf, "credit_report")
         return
     elif current_state == "waiting_creditors_list":
         # Обработка создания списка кредиторов
-        handle_creditors_list_pdf(message)
+        if JOB_QUEUE_ENABLED:
+            enqueue_document_job(message, "creditors_list")
+        else:
+            dispatch_user_job(message, handle_creditors_list_pdf, "creditors_list")
         return
     else:
         # Обработка чека об оплате (существующая логика)
@@ -3369,7 +3418,7 @@ def handle_all_messages(message):
 
     # 1️⃣ Пользователь в режиме переписки с юристом
     if current_state == "lawyer_consultation":
-        handle_lawyer_question(message)
+        dispatch_user_job(message, handle_lawyer_question, "lawyer_question")
         return
 
     # 2️⃣ ПЕРЕМЕСТИТЬ СЮДА проверку завершенных анализов - ДО проверки access
@@ -3433,7 +3482,7 @@ def handle_all_messages(message):
     try:
         user = users_collection.find_one({"user_id": user_id})
         if user and user.get("access") and user.get("message_limit", 0) > 0:
-            handle_lawyer_question(message)
+            dispatch_user_job(message, handle_lawyer_question, "lawyer_question")
             return
     except Exception as db_err:
         # Не критично: если не смогли проверить БД — пускаем сообщение дальше
@@ -3448,12 +3497,27 @@ if __name__ == "__main__":
     notification_scheduler.start_scheduler()
     print("[INFO] 📅 Автоматические уведомления включены")
 
-    while True:
-        try:
-            bot.polling(none_stop=True, timeout=60)
-        except Exception as e:
-            print(f"[ERROR] Polling crashed: {e}")
-            time.sleep(5)
+    # Индекс базы знаний и LLM юриста открываем в фоне: старт бота их не ждет
+    threading.Thread(target=warm_up_legal_engine, args=(users_collection,), daemon=True, name="legal-engine-warm-up").start()
+
+    if BOT_MODE == "webhook":
+        # Обновления принимает aiohttp-сервер и раздает обработчикам в ограниченный пул потоков
+        from webhook_server import run_webhook
+        run_webhook(bot)
+    elif BOT_MODE == "async":
+        # Те же обработчики в AsyncTeleBot: /start нативно (aiohttp + motor), остальные в потоках
+        from async_bot import run_async_bot, start_handler
+        run_async_bot(bot, {
+            main: lambda async_bot: start_handler(async_bot, create_main_menu, START_ADMIN_IDS),
+        })
+    else:
+        bot.remove_webhook()  # polling не работает, пока у бота зарегистрирован webhook
+        while True:
+            try:
+                bot.polling(none_stop=True, timeout=60)
+            except Exception as e:
+                print(f"[ERROR] Polling crashed: {e}")
+                time.sleep(5)
 
 # Удалите старый @bot.message_handler(func=lambda message: True)
 
@@ -1,10 +1,181 @@
 # ocr.py
 
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import nullcontext
+
 import pytesseract
-from pdf2image import convert_from_path
+from dotenv import load_dotenv
+from pdf2image import convert_from_path, pdfinfo_from_path
 from PIL import Image
-import os
 
+from text_cache import cached_text_extraction
+
+load_dotenv()
+
+OCR_LANG = "kaz+rus"
+# Путь к poppler (на macOS обычно /opt/homebrew/bin), по умолчанию ищем в PATH
+POPPLER_PATH = os.getenv("POPPLER_PATH") or None
+# Процессов OCR на весь процесс бота: один общий пул на все одновременные загрузки
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(min(2, os.cpu_count() or 1))))
+# Сколько страниц подряд обрабатывает один воркер (растеризация все равно по одной)
+OCR_CHUNK_PAGES = int(os.getenv("OCR_CHUNK_PAGES", "2"))
+# Таймаут tesseract на одну страницу, секунд (0 - без ограничения)
+OCR_PAGE_TIMEOUT = int(os.getenv("OCR_PAGE_TIMEOUT", "120"))
+# Разрешение растеризации (200 - значение по умолчанию pdf2image)
+OCR_DPI = int(os.getenv("OCR_DPI", "200"))
+# Растеризовать страницы во временные файлы на диске вместо памяти
+OCR_STREAM_TO_DISK = os.getenv("OCR_STREAM_TO_DISK", "False").lower() == "true"
+
+
+def _ocr_image(image, page_timeout=OCR_PAGE_TIMEOUT):
+    """Распознает одну страницу; при таймауте возвращает пустую строку"""
+    try:
+        return pytesseract.image_to_string(image, lang=OCR_LANG, timeout=page_timeout)
+    except RuntimeError as e:
+        # pytesseract сигнализирует о таймауте через RuntimeError
+        print(f"[WARN] OCR страницы прерван по таймауту ({page_timeout} с): {e}")
+        return ""
+
+
+def _rasterize_page(filepath, page_number, output_folder=None):
+    """
+    Растеризует одну страницу PDF.
+    С output_folder poppler пишет PNG на диск, и в памяти нет копии из пайпа pdftoppm.
+    Возвращает (изображение, путь к файлу или None).
+    """
+    if output_folder:
+        paths = convert_from_path(
+            filepath,
+            dpi=OCR_DPI,
+            first_page=page_number,
+            last_page=page_number,
+            poppler_path=POPPLER_PATH,
+            output_folder=output_folder,
+            fmt="png",
+            paths_only=True
+        )
+        return Image.open(paths[0]), paths[0]
+
+    images = convert_from_path(
+        filepath,
+        dpi=OCR_DPI,
+        first_page=page_number,
+        last_page=page_number,
+        poppler_path=POPPLER_PATH
+    )
+    return images[0], None
+
+
+def _ocr_pdf_chunk(filepath, page_numbers, page_timeout, to_disk=None):
+    """
+    Распознает страницы page_numbers (нумерация с 1).
+    Страницы растеризуются по одной и освобождаются сразу после OCR,
+    поэтому пиковая память воркера - одна страница, независимо от размера скана.
+    Выполняется в отдельном процессе, поэтому в воркер передаются только
+    путь и номера страниц, а не изображения.
+    """
+    to_disk = OCR_STREAM_TO_DISK if to_disk is None else to_disk
+    texts = []
+
+    with (tempfile.TemporaryDirectory(prefix="ocr_") if to_disk else nullcontext()) as output_folder:
+        for page_number in page_numbers:
+            print(f"[DEBUG] OCR page {page_number}")
+            image, image_path = _rasterize_page(filepath, page_number, output_folder)
+            try:
+                texts.append(_ocr_image(image, page_timeout))
+            finally:
+                image.close()
+                del image
+                if image_path:
+                    os.remove(image_path)
+
+    return texts
+
+
+def _page_chunks(page_numbers, chunk_pages):
+    """Делит список номеров страниц на пачки по chunk_pages"""
+    chunk_pages = max(1, chunk_pages)
+    return [page_numbers[i:i + chunk_pages] for i in range(0, len(page_numbers), chunk_pages)]
+
+
+_pool_lock = threading.Lock()
+_pool = None
+
+
+def _ocr_pool(workers):
+    """
+    Общий пул процессов OCR (создается при первом скане с размером workers).
+    Одновременные загрузки ставят пачки страниц в одну очередь пула.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, а не fork: бот многопоточный, fork из потока может зависнуть на чужих блокировках
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _drop_ocr_pool(pool):
+    """Пул с умершим процессом больше не работает: следующий скан создаст новый"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def ocr_pages(filepath, page_numbers=None, workers=None, page_timeout=None, chunk_pages=None):
+    """
+    OCR выбранных страниц PDF (по умолчанию - всех) пачками в общем пуле процессов.
+    Возвращает {номер_страницы: текст}.
+    """
+    workers = OCR_WORKERS if workers is None else workers
+    page_timeout = OCR_PAGE_TIMEOUT if page_timeout is None else page_timeout
+    chunk_pages = OCR_CHUNK_PAGES if chunk_pages is None else chunk_pages
+
+    if page_numbers is None:
+        page_count = pdfinfo_from_path(filepath, poppler_path=POPPLER_PATH)["Pages"]
+        page_numbers = list(range(1, page_count + 1))
+    else:
+        page_numbers = sorted(page_numbers)
+
+    chunks = _page_chunks(page_numbers, chunk_pages)
+    print(f"[DEBUG] OCR {len(page_numbers)} страниц, {len(chunks)} пачек, воркеров: {workers}")
+
+    if workers <= 1 or len(chunks) <= 1:
+        chunk_texts = [_ocr_pdf_chunk(filepath, chunk, page_timeout) for chunk in chunks]
+    else:
+        pool = _ocr_pool(workers)
+        try:
+            chunk_texts = list(pool.map(
+                _ocr_pdf_chunk,
+                [filepath] * len(chunks),
+                chunks,
+                [page_timeout] * len(chunks)
+            ))
+        except BrokenProcessPool:
+            _drop_ocr_pool(pool)
+            raise
+
+    texts = [text for chunk in chunk_texts for text in chunk]
+    return dict(zip(page_numbers, texts))
+
+
+def ocr_pdf(filepath, workers=None, page_timeout=None, chunk_pages=None):
+    """
+    OCR всего PDF пачками страниц в пуле процессов.
+    Порядок страниц в результате сохраняется.
+    """
+    page_texts = ocr_pages(filepath, None, workers, page_timeout, chunk_pages)
+    return "".join(page_texts[page] for page in sorted(page_texts))
+
+
+@cached_text_extraction("ocr")
 def ocr_file(filepath):
     print(f"[DEBUG] OCR started for file: {filepath}")
     """
@@ -14,17 +185,14 @@ def ocr_file(filepath):
     text = ""
     if filepath.lower().endswith(".pdf"):
         try:
-            images = convert_from_path(filepath, poppler_path="/opt/homebrew/bin")  # путь для macOS
-            for i, img in enumerate(images):
-                print(f"[DEBUG] OCR page {i+1}/{len(images)}")
-                text += pytesseract.image_to_string(img, lang="kaz+rus")
+            text = ocr_pdf(filepath)
         except Exception as e:
             print(f"[ERROR] Ошибка при обработке PDF: {e}")
             raise
     else:
         try:
             image = Image.open(filepath)
-            text = pytesseract.image_to_string(image, lang="kaz+rus")
+            text = _ocr_image(image)
         except Exception as e:
             print(f"[ERROR] Ошибка при обработке изображения: {e}")
             raise
@@ -0,0 +1,112 @@
+# parse_cache.py
+
+import copy
+import hashlib
+import os
+import threading
+
+from dotenv import load_dotenv
+
+from text_cache import LRUCache, file_sha256
+
+load_dotenv()
+
+PARSE_CACHE_ENABLED = os.getenv("PARSE_CACHE_ENABLED", "True").lower() == "true"
+PARSE_CACHE_SIZE = int(os.getenv("PARSE_CACHE_SIZE", "256"))
+
+# Файлы, от кода которых зависит результат парсинга
+PARSER_SOURCE_FILES = [
+    "credit_parser.py",
+    "improved_pkb_parser.py",
+    "collateral_parser.py",
+    "regex_patterns.py",
+    "format_detector.py",
+    "report_sections.py",
+]
+
+
+def parser_code_version() -> str:
+    """
+    Версия кода парсеров - хеш исходников.
+    Любая правка парсеров меняет версию, и старые записи кэша перестают находиться.
+    """
+    digest = hashlib.sha256()
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    for name in PARSER_SOURCE_FILES:
+        try:
+            with open(os.path.join(base_dir, name), "rb") as f:
+                digest.update(f.read())
+        except OSError:
+            digest.update(name.encode())
+    return digest.hexdigest()[:12]
+
+
+def text_sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+class ParseCache:
+    """
+    Кэш результатов парсинга по (хеш текста, парсер, версия кода парсеров).
+    Результаты отдаются копиями: вызывающий код дописывает в них поля (collaterals и т.п.).
+
+    Кэш живет в памяти процесса. Парсеры бота выполняются в воркерах job_dispatcher,
+    и у каждого воркера свой кэш; процесс бота кэширует весь разбор загрузки
+    по содержимому файла (get_or_compute_file), не отправляя повторную загрузку в пул.
+    """
+
+    def __init__(self, max_items=PARSE_CACHE_SIZE):
+        self.items = LRUCache(max_items)
+        self.version = parser_code_version()
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, text, parser_name, compute):
+        """Возвращает результат parser_name для text, вычисляя compute() при промахе"""
+        if not PARSE_CACHE_ENABLED:
+            return compute()
+        return self._get_or_compute((text_sha256(text), parser_name, self.version), compute)
+
+    def get_or_compute_file(self, filepath, name, compute, cache_if=None):
+        """
+        Результат name для файла filepath (по SHA-256 содержимого), вычисляя compute() при промахе.
+        cache_if(результат) -> bool: сохранять ли результат (пустой текст не сохраняем, повтор пойдет в OCR).
+        """
+        if not PARSE_CACHE_ENABLED:
+            return compute()
+
+        try:
+            file_hash = file_sha256(filepath)
+        except OSError:
+            return compute()
+        return self._get_or_compute((file_hash, f"file:{name}", self.version), compute, cache_if)
+
+    def _get_or_compute(self, key, compute, cache_if=None):
+        cached = self.items.get(key)
+        if cached is not None:
+            with self._stats_lock:
+                self.hits += 1
+            return copy.deepcopy(cached)
+
+        with self._stats_lock:
+            self.misses += 1
+
+        result = compute()
+        if result is not None and (cache_if is None or cache_if(result)):
+            self.items.set(key, copy.deepcopy(result))
+        return result
+
+    def stats(self):
+        with self._stats_lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "items": len(self.items),
+                "version": self.version,
+            }
+
+
+parse_cache = ParseCache()
@@ -0,0 +1,112 @@
+# regex_patterns.py
+"""
+Скомпилированные регулярные выражения парсеров кредитных отчетов.
+
+Паттерны компилируются один раз при импорте и используются во всех парсерах
+(credit_parser.py, improved_pkb_parser.py, collateral_parser.py), вместо re.search(r"...") со
+строкой внутри циклов по обязательствам и строкам таблиц.
+Менять паттерн нужно здесь - так он одинаково меняется для всех парсеров.
+"""
+
+import re
+
+# ========== Общие ==========
+
+# Сумма перед "KZT": "1 234 567,89 KZT"
+KZT_AMOUNT = re.compile(r"([\d\s.,]+)\s*KZT")
+# Та же сумма без группы - для вырезания сумм из строки
+KZT_AMOUNT_SPAN = re.compile(r"[\d\s.,]+\s*KZT")
+DATE_IN_TEXT = re.compile(r"\b\d{1,2}\.\d{1,2}\.\d{4}\b")
+NON_NUMERIC = re.compile(r"[^\d.,]")
+WHITESPACE = re.compile(r"\s+")
+OVERDUE_DAYS_FIELD = re.compile(r"Количество дней просрочки:\s*(\d+)")
+
+# ========== ПКБ: шапка и сводка (improved_pkb_parser.FinalPKBParser) ==========
+
+PKB_HEADER = re.compile(
+    r"(\d{2}\.\d{2}\.\d{4} \d{2}:\d{2}:\d{2})\s*\n([А-ЯЁІӘӨҰҚҢҮҺ\s]+)\s*\((\d{2}\.\d{2}\.\d{4}) г\.р\.\)"
+)
+PKB_IIN = re.compile(r"ИИН:\s*(\d{12})")
+PKB_ADDRESS = re.compile(r"МЕСТО ЖИТЕЛЬСТВА:\s*([^\n]+)")
+PKB_DOCUMENT_NUMBER = re.compile(r"НОМЕР ДОКУМЕНТА:\s*(\d+)")
+
+# Число договоров перед ключевой фразой сводки
+PKB_CONTRACT_SUMMARY = [
+    (re.compile(r"(\d+)\s+Действующие договоры без просрочки"), "active_without_overdue"),
+    (re.compile(r"(\d+)\s+Действующие договоры с просрочкой"), "active_with_overdue"),
+    (re.compile(r"(\d+)\s+Завершенные договоры без просрочки"), "completed_without_overdue"),
+    (re.compile(r"(\d+)\s+Завершенные договоры с просрочкой"), "completed_with_overdue"),
+]
+
+# Строка "Итого:" таблицы действующих договоров
+PKB_ACTIVE_TOTALS = re.compile(
+    r"ИНФОРМАЦИЯ ПО ДЕЙСТВУЮЩИМ КРЕДИТНЫМ ДОГОВОРАМ.*?Итого:\s*\n(.*?)(?=ИНФОРМАЦИЯ|$)",
+    re.DOTALL,
+)
+PKB_TOTALS_LINE = re.compile(r"Итого:\s*(.+?)(?:\n|\r\n|$)")
+
+# ========== ПКБ: таблица действующих договоров ==========
+
+# Границы таблицы - report_sections.PKB_ACTIVE; начало договора в таблице
+PKB_CREDITOR_SPLIT = re.compile(r"(?=(?:Займ|Кредит)\s+[^\n]+)")
+
+# Название кредитора в блоке договора, в порядке приоритета
+PKB_CREDITOR_NAME = [
+    re.compile(r"(?:Кредитная карта|Займ|Кредит)\s+(.*?)\s+Заёмщик", re.DOTALL),
+    re.compile(r'\b(АО|ТОО|СФК)\s+["""«][^"""«»]+["""»]', re.DOTALL),
+    re.compile(r'\b(АО|ТОО|СФК)\s+"[^"]+?"', re.DOTALL),
+    re.compile(r"\b(АО|ТОО|СФК)\s+[^\n\r\t]+?(?=\s+Заёмщик)", re.DOTALL),
+]
+
+# Дни просрочки в строке таблицы: "KZT 1 156 0 KZT" (с пробелом) и "KZT 245 -"
+PKB_SPACED_DAYS = re.compile(r"KZT\s+(\d{1,2})\s+(\d{2,3})\s+(?:0\s*KZT|-)")
+PKB_SINGLE_DAYS = re.compile(r"KZT\s+(\d{3,4})\s+(?:0\s*KZT|-)")
+PKB_SINGLE_NUMBER = re.compile(r"\b(\d{3,4})\b")
+PKB_PAIRED_NUMBER = re.compile(r"\b(\d{1,2})\s+(\d{2,3})\b")
+
+PKB_LAST_PAYMENT_AMOUNT = re.compile(r"Сумма последнего платежа:\s*([\d.,]+)\s*KZT")
+PKB_LAST_PAYMENT_DATE = re.compile(r"Дата последнего платежа:\s*(\d{2}\.\d{2}\.\d{4})")
+
+# Строка точной таблицы (credit_parser.PKBParser.parse_precise_table_line)
+PKB_ROW_LOAN_TYPE = re.compile(r"^(Займ|Кредитная карта)\s+")
+PKB_ROW_CREDITOR = re.compile(r"^(.*?)\s+Заёмщик")
+PKB_ROW_NUMBER = re.compile(r"\b(\d{1,4})\b")
+
+# ========== ПКБ: нормализация названий кредиторов ==========
+
+CREDITOR_QUOTES = re.compile(r"[«»„“”]")
+CREDITOR_LEGAL_FORM = re.compile(r"\b(тоо|ао|оао|зао|ооо|сфк)\b", re.IGNORECASE)
+CREDITOR_BUYBACK = re.compile(r"\bс правом обратного выкупа\b", re.IGNORECASE)
+CREDITOR_EXTRA_CHARS = re.compile(r'[^\w\s"()-]')
+
+# ========== ГКБ (credit_parser.GKBParser) ==========
+
+GKB_NAME = re.compile(r"Фамилия:\s*([^\n]+)\s+Имя:\s*([^\n]+)\s+Отчество:\s*([^\n]+)")
+GKB_IIN = re.compile(r"ИИН:\s*(\d+)")
+GKB_PHONE = re.compile(r"Моб\. тел\.:\s*(\d+)")
+GKB_EMAIL = re.compile(r"E-mail:\s*([^\s\n]+)")
+GKB_ADDRESS = re.compile(r"Постоянное место жительства.*?Улица:\s*([^\n]+)", re.DOTALL)
+
+# Раздел действующих договоров и блоки обязательств - report_sections (GKB_ACTIVE, OBLIGATION, CREDITOR)
+GKB_CREDITOR = re.compile(r"Кредитор:\s*(.+)")
+GKB_CONTRACT_NUMBER = re.compile(r"Номер договора:\s*(.+)")
+GKB_START_DATE = re.compile(r"Дата начала срока действия контракта:\s*(\d{2}\.\d{2}\.\d{4})")
+GKB_ISSUE_DATE = re.compile(r"Дата фактической выдачи:\s*(\d{2}\.\d{2}\.\d{4})")
+
+# Кандидаты на сумму долга (первое ненулевое значение по приоритету)
+GKB_OUTSTANDING = re.compile(r"Остаток задолженности.*?([\d\s]+\d(?:[,\.]\d+)?)\s*KZT")
+GKB_FUTURE_PAYMENTS = re.compile(r"Сумма предстоящих платежей.*?([\d\s]+\d(?:[,\.]\d+)?)\s*KZT")
+GKB_CONTRACT_SUM = re.compile(r"Сумма [Кк]редитного договора.*?([\d\s]+\d(?:[,\.]\d+)?)\s*KZT")
+GKB_OVERDUE_SUM = re.compile(r"Сумма просроченных взносов.*?([\d\s]+\d(?:[,\.]\d+)?)\s*KZT")
+
+GKB_OVERDUE_AMOUNT = re.compile(r"Сумма просроченных взносов.*?(\d+(?:\.\d+)?)\s*KZT")
+GKB_LOAN_TYPE = re.compile(r"Вид финансирования:\s*(.+)")
+GKB_INTEREST_RATE = re.compile(r"Годовая эффективная ставка вознаграждения:\s*(\d+\.\d+)\s*%")
+GKB_MONTHLY_PAYMENT = re.compile(r"Сумма ежемесячного платежа.*?(\d+(?:\.\d+)?)\s*KZT")
+
+# ========== Залоги (collateral_parser) ==========
+
+COLLATERAL_TYPE_VALUE = re.compile(
+    r"Вид обеспечения:\s*([^\n\r]+).*?Стоимость обеспечения /валюта:\s*([\d\s.,]+)\s*KZT", re.DOTALL
+)
+COLLATERAL_CREDITOR = re.compile(r"Кредитор:\s*(.+?)[\r\n]")
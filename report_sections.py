@@ -0,0 +1,183 @@
+# report_sections.py
+"""
+Индекс разделов кредитного отчета: смещения заголовков (RU/KZ) и границ обязательств.
+
+Парсеры и extract_collateral_info раньше каждый сам резали полный текст
+(DOTALL-regex по разделу, split по заголовкам, re.split по "Обязательство N").
+Индекс строится один раз на текст (для текущего объекта текста, как
+format_detector): каждый заголовок ищется в тексте не больше одного раза
+через str.find, найденные смещения переиспользуются всеми парсерами.
+
+У str нет memoryview, поэтому вместо него используются смещения: регулярные
+выражения ищут внутри раздела через pattern.search(text, start, end), а
+копия делается только там, где коду парсера нужна отдельная строка.
+"""
+
+import re
+from bisect import bisect_left
+from typing import Iterator, List, Optional, Tuple
+
+from text_memo import RecentTexts
+
+# ========== Заголовки разделов ==========
+
+# ГКБ
+GKB_ACTIVE = "ПОДРОБНАЯ ИНФОРМАЦИЯ ПО ДЕЙСТВУЮЩИМ ДОГОВОРАМ"
+GKB_COMPLETED = "ПОДРОБНАЯ ИНФОРМАЦИЯ О ЗАВЕРШЕННЫХ ДОГОВОРАХ"
+GKB_CURRENT_INFO = "Текущие сведения"
+
+# ПКБ
+PKB_ACTIVE = "ИНФОРМАЦИЯ ПО ДЕЙСТВУЮЩИМ КРЕДИТНЫМ ДОГОВОРАМ"
+PKB_ADDITIONAL = "ИНФОРМАЦИЯ ИЗ ДОПОЛНИТЕЛЬНЫХ"
+PKB_COMPLETED = "ЗАВЕРШЕННЫЕ ДОГОВОРЫ"
+TOTAL = "Итого:"
+
+# Казахский отчет
+KZ_ACTIVE = "ҚОЛДАНЫСТАҒЫ ШАРТТАР"
+KZ_COMPLETED = "АЯҚТАЛҒАН ШАРТТАР"
+
+# Начало обязательства: "Обязательство 3", "КОНТРАКТ 3", "Міндеттеме 3"
+OBLIGATION = "Обязательство"
+CONTRACT = "КОНТРАКТ"
+KZ_OBLIGATION = "Міндеттеме"
+# Начало блока кредитора в разделе договоров ГКБ
+CREDITOR = "Кредитор:"
+
+_MARKER_NUMBER = re.compile(r"\s+(\d+)")
+
+_indexes = RecentTexts(max_items=4)
+
+
+class ReportSections:
+    """Смещения заголовков и границ обязательств в тексте отчета (считаются лениво)"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self._offsets = {}
+        self._markers = {}
+
+    def offsets(self, heading: str) -> List[int]:
+        """Все вхождения заголовка (по возрастанию)"""
+        found = self._offsets.get(heading)
+        if found is None:
+            found = []
+            pos = self.text.find(heading)
+            while pos != -1:
+                found.append(pos)
+                pos = self.text.find(heading, pos + len(heading))
+            self._offsets[heading] = found
+        return found
+
+    def find(self, heading: str, start: int = 0, end: Optional[int] = None) -> int:
+        """Как text.find(heading, start, end), но по индексу"""
+        found = self.offsets(heading)
+        i = bisect_left(found, start)
+        if i == len(found):
+            return -1
+        pos = found[i]
+        if end is not None and pos + len(heading) > end:
+            return -1
+        return pos
+
+    def text_end(self, end: Optional[int] = None) -> int:
+        """Где `$` регулярного выражения находит конец текста [..end) (перед завершающим \\n)"""
+        if end is None:
+            end = len(self.text)
+        if end > 0 and self.text[end - 1] == "\n":
+            return end - 1
+        return end
+
+    def section(self, heading: str, end_headings=(), to_text_end: bool = True) -> Optional[Tuple[int, int]]:
+        """
+        Границы раздела после первого заголовка heading до ближайшего из end_headings.
+        Если ни одного конечного заголовка нет - до конца текста (to_text_end) или None.
+        """
+        start = self.find(heading)
+        if start == -1:
+            return None
+        start += len(heading)
+
+        ends = [pos for pos in (self.find(h, start) for h in end_headings) if pos != -1]
+        if ends:
+            return start, min(ends)
+        if to_text_end:
+            return start, self.text_end()
+        return None
+
+    def markers(self, words=(OBLIGATION, CONTRACT)) -> List[Tuple[int, int]]:
+        """
+        Границы "Слово N" для заданных слов: (начало, конец) каждого маркера,
+        те же совпадения, что дает re.finditer(r"(?:Слово1|Слово2)\\s+\\d+", text).
+        """
+        words = tuple(words)
+        found = self._markers.get(words)
+        if found is None:
+            found = []
+            for word in words:
+                for pos in self.offsets(word):
+                    match = _MARKER_NUMBER.match(self.text, pos + len(word))
+                    if match:
+                        found.append((pos, match.end()))
+            found.sort()
+            self._markers[words] = found
+        return found
+
+    def blocks(self, words=(OBLIGATION, CONTRACT), start: int = 0, end: Optional[int] = None) -> List[Tuple[int, int]]:
+        """
+        Границы кусков между маркерами внутри [start, end) -
+        то же разбиение, что re.split(r"(?:Слово1|Слово2)\\s+\\d+", text[start:end]).
+        """
+        if end is None:
+            end = len(self.text)
+
+        spans = []
+        block_start = start
+        for marker_start, marker_end in self.markers(words):
+            if marker_start < start or marker_end > end:
+                continue
+            spans.append((block_start, marker_start))
+            block_start = marker_end
+        spans.append((block_start, end))
+        return spans
+
+    def iter_numbered_blocks(self, word: str = OBLIGATION, start: int = 0,
+                             end: Optional[int] = None) -> Iterator[Tuple[str, int, int]]:
+        """
+        Блоки "Слово N" внутри [start, end): (N, начало тела, конец тела).
+        Тело идет от маркера до следующего маркера или до конца - те же блоки,
+        что у re.finditer(r"Слово\\s+(\\d+)(.*?)(?=Слово\\s+\\d+|$)", text, start, end) с DOTALL,
+        но без ленивого квантификатора, который на каждом символе проверяет lookahead.
+        """
+        if end is None:
+            end = len(self.text)
+        markers = [(s, e) for s, e in self.markers((word,)) if s >= start and e <= end]
+        for i, (marker_start, marker_end) in enumerate(markers):
+            if i + 1 < len(markers):
+                body_end = markers[i + 1][0]
+            else:
+                body_end = max(marker_end, self.text_end(end))
+            yield self.text[marker_start + len(word):marker_end].strip(), marker_end, body_end
+
+    def iter_blocks_from(self, heading: str, start: int = 0,
+                         end: Optional[int] = None) -> Iterator[Tuple[int, int]]:
+        """
+        Куски от каждого вхождения heading до следующего вхождения или до конца [start, end) -
+        те же, что у re.finditer(r"(heading.*?)(?=heading|$)", text, start, end) с DOTALL.
+        """
+        if end is None:
+            end = len(self.text)
+        found = [pos for pos in self.offsets(heading) if pos >= start and pos + len(heading) <= end]
+        for i, pos in enumerate(found):
+            if i + 1 < len(found):
+                yield pos, found[i + 1]
+            else:
+                yield pos, max(pos + len(heading), self.text_end(end))
+
+    def slice(self, bounds: Tuple[int, int]) -> str:
+        start, end = bounds
+        return self.text[start:end]
+
+
+def index_sections(text: str) -> ReportSections:
+    """Индекс разделов для текста (общий для всех парсеров, обрабатывающих этот текст)"""
+    return _indexes.get_or_create(text, ReportSections)
@@ -0,0 +1,101 @@
+# telegram_stream.py
+"""
+Потоковый вывод ответа в одно сообщение Telegram.
+
+Текст, который генерирует LLM, постепенно дописывается в статусное сообщение
+через edit_message_text не чаще раза в STREAM_EDIT_INTERVAL секунд (лимит
+Telegram на редактирование - порядка одного в секунду на чат). Когда текст
+перерастает одно сообщение, правки прекращаются, а итоговый ответ
+отправляется частями (send_long).
+"""
+
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.5"))
+# Максимум символов в одном сообщении (как в send_long_message)
+MAX_MESSAGE_LENGTH = 4000
+CURSOR = " ▌"
+
+
+class StreamingMessage:
+    """
+    Сообщение, которое дописывается по мере генерации ответа.
+    update(text) - накопленный текст (вызывается на каждом фрагменте, правки прореживаются),
+    finish(text) - итоговый текст: правка сообщения или, если не помещается, send_long(text).
+    """
+
+    def __init__(self, bot, chat_id, message_id, send_long=None, min_interval=STREAM_EDIT_INTERVAL,
+                 max_length=MAX_MESSAGE_LENGTH, clock=time.monotonic):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.send_long = send_long
+        self.min_interval = min_interval
+        self.max_length = max_length
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._last_edit = None
+        self._shown = None
+        self._blocked_until = 0.0
+        self.overflowed = False
+        self.edits = 0
+
+    def _edit(self, text):
+        """Правит сообщение; True, если правка прошла (или текст не изменился)"""
+        try:
+            self.bot.edit_message_text(chat_id=self.chat_id, message_id=self.message_id, text=text)
+        except Exception as e:
+            if "message is not modified" in str(e):
+                return True
+            retry_after = _retry_after(e)
+            if retry_after:
+                # 429: Telegram сам говорит, сколько ждать до следующей правки
+                self._blocked_until = self._clock() + retry_after
+            print(f"[WARN] Не удалось обновить сообщение: {e}")
+            return False
+        self._shown = text
+        self.edits += 1
+        return True
+
+    def update(self, text):
+        """Показывает накопленный текст, если с прошлой правки прошло min_interval секунд"""
+        with self._lock:
+            if self.overflowed or not text.strip():
+                return
+            now = self._clock()
+            if len(text) + len(CURSOR) > self.max_length:
+                # Дальше ответ уйдет частями; в статусе оставляем то, что уже показано
+                self.overflowed = True
+                return
+            if now < self._blocked_until:
+                return
+            if self._last_edit is not None and now - self._last_edit < self.min_interval:
+                return
+            self._last_edit = now
+            self._edit(text + CURSOR)
+
+    def finish(self, text):
+        """Итоговый ответ: последняя правка без курсора или отправка частями"""
+        with self._lock:
+            if len(text) <= self.max_length:
+                if self._edit(text):
+                    return
+                # Не удалось отредактировать (например, сообщение удалено) - шлем новым сообщением
+            if self.send_long is None:
+                raise ValueError("Ответ не помещается в одно сообщение, а send_long не задан")
+            self._edit("📜 Ответ получился длинным, отправляю его ниже.")
+            self.send_long(text)
+
+
+def _retry_after(error):
+    """retry_after из ответа Telegram 429 (ApiTelegramException), иначе None"""
+    if getattr(error, "error_code", None) != 429:
+        return None
+    parameters = (getattr(error, "result_json", None) or {}).get("parameters") or {}
+    return parameters.get("retry_after") or 1
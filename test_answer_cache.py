@@ -0,0 +1,113 @@
+import time
+
+from answer_cache import SemanticAnswerCache, normalize_question, question_answer_pairs
+
+
+class TableEmbeddings:
+    """Эмбеддинги по таблице: похожие вопросы получают близкие векторы"""
+
+    VECTORS = {
+        "нет просрочек 12 месяцев": [1.0, 0.0, 0.0],
+        "у меня нет просрочки год, что делать": [0.98, 0.2, 0.0],
+        "заберут ли квартиру и машину": [0.0, 1.0, 0.0],
+        "какие документы нужны": [0.0, 0.0, 1.0],
+    }
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed_query(self, text):
+        self.calls += 1
+        return self.VECTORS[text]
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return [self.VECTORS[text] for text in texts]
+
+
+def make_cache(docs_hash=lambda: "docs-v1", **kwargs):
+    embeddings = TableEmbeddings()
+    return SemanticAnswerCache(lambda: embeddings, docs_hash, threshold=0.9, **kwargs), embeddings
+
+
+def test_similar_question_hits_and_different_misses():
+    cache, _ = make_cache()
+    cache.store("нет просрочек 12 месяцев", "Восстановление платежеспособности")
+
+    assert cache.lookup("у меня нет просрочки год, что делать")[0] == "Восстановление платежеспособности"
+    assert cache.lookup("заберут ли квартиру и машину")[0] is None
+    stats = cache.stats()
+    assert (stats["semantic_hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+def test_exact_repeat_does_not_embed():
+    cache, embeddings = make_cache()
+    answer, vector = cache.lookup("нет просрочек 12 месяцев")
+    cache.store("нет просрочек 12 месяцев", "ответ", vector=vector)
+    calls = embeddings.calls
+
+    assert cache.lookup("Нет просрочек  12 месяцев?")[0] == "ответ"
+    assert embeddings.calls == calls
+    assert normalize_question(" Нет  ПРОСРОЧЕК?! ") == "нет просрочек"
+
+
+def test_entries_expire_after_ttl():
+    cache, _ = make_cache(ttl_seconds=60)
+    cache.store("нет просрочек 12 месяцев", "старый ответ", created_at=time.time() - 120)
+    cache.store("какие документы нужны", "свежий ответ")
+
+    assert cache.lookup("нет просрочек 12 месяцев")[0] is None
+    assert cache.lookup("какие документы нужны")[0] == "свежий ответ"
+    assert cache.stats()["expired"] == 1
+
+
+def test_docs_change_invalidates_cache():
+    version = ["docs-v1"]
+    cache, _ = make_cache(docs_hash=lambda: version[0])
+    cache.store("нет просрочек 12 месяцев", "ответ по старой базе")
+    version[0] = "docs-v2"
+
+    assert cache.lookup("нет просрочек 12 месяцев")[0] is None
+    assert cache.stats()["invalidations"] == 1
+    assert cache.stats()["items"] == 0
+
+
+def test_pairs_answers_with_preceding_questions():
+    user = {
+        "messages": [
+            {"text": "нет просрочек 12 месяцев", "timestamp": "2025-01-10T10:00:00"},
+            {"text": "вопрос, на который ответ не пришел", "timestamp": "2025-01-11T10:00:00"},
+            {"text": "заберут ли квартиру и машину", "timestamp": "2025-01-12T10:00:00"},
+        ],
+        "answers": [
+            {"text": "ответ 1", "timestamp": "2025-01-10T10:00:30+00:00"},
+            {"text": "ответ 2", "timestamp": "2025-01-12T10:01:00+00:00"},
+        ],
+    }
+    pairs = [(question, answer) for question, answer, _ in question_answer_pairs(user)]
+    assert pairs == [("нет просрочек 12 месяцев", "ответ 1"), ("заберут ли квартиру и машину", "ответ 2")]
+
+
+class FakeUsers:
+    def __init__(self, users):
+        self.users = users
+
+    def find(self, query, projection):
+        return iter(self.users)
+
+
+def test_seed_from_users_skips_answers_before_since():
+    now = time.time()
+    iso = lambda seconds_ago: time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(now - seconds_ago))
+    users = FakeUsers([{
+        "messages": [{"text": "нет просрочек 12 месяцев", "timestamp": iso(7200)},
+                     {"text": "какие документы нужны", "timestamp": iso(100)}],
+        "answers": [{"text": "до изменения базы", "timestamp": iso(7100)},
+                    {"text": "список документов", "timestamp": iso(50)}],
+    }])
+    cache, embeddings = make_cache()
+
+    assert cache.seed_from_users(users, since=now - 3600) == 1
+    assert embeddings.calls == 1
+    assert cache.lookup("какие документы нужны")[0] == "список документов"
+    assert cache.lookup("нет просрочек 12 месяцев")[0] is None
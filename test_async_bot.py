@@ -0,0 +1,123 @@
+import asyncio
+import threading
+import time
+
+import telebot
+from telebot import types
+
+from async_bot import build_async_bot, start_handler
+from bench_bot_api import FakeBotAPI, bench_async, bench_bridged, bench_sync
+from webhook_server import fake_update
+
+
+def _sync_bot():
+    bot = telebot.TeleBot("123456:FAKE-TOKEN", threaded=False)
+    calls = []
+
+    @bot.message_handler(commands=["start"])
+    def start(message):
+        calls.append(("start", threading.current_thread().name))
+
+    @bot.message_handler(content_types=["text"])
+    def text(message):
+        calls.append(("text", threading.current_thread().name))
+
+    @bot.callback_query_handler(func=lambda call: call.data.startswith("module_"))
+    def module(call):
+        calls.append(("module", call.data))
+
+    return bot, calls, start
+
+
+def test_handlers_are_mirrored_with_filters_and_run_in_threads():
+    sync_bot, calls, _ = _sync_bot()
+
+    async def run():
+        async_bot = build_async_bot(sync_bot)
+        assert [h["filters"] for h in async_bot.message_handlers] == [h["filters"] for h in sync_bot.message_handlers]
+        assert len(async_bot.callback_query_handlers) == 1
+        await async_bot.process_new_updates([types.Update.de_json(fake_update(1, 42, "привет"))])
+
+    asyncio.run(run())
+    # Сработал только текстовый обработчик, и не в потоке цикла событий
+    assert [name for name, _ in calls] == ["text"]
+    assert calls[0][1] != threading.current_thread().name
+
+
+def test_bridged_handlers_keep_order_within_chat_and_run_chats_in_parallel():
+    sync_bot = telebot.TeleBot("123456:FAKE-TOKEN", threaded=False)
+    finished = []
+
+    @sync_bot.message_handler(content_types=["text"])
+    def text(message):
+        # Первое сообщение чата обрабатывается дольше второго
+        time.sleep(0.2 if message.text == "1" else 0.01)
+        finished.append((message.chat.id, message.text))
+
+    async def run():
+        async_bot = build_async_bot(sync_bot)
+        updates = [fake_update(1, 42, "1"), fake_update(2, 42, "2"), fake_update(3, 43, "1"), fake_update(4, 43, "2")]
+        await async_bot.process_new_updates([types.Update.de_json(u) for u in updates])
+
+    start = time.perf_counter()
+    asyncio.run(run())
+    elapsed = time.perf_counter() - start
+    for chat_id in (42, 43):
+        assert [text for chat, text in finished if chat == chat_id] == ["1", "2"]
+    assert elapsed < 0.4
+
+
+class FakeCollection:
+    def __init__(self, docs=None):
+        self.docs = list(docs or [])
+
+    async def find_one(self, query):
+        return next((d for d in self.docs if all(d.get(k) == v for k, v in query.items())), None)
+
+    async def insert_one(self, doc):
+        self.docs.append(doc)
+
+
+class FakeAsyncBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text))
+
+
+def test_native_start_registers_user_and_restores_migration():
+    sync_bot, calls, start = _sync_bot()
+    db = {"users": FakeCollection(), "user_migration": FakeCollection([{"user_id": 42, "access": True,
+                                                                         "message_limit": 7}])}
+    fake_bot = FakeAsyncBot()
+    handler = start_handler(fake_bot, lambda: None, admin_ids=[1], get_db=lambda: db)
+
+    async def run():
+        async_bot = build_async_bot(sync_bot, {start: lambda async_bot: handler})
+        assert async_bot.message_handlers[0]["function"] is handler
+        await async_bot.process_new_updates([types.Update.de_json(fake_update(1, 42, "/start"))])
+        await async_bot.process_new_updates([types.Update.de_json(fake_update(2, 42, "/start"))])
+
+    asyncio.run(run())
+    assert calls == []
+    assert len(db["users"].docs) == 1
+    assert db["users"].docs[0]["is_migrated"] and db["users"].docs[0]["message_limit"] == 7
+    # Восстановление один раз, приветствие на каждый /start, уведомление админу каждый раз
+    texts = [text for _, text in fake_bot.sent]
+    assert sum("восстановлены" in t for t in texts) == 1
+    assert sum(t.startswith("👋") for t in texts) == 2
+    assert [chat for chat, t in fake_bot.sent if t.startswith("🆕")] == [1, 1]
+
+
+def test_async_bot_answers_faster_than_sync_bot_on_fake_api():
+    api = FakeBotAPI(latency=0.05).start()
+    try:
+        sync_result = bench_sync(api, 40)
+        async_result = bench_async(api, 40)
+        bridged_result = bench_bridged(api, 40)
+    finally:
+        api.stop()
+    assert async_result["messages_per_s"] > 2 * sync_result["messages_per_s"]
+    # Синхронные обработчики main.py в async-режиме тоже не ждут друг друга
+    assert bridged_result["messages_per_s"] > 2 * sync_result["messages_per_s"]
@@ -0,0 +1,52 @@
+import glob
+import io
+import json
+import os
+
+from batch_parse import BATCH_PARSE_INFLIGHT_PER_WORKER, iter_directory, process_report, run_batch
+
+
+def test_run_batch_writes_one_line_per_report(tmp_path):
+    sample = sorted(glob.glob("debug_text_output_*.txt"))[0]
+    with open(sample, encoding="utf-8") as f:
+        (tmp_path / "gkb.txt").write_text(f.read(), encoding="utf-8")
+    (tmp_path / "broken.txt").write_bytes(b"\xff\xfe")
+    (tmp_path / "notes.md").write_text("не отчет", encoding="utf-8")
+
+    out = io.StringIO()
+    summaries = run_batch(iter_directory(str(tmp_path)), out, workers=1)
+
+    lines = [json.loads(line) for line in out.getvalue().splitlines()]
+    by_id = {line["id"]: line for line in lines}
+    assert sorted(by_id) == ["broken.txt", "gkb.txt"]
+    assert len(summaries) == 2
+
+    assert by_id["gkb.txt"]["ok"]
+    assert by_id["gkb.txt"]["report_format"] == "GKB"
+    assert by_id["gkb.txt"]["data"]["total_obligations"] > 0
+    assert set(by_id["gkb.txt"]["timings"]) == {"extract_s", "parse_s", "collateral_s", "total_s"}
+
+    assert not by_id["broken.txt"]["ok"]
+    assert "UnicodeDecodeError" in by_id["broken.txt"]["error"]
+
+
+def crash_on_marked_report(job):
+    """Воркер, который умирает на отчете crash.txt (как при нехватке памяти)"""
+    if job["id"] == "crash.txt":
+        os._exit(1)
+    return process_report(job)
+
+
+def test_run_batch_survives_dead_worker(tmp_path):
+    jobs = [{"id": "crash.txt", "text": ""}] + [{"id": f"{i}.txt", "text": "не отчет"} for i in range(30)]
+
+    out = io.StringIO()
+    summaries = run_batch(iter(jobs), out, workers=2, process=crash_on_marked_report)
+
+    by_id = {line["id"]: line for line in map(json.loads, out.getvalue().splitlines())}
+    assert sorted(by_id) == sorted(job["id"] for job in jobs)
+    assert len(summaries) == len(jobs)
+    assert "BrokenProcessPool" in by_id["crash.txt"]["error"]
+    # В старом пуле теряются только задания, отданные ему до поломки; остальные разбирает новый пул
+    lost = sum("BrokenProcessPool" in line.get("error", "") for line in by_id.values())
+    assert lost <= 2 * BATCH_PARSE_INFLIGHT_PER_WORKER
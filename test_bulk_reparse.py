@@ -0,0 +1,113 @@
+import glob
+
+import pytest
+from bson import ObjectId
+
+from bulk_reparse import REPARSE_STATE_COLLECTION, reparse_documents
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def sort(self, key, direction):
+        self.documents = sorted(self.documents, key=lambda d: d[key], reverse=direction < 0)
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def limit(self, count):
+        self.documents = self.documents[:count]
+        return self
+
+    def __iter__(self):
+        return iter(self.documents)
+
+
+def _matches(document, query):
+    for key, condition in query.items():
+        if key == "$and":
+            if not all(_matches(document, part) for part in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = document.get(key)
+            if "$gt" in condition and not (value is not None and value > condition["$gt"]):
+                return False
+            if "$ne" in condition and value == condition["$ne"]:
+                return False
+        elif document.get(key) != condition:
+            return False
+    return True
+
+
+class FakeCollection:
+    """Минимум pymongo, который использует reparse_documents"""
+
+    def __init__(self, documents=()):
+        self.documents = {d["_id"]: dict(d) for d in documents}
+        self.bulk_calls = 0
+
+    def find(self, query, projection=None):
+        return FakeCursor([dict(d) for d in self.documents.values() if _matches(d, query)])
+
+    def find_one(self, query):
+        found = [d for d in self.documents.values() if _matches(d, query)]
+        return dict(found[0]) if found else None
+
+    def replace_one(self, query, document, upsert=False):
+        self.documents[query["_id"]] = dict(document)
+
+    def bulk_write(self, operations, ordered=True):
+        self.bulk_calls += 1
+        for operation in operations:
+            self.documents[operation._filter["_id"]].update(operation._doc["$set"])
+
+
+def test_reparse_resumes_after_last_written_id():
+    with open(sorted(glob.glob("debug_text_output_*.txt"))[0], encoding="utf-8") as f:
+        gkb_text = f.read()
+    ids = [ObjectId() for _ in range(5)]
+    db = {
+        "documents": FakeCollection(
+            [{"_id": i, "text": gkb_text} for i in ids[:4]] + [{"_id": ids[4], "text": "не отчет"}]
+        ),
+        REPARSE_STATE_COLLECTION: FakeCollection(),
+    }
+
+    # Первый запуск прерван после двух документов
+    state = reparse_documents(db, job="test", batch_size=2, workers=1, limit=2)
+    assert state["processed"] == 2 and state["last_id"] == ids[1]
+    assert "parsed_summary" not in db["documents"].documents[ids[2]]
+
+    state = reparse_documents(db, job="test", batch_size=2, workers=1)
+    assert state["processed"] == 5 and state["last_id"] == ids[4] and state["finished"]
+    assert db["documents"].bulk_calls == 1 + 2
+
+    summaries = [db["documents"].documents[i]["parsed_summary"] for i in ids]
+    assert all(s["ok"] and s["report_format"] == "GKB" and s["total_obligations"] > 0 for s in summaries[:4])
+    assert summaries[4]["report_format"] == "FALLBACK"
+
+    # Все уже разобраны текущей версией - stale_only ничего не трогает
+    state = reparse_documents(db, job="again", workers=1, stale_only=True)
+    assert state["processed"] == 0
+
+
+def test_reparse_refuses_to_resume_with_other_query():
+    ids = [ObjectId() for _ in range(3)]
+    db = {
+        "documents": FakeCollection([{"_id": i, "text": "не отчет", "type": "credit_report"} for i in ids]),
+        REPARSE_STATE_COLLECTION: FakeCollection(),
+    }
+    reparse_documents(db, {"type": "credit_report"}, job="test", batch_size=1, workers=1, limit=1)
+
+    with pytest.raises(ValueError):
+        reparse_documents(db, {"type": "other"}, job="test", workers=1)
+    with pytest.raises(ValueError):
+        reparse_documents(db, {"type": "credit_report"}, job="test", workers=1, stale_only=True)
+
+    # Те же условия - продолжение, restart - новый запуск с новыми условиями
+    state = reparse_documents(db, {"type": "credit_report"}, job="test", workers=1)
+    assert state["processed"] == 3
+    state = reparse_documents(db, {"type": "other"}, job="test", workers=1, restart=True)
+    assert state["processed"] == 0 and state["finished"]
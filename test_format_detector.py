@@ -0,0 +1,46 @@
+from itertools import combinations
+
+from format_detector import ALL_INDICATORS, detect_format, find_indicators
+
+
+def original_format(text):
+    """Правила can_parse цепочки GKB → PKB → Detailed → Short → Kazakh → Fallback до format_detector"""
+    gkb_score = sum(1 for i in [
+        "Государственное кредитное бюро", "Персональный кредитный отчет", "Номер договора:",
+        "Дата начала срока действия контракта:", "Обязательство 1",
+    ] if i in text)
+    pkb_score = sum(1 for i in ["ПОЛНЫЙ ПЕРСОНАЛЬНЫЙ КРЕДИТНЫЙ ОТЧЕТ", "Итого:"] if i in text)
+    if gkb_score >= 3 and pkb_score == 0:
+        return "GKB"
+    if ("ПОЛНЫЙ ПЕРСОНАЛЬНЫЙ КРЕДИТНЫЙ ОТЧЕТ" in text or "ПЕРСОНАЛЬНЫЙ КРЕДИТНЫЙ РЕЙТИНГ" in text
+            or "ДОГОВОРЫ В КРЕДИТНОЙ ИСТОРИИ" in text):
+        return "PKB"
+    if "ПОДРОБНАЯ ИНФОРМАЦИЯ ПО ДЕЙСТВУЮЩИМ ДОГОВОРАМ" in text or "ПОЛНЫЙ ПЕРСОНАЛЬНЫЙ КРЕДИТНЫЙ ОТЧЕТ" in text:
+        return "DETAILED"
+    if "ОБЩАЯ ИНФОРМАЦИЯ ПО ОБЯЗАТЕЛЬСТВАМ" in text or "Персональный кредитный отчет (краткая форма)" in text:
+        return "SHORT"
+    if "ҚОЛДАНЫСТАҒЫ ШАРТТАР" in text and "ПОДРОБНАЯ ИНФОРМАЦИЯ ПО ДЕЙСТВУЮЩИМ ДОГОВОРАМ" not in text:
+        return "KAZAKH"
+    return "FALLBACK"
+
+
+def test_matches_original_rules_for_every_indicator_set():
+    indicators = list(ALL_INDICATORS)
+    for size in range(len(indicators) + 1):
+        for subset in combinations(indicators, size):
+            text = "Кредитный отчет\n" + "\n".join(subset)
+            assert detect_format(text).report_format == original_format(text), subset
+
+
+def test_nested_indicator_found_without_container():
+    text = "Персональный кредитный отчет\nНомер договора: 1"
+    found = find_indicators(text)
+    assert "Персональный кредитный отчет" in found
+    assert "Персональный кредитный отчет (краткая форма)" not in found
+
+
+def test_scores_are_exposed():
+    detection = detect_format("Государственное кредитное бюро\nНомер договора:\nОбязательство 1\nИтого:")
+    assert detection.scores["GKB"] == 3
+    assert detection.scores["GKB_EXCLUDE"] == 1
+    assert detection.as_dict()["format"] == "FALLBACK"
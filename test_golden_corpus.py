@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+from golden_corpus import (COMPARED_FIELDS, FORMAT_PARSERS, anonymize, load_baseline, load_cases, parse_case,
+                           parser_function)
+
+# Замеры времени сравниваются с базой с конкретной машины: только по явному запросу
+SPEED_TESTS = os.getenv("GOLDEN_SPEED_TESTS", "0") == "1"
+# Допустимое замедление парсера относительно golden_corpus/baseline_timings.json, %
+MAX_SLOWDOWN_PCT = float(os.getenv("GOLDEN_MAX_SLOWDOWN_PCT", "50"))
+
+CASES = load_cases()
+CASE_IDS = [name for name, _, _ in CASES]
+
+
+def test_corpus_covers_every_parser():
+    assert {expected["parser"] for _, _, expected in CASES} == set(FORMAT_PARSERS.values())
+
+
+def test_anonymize_replaces_contract_numbers_keeping_them_distinct():
+    text = (
+        "Фамилия: ИВАНОВ\n"
+        "Код контракта: R2722714-006\nНомер договора: R2722714-006\n"
+        "Код контракта: L329190914953\nНомер договора: 23-045246-01-ДБЗ\n"
+        "Номер родительского контракта: Нет данных\n"
+    )
+    result = anonymize(text)
+    for value in ("ИВАНОВ", "R2722714-006", "L329190914953", "23-045246-01-ДБЗ"):
+        assert value not in result
+    assert "Код контракта: R0000000-001\nНомер договора: R0000000-001\n" in result
+    assert "L000000000002" in result and "00-000000-03-ДБЗ" in result
+    assert "Нет данных" in result
+    assert anonymize(result) == result
+
+
+@pytest.mark.parametrize("name, text, expected", CASES, ids=CASE_IDS)
+def test_parse_matches_golden(name, text, expected):
+    assert expected is not None, f"Нет {name}.expected.json: python golden_corpus.py --update"
+    actual = parse_case(text)
+
+    assert actual["format"] == expected["format"]
+    assert actual["total_debt"] == pytest.approx(expected["total_debt"], abs=0.01)
+    for field in COMPARED_FIELDS:
+        assert actual[field] == expected[field], f"{name}: расходится {field}"
+
+
+@pytest.mark.skipif(not SPEED_TESTS, reason="Тест скорости включается GOLDEN_SPEED_TESTS=1")
+@pytest.mark.parametrize("name, text, expected", CASES, ids=CASE_IDS)
+def test_parser_speed(name, text, expected, request):
+    if not request.config.pluginmanager.hasplugin("benchmark"):
+        pytest.skip("GOLDEN_SPEED_TESTS=1, но нет плагина pytest-benchmark: pip install -r requirements-dev.txt")
+    benchmark = request.getfixturevalue("benchmark")
+    benchmark.group = expected["parser"]
+    benchmark(parser_function(expected["parser"]), text)
+
+    baseline = load_baseline().get(name)
+    if not baseline or benchmark.stats is None:
+        pytest.skip("Нет базового замера: python golden_corpus.py --save-baseline")
+    median_ms = benchmark.stats.stats.median * 1000
+    limit_ms = baseline["median_ms"] * (1 + MAX_SLOWDOWN_PCT / 100)
+    assert median_ms <= limit_ms, (
+        f"{name} [{expected['parser']}]: {median_ms:.3f} мс, база {baseline['median_ms']:.3f} мс "
+        f"(допустимо +{MAX_SLOWDOWN_PCT:.0f}%)"
+    )
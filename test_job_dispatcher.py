@@ -0,0 +1,71 @@
+import os
+import threading
+
+import pytest
+
+from job_dispatcher import JobDispatcher, UserLimitExceeded
+
+
+def test_per_user_limit_rejects_extra_jobs():
+    dispatcher = JobDispatcher(io_workers=4, cpu_workers=0, per_user_limit=1)
+    release = threading.Event()
+    try:
+        first = dispatcher.submit(1, release.wait, kind="lawyer_question")
+        with pytest.raises(UserLimitExceeded):
+            dispatcher.submit(1, release.wait, kind="lawyer_question")
+        # Другой пользователь не ждет первого
+        assert dispatcher.submit(2, lambda: "ok", kind="lawyer_question").result(timeout=5) == "ok"
+
+        release.set()
+        first.result(timeout=5)
+        assert dispatcher.active_jobs(1) == 0
+        assert dispatcher.submit(1, lambda: "снова", kind="lawyer_question").result(timeout=5) == "снова"
+    finally:
+        release.set()
+        dispatcher.shutdown()
+
+    stats = dispatcher.stats()
+    assert stats["rejected"] == 1
+    assert stats["kinds"]["lawyer_question"]["completed"] == 3
+    assert (stats["queued"], stats["running"], stats["active_users"]) == (0, 0, 0)
+
+
+def test_failed_job_releases_user_slot():
+    dispatcher = JobDispatcher(io_workers=2, cpu_workers=0, per_user_limit=1)
+    try:
+        future = dispatcher.submit(1, lambda: 1 / 0, kind="credit_report")
+        with pytest.raises(ZeroDivisionError):
+            future.result(timeout=5)
+        assert dispatcher.active_jobs(1) == 0
+        assert dispatcher.stats()["kinds"]["credit_report"]["failed"] == 1
+    finally:
+        dispatcher.shutdown()
+
+
+def test_run_cpu_uses_process_pool():
+    dispatcher = JobDispatcher(io_workers=2, cpu_workers=1)
+    try:
+        pid = dispatcher.submit(1, dispatcher.run_cpu, os.getpid).result(timeout=60)
+        assert pid != os.getpid()
+        with pytest.raises(ValueError):
+            dispatcher.run_cpu(int, "не число")
+    finally:
+        dispatcher.shutdown()
+
+    kinds = dispatcher.stats()["kinds"]
+    assert kinds["cpu:getpid"]["completed"] == 1
+    assert kinds["cpu:int"]["failed"] == 1
+
+
+def test_dead_pool_process_does_not_break_later_cpu_steps():
+    dispatcher = JobDispatcher(io_workers=2, cpu_workers=1)
+    try:
+        # OCR внутри шага не поднимает свой пул процессов
+        assert dispatcher.run_cpu(os.getenv, "OCR_WORKERS") == "1"
+        # Процесс пула умирает посреди шага (как при OOM)
+        with pytest.raises(Exception):
+            dispatcher.run_cpu(os._exit, 1)
+        assert dispatcher.run_cpu(os.getpid) != os.getpid()
+    finally:
+        dispatcher.shutdown()
+    assert dispatcher.stats()["cpu_pool_restarts"] == 1
@@ -0,0 +1,177 @@
+import threading
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from bson import ObjectId
+
+import job_queue
+from job_queue import DONE, FAILED, QUEUED, RUNNING, JobProgress, claim, complete, enqueue, run_job
+from worker import work
+
+
+def _matches(document, query):
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(_matches(document, part) for part in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = document.get(key)
+            if "$lte" in condition and not (value is not None and value <= condition["$lte"]):
+                return False
+            if "$lt" in condition and not (value is not None and value < condition["$lt"]):
+                return False
+            if "$in" in condition and value not in condition["$in"]:
+                return False
+        elif document.get(key) != condition:
+            return False
+    return True
+
+
+class FakeJobs:
+    """Минимум pymongo, который использует job_queue (find_one_and_update атомарен под блокировкой)"""
+
+    def __init__(self):
+        self.documents = {}
+        self.lock = threading.Lock()
+
+    def insert_one(self, document):
+        document = dict(document, _id=ObjectId())
+        self.documents[document["_id"]] = document
+        return SimpleNamespace(inserted_id=document["_id"])
+
+    def _apply(self, document, update):
+        for key, value in update.get("$set", {}).items():
+            *parents, last = key.split(".")
+            target = document
+            for parent in parents:
+                target = target.setdefault(parent, {})
+            target[last] = value
+        for key, value in update.get("$inc", {}).items():
+            document[key] = document.get(key, 0) + value
+
+    def find_one_and_update(self, query, update, sort, return_document):
+        with self.lock:
+            found = [d for d in self.documents.values() if _matches(d, query)]
+            for key, direction in reversed(sort):
+                found.sort(key=lambda d: d[key], reverse=direction < 0)
+            if not found:
+                return None
+            self._apply(found[0], update)
+            return dict(found[0])
+
+    def update_one(self, query, update):
+        with self.lock:
+            found = [d for d in self.documents.values() if _matches(d, query)]
+            if found:
+                self._apply(found[0], update)
+            return SimpleNamespace(matched_count=len(found[:1]))
+
+    def get(self, job_id):
+        return self.documents[job_id]
+
+
+def test_job_is_claimed_by_one_worker_only():
+    jobs = FakeJobs()
+    job_id = enqueue(jobs, "telegram_document", {"kind": "credit_report"})
+
+    claims = []
+    threads = [threading.Thread(target=lambda i=i: claims.append(claim(jobs, f"w{i}"))) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    claimed = [job for job in claims if job]
+    assert len(claimed) == 1
+    assert claimed[0]["_id"] == job_id and claimed[0]["attempts"] == 1
+
+    assert run_job(jobs, claimed[0], {"telegram_document": lambda payload, progress: {"ok": True}}) == DONE
+    assert jobs.get(job_id)["status"] == DONE and jobs.get(job_id)["result"] == {"ok": True}
+
+
+def test_failed_job_is_retried_with_backoff_then_fails(monkeypatch):
+    monkeypatch.setattr(job_queue, "retry_delay", lambda attempts: 10 * 2 ** (attempts - 1))
+    jobs = FakeJobs()
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    job_id = enqueue(jobs, "telegram_document", {}, max_attempts=3, now=start)
+
+    def broken(payload, progress):
+        raise RuntimeError("Telegram недоступен")
+
+    now = start
+    for attempt, delay in ((1, 10), (2, 20)):
+        job = claim(jobs, "w1", now=now)
+        assert job["attempts"] == attempt
+        assert run_job(jobs, job, {"telegram_document": broken}) == QUEUED
+        retry_at = jobs.get(job_id)["run_at"]
+        assert claim(jobs, "w1", now=now) is None  # до run_at задачу никто не берет
+        now = retry_at
+
+    job = claim(jobs, "w1", now=now)
+    assert run_job(jobs, job, {"telegram_document": broken}) == FAILED
+    assert jobs.get(job_id)["error"] == "RuntimeError: Telegram недоступен"
+
+
+def test_expired_lock_lets_another_worker_take_the_job():
+    jobs = FakeJobs()
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    job_id = enqueue(jobs, "telegram_document", {}, now=start)
+
+    crashed = claim(jobs, "w1", visibility_timeout=60, now=start)
+    assert claim(jobs, "w2", visibility_timeout=60, now=start + timedelta(seconds=30)) is None
+
+    taken = claim(jobs, "w2", visibility_timeout=60, now=start + timedelta(seconds=61))
+    assert taken["locked_by"] == "w2" and taken["attempts"] == 2
+
+    # Запоздалое завершение от первого воркера не перетирает чужую блокировку
+    complete(jobs, crashed, {"from": "w1"})
+    assert jobs.get(job_id)["status"] == RUNNING and jobs.get(job_id)["locked_by"] == "w2"
+
+
+def test_worker_processes_ready_jobs_and_exits_once():
+    jobs = FakeJobs()
+    seen = []
+    for kind in ("credit_report", "creditors_list"):
+        enqueue(jobs, "telegram_document", {"kind": kind})
+    enqueue(jobs, "other", {})
+
+    processed = work(jobs, "w1", handlers={"telegram_document": lambda payload, progress: seen.append(payload["kind"])},
+                     once=True)
+
+    assert processed == 2
+    assert seen == ["credit_report", "creditors_list"]
+    assert sorted(d["status"] for d in jobs.documents.values()) == [DONE, DONE, QUEUED]
+
+
+def test_retry_skips_steps_done_by_previous_attempt():
+    jobs = FakeJobs()
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    job_id = enqueue(jobs, "telegram_document", {}, max_attempts=3, now=start)
+    sent = []
+
+    def flaky(payload, progress):
+        for step in ("status", "analysis", "application_1", "application_2"):
+            if progress.done(step):
+                continue
+            if step == "application_2" and progress.attempt == 1:
+                raise RuntimeError("Telegram недоступен")
+            sent.append(step)
+            progress.mark(step)
+        return progress.is_last_attempt
+
+    job = claim(jobs, "w1", now=start)
+    assert run_job(jobs, job, {"telegram_document": flaky}) == QUEUED
+    job = claim(jobs, "w1", now=jobs.get(job_id)["run_at"])
+    assert run_job(jobs, job, {"telegram_document": flaky}) == DONE
+
+    # Каждый шаг выполнен ровно один раз, вторая попытка не последняя
+    assert sent == ["status", "analysis", "application_1", "application_2"]
+    assert jobs.get(job_id)["result"] is False
+    assert set(jobs.get(job_id)["progress"]) == set(sent)
+
+
+def test_progress_without_queue_is_in_memory():
+    progress = JobProgress()
+    assert not progress.is_retry and progress.is_last_attempt
+    progress.mark("status_message_id", 10)
+    assert progress.get("status_message_id") == 10 and progress.done("status_message_id")
@@ -0,0 +1,253 @@
+import hashlib
+import time
+import threading
+
+import legal_engine
+
+
+def test_import_does_not_initialize_models():
+    assert legal_engine._llm is None
+    assert legal_engine._vectorstore is None
+    assert legal_engine._retriever is None
+    assert set(legal_engine.prompt_rag.input_variables) == {"question", "context"}
+
+
+def test_retriever_is_created_once_across_threads(monkeypatch):
+    created = []
+
+    class FakeStore:
+        def as_retriever(self):
+            return object()
+
+    def open_store():
+        created.append(1)
+        return FakeStore()
+
+    monkeypatch.setattr(legal_engine, "_vectorstore", None)
+    monkeypatch.setattr(legal_engine, "_retriever", None)
+    monkeypatch.setattr(legal_engine, "build_index", open_store)
+    monkeypatch.setattr(legal_engine, "persist_directory", "./no-such-index")
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(legal_engine.get_retriever())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(created) == 1
+    assert len({id(retriever) for retriever in results}) == 1
+
+
+class CountingEmbeddings:
+    """Детерминированные эмбеддинги без сети; считает, сколько текстов эмбеддилось"""
+
+    def __init__(self):
+        self.embedded = []
+
+    def _vector(self, text):
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return [byte / 255 for byte in digest[:16]]
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+def test_update_index_embeds_only_changed_chunks(tmp_path):
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "a.txt").write_text("Статья 1. Внесудебное банкротство.\n\nСтатья 2. Условия применения.", encoding="utf-8")
+    (docs / "b.txt").write_text("Судебное банкротство.\n\nФинансовый управляющий.", encoding="utf-8")
+    (docs / "c.txt").write_text("Восстановление платежеспособности.", encoding="utf-8")
+
+    embeddings = CountingEmbeddings()
+    store = legal_engine.open_vectorstore(embeddings, str(tmp_path / "chroma"))
+    splitter = RecursiveCharacterTextSplitter(chunk_size=40, chunk_overlap=0)
+    manifest = str(tmp_path / "chroma" / "docs_manifest.json")
+
+    def update(**kwargs):
+        embeddings.embedded.clear()
+        return legal_engine.update_index(store, str(docs), manifest, splitter, **kwargs)
+
+    stats = update()
+    total = len(store.get()["ids"])
+    assert stats["files_changed"] == 3 and stats["chunks_added"] == total == len(embeddings.embedded)
+
+    # Ничего не изменилось - ничего не эмбеддим
+    assert update()["chunks_added"] == 0 and embeddings.embedded == []
+
+    # Меняем один фрагмент в a.txt, удаляем c.txt
+    (docs / "a.txt").write_text("Статья 1. Внесудебное банкротство.\n\nСтатья 2. Новые условия.", encoding="utf-8")
+    (docs / "c.txt").unlink()
+    stats = update()
+    assert stats == {"files_changed": 1, "files_removed": 1, "chunks_added": 1, "chunks_deleted": 2}
+    assert embeddings.embedded == ["Статья 2. Новые условия."]
+
+    sources = {metadata["source"] for metadata in store.get()["metadatas"]}
+    assert sources == {"a.txt", "b.txt"}
+    assert len(store.get()["ids"]) == total - 1
+
+    # force пересобирает все с нуля
+    stats = update(force=True)
+    assert stats["chunks_added"] == len(store.get()["ids"]) == total - 1
+
+
+def test_search_documents_embeds_all_searches_at_once(tmp_path, monkeypatch):
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "a.txt").write_text("\n\n".join(f"Статья {i}. Условие номер {i}." for i in range(12)), encoding="utf-8")
+    embeddings = CountingEmbeddings()
+    store = legal_engine.open_vectorstore(embeddings, str(tmp_path / "chroma"))
+    legal_engine.update_index(store, str(docs), str(tmp_path / "chroma" / "manifest.json"),
+                              RecursiveCharacterTextSplitter(chunk_size=40, chunk_overlap=0))
+    monkeypatch.setattr(legal_engine, "_vectorstore", store)
+    monkeypatch.setattr(legal_engine, "_search_cache", legal_engine.LRUCache(16))
+    monkeypatch.setattr(legal_engine, "_chunk_cache", legal_engine.LRUCache(64))
+
+    searches = ["Статья 1", "Условие номер 5", "", "Статья 1", "Статья 7"]
+    embeddings.embedded.clear()
+    found = legal_engine.search_documents(searches)
+
+    assert embeddings.embedded == ["Статья 1", "Условие номер 5", "Статья 7"]
+    assert found[2] == []
+    for search, docs in zip(searches, found):
+        if search:
+            expected = store.similarity_search(search, k=legal_engine.RETRIEVER_K)
+            assert [d.page_content for d in docs] == [d.page_content for d in expected]
+
+    # Повторный поиск - из кэша, без эмбеддингов; объединение по id фрагмента
+    embeddings.embedded.clear()
+    again = legal_engine.search_documents(["Статья 7", "Статья 1"])
+    assert embeddings.embedded == []
+    union = legal_engine.get_unique_union(again)
+    assert len(union) == len({d.metadata["chunk_id"] for docs in again for d in docs})
+
+
+def _fake_pipeline(monkeypatch, llm_delay=0.0, search_delay=0.0):
+    """LLM и retriever без сети: ответы детерминированы, задержки имитируют HTTP"""
+    from langchain_core.documents import Document
+    from langchain_core.runnables import RunnableLambda
+
+    def fake_llm(prompt_value):
+        time.sleep(llm_delay)
+        text = prompt_value.to_string()
+        if "Сформулируйте 3" in text:
+            question = text.split("Пользователь задал вопрос: ", 1)[1].split("\n", 1)[0]
+            return "\n".join(f"{question} / вариант {i}" for i in range(3))
+        return f"ответ на {len(text)} символов"
+
+    def fake_search(searches):
+        time.sleep(search_delay)
+        return [[Document(page_content=f"фрагмент {search[-1]}", metadata={"source": "a.txt"})] for search in searches]
+
+    monkeypatch.setattr(legal_engine, "get_llm", lambda: RunnableLambda(fake_llm))
+    monkeypatch.setattr(legal_engine, "search_documents", fake_search)
+
+
+def test_concurrent_retrieval_matches_sequential(monkeypatch):
+    _fake_pipeline(monkeypatch, llm_delay=0.1, search_delay=0.05)
+    sub_questions = ["Условия внесудебного банкротства", "Единственное жилье", "Просрочка 12 месяцев"]
+
+    started = time.perf_counter()
+    sequential = legal_engine.retrieve_documents(sub_questions, max_workers=1)
+    sequential_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    concurrent = legal_engine.retrieve_documents(sub_questions, max_workers=4)
+    concurrent_s = time.perf_counter() - started
+
+    assert list(concurrent) == sub_questions
+    assert {k: sorted(d.page_content for d in v) for k, v in concurrent.items()} == \
+        {k: sorted(d.page_content for d in v) for k, v in sequential.items()}
+    assert concurrent_s < sequential_s * 0.6
+
+
+def test_query_reports_stage_timings(monkeypatch):
+    _fake_pipeline(monkeypatch)
+    timings = {}
+    answer = legal_engine.query("Можно ли сохранить квартиру?", timings=timings, use_cache=False)
+
+    assert answer.startswith("ответ на")
+    assert set(timings) == {"sub_questions_s", "retrieval_s", "qa_pairs_s", "final_s", "total_s"}
+
+
+def test_query_answers_repeated_question_from_cache(monkeypatch):
+    from answer_cache import SemanticAnswerCache
+
+    _fake_pipeline(monkeypatch)
+    embeddings = CountingEmbeddings()
+    monkeypatch.setattr(legal_engine, "answer_cache", SemanticAnswerCache(lambda: embeddings, lambda: "docs-v1"))
+    calls = []
+    original = legal_engine.generate_sub_questions
+    monkeypatch.setattr(legal_engine, "generate_sub_questions", lambda q: calls.append(q) or original(q))
+
+    first = legal_engine.query("Можно ли сохранить квартиру?")
+    timings = {}
+    second = legal_engine.query("можно ли  сохранить квартиру", timings=timings)
+
+    assert second == first
+    assert len(calls) == 1
+    assert set(timings) == {"cache_s", "total_s"}
+    assert legal_engine.answer_cache.stats()["exact_hits"] == 1
+
+
+def test_query_streams_final_answer(monkeypatch):
+    _fake_pipeline(monkeypatch)
+    updates = []
+    timings = {}
+    answer = legal_engine.query("Можно ли сохранить квартиру?", timings=timings, use_cache=False,
+                                on_answer_update=updates.append)
+
+    assert updates and updates[-1] == answer
+    assert 0 < timings["first_token_s"] <= timings["total_s"]
+
+
+class StubStore:
+    """Хранилище без Chroma: три фрагмента, поиск возвращает их все; считает обращения"""
+
+    def __init__(self, with_collection):
+        from langchain_core.documents import Document
+
+        self.embeddings = CountingEmbeddings()
+        self.docs = [Document(page_content=f"Статья {i}", metadata={"chunk_id": f"c{i}"}, id=f"c{i}")
+                     for i in range(3)]
+        self.calls = []
+        if with_collection:
+            self._collection = self
+
+    def query(self, query_embeddings, n_results, include):
+        self.calls.append(("query", len(query_embeddings)))
+        docs = self.docs[:n_results]
+        return {
+            "ids": [[d.id for d in docs] for _ in query_embeddings],
+            "documents": [[d.page_content for d in docs] for _ in query_embeddings],
+            "metadatas": [[d.metadata for d in docs] for _ in query_embeddings],
+        }
+
+    def similarity_search_by_vector(self, vector, k):
+        self.calls.append(("by_vector", 1))
+        return self.docs[:k]
+
+
+def test_search_documents_batches_only_when_store_has_collection(monkeypatch):
+    for with_collection, expected_calls in ((True, [("query", 2)]), (False, [("by_vector", 1)] * 2)):
+        store = StubStore(with_collection)
+        monkeypatch.setattr(legal_engine, "_vectorstore", store)
+        monkeypatch.setattr(legal_engine, "_search_cache", legal_engine.LRUCache(16))
+        monkeypatch.setattr(legal_engine, "_chunk_cache", legal_engine.LRUCache(64))
+
+        found = legal_engine.search_documents(["Статья 1", "Статья 2", "Статья 1"], k=2)
+
+        assert store.calls == expected_calls
+        assert [[d.page_content for d in docs] for docs in found] == [["Статья 0", "Статья 1"]] * 3
+        # Повтор - из кэша, хранилище не трогаем
+        assert legal_engine.search_documents(["Статья 2"], k=2)[0][0].id == "c0"
+        assert store.calls == expected_calls
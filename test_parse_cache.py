@@ -0,0 +1,29 @@
+import parse_cache
+from parse_cache import ParseCache
+from upload_pipeline import UploadPipeline, analyze_upload, analyze_upload_cached
+
+
+def test_upload_is_sent_to_pool_once_per_file_content(tmp_path, monkeypatch):
+    monkeypatch.setattr(parse_cache, "parse_cache", ParseCache(max_items=4))
+    calls = []
+
+    def run_cpu(fn, filepath, user_id, chain):
+        calls.append((fn, filepath, chain))
+        return {"text": "" if "scan" in filepath else "Кредитный отчет", "parsed_data": {"total_debt": 1.0}}
+
+    first, copy, scan = tmp_path / "report.pdf", tmp_path / "report_copy.pdf", tmp_path / "scan.pdf"
+    first.write_bytes(b"%PDF-1.4 report")
+    copy.write_bytes(b"%PDF-1.4 report")
+    scan.write_bytes(b"%PDF-1.4 scan")
+
+    upload = analyze_upload_cached(run_cpu, str(first), 1)
+    upload["parsed_data"]["total_debt"] = 2.0  # вызывающий код меняет результат - кэш не портится
+    assert analyze_upload_cached(run_cpu, str(copy), 2)["parsed_data"]["total_debt"] == 1.0
+    assert calls == [(analyze_upload, str(first), UploadPipeline.FULL_CHAIN)]
+
+    # Другая цепочка - отдельная запись; пустой текст не кэшируется
+    analyze_upload_cached(run_cpu, str(first), 1, UploadPipeline.BANKRUPTCY_CHAIN)
+    analyze_upload_cached(run_cpu, str(scan), 1)
+    analyze_upload_cached(run_cpu, str(scan), 1)
+    assert len(calls) == 4
+    assert parse_cache.parse_cache.stats()["hits"] == 1
@@ -0,0 +1,62 @@
+import re
+
+import report_sections as rs
+from report_sections import ReportSections
+
+
+REPORT = (
+    "Персональный кредитный отчет\n"
+    "ПОДРОБНАЯ ИНФОРМАЦИЯ ПО ДЕЙСТВУЮЩИМ ДОГОВОРАМ\n"
+    "Обязательство 1\nКредитор: АО \"Банк\"\nВид обеспечения: Квартира\n"
+    "Обязательство  12\nКредитор: ТОО \"МФО\"\n"
+    "Обязательство без номера\n"
+    "КОНТРАКТ 3\nКредитор: СФК\n"
+    "ПОДРОБНАЯ ИНФОРМАЦИЯ О ЗАВЕРШЕННЫХ ДОГОВОРАХ\n"
+    "Обязательство 4\nКредитор: АО \"Старый\"\n"
+)
+
+
+def test_blocks_match_re_split():
+    sections = ReportSections(REPORT)
+    blocks = [REPORT[start:end] for start, end in sections.blocks()]
+    assert blocks == re.split(r"(?:Обязательство|КОНТРАКТ)\s+\d+", REPORT)
+
+
+def test_blocks_inside_section_match_split_of_slice():
+    sections = ReportSections(REPORT)
+    start, end = sections.section(rs.GKB_ACTIVE, (rs.GKB_COMPLETED,))
+    blocks = [REPORT[s:e] for s, e in sections.blocks((rs.OBLIGATION,), start, end)]
+    assert blocks == re.split(r"Обязательство\s+\d+", REPORT[start:end])
+
+
+def test_section_matches_dotall_regex():
+    sections = ReportSections(REPORT)
+    match = re.search(
+        r"ПОДРОБНАЯ ИНФОРМАЦИЯ ПО ДЕЙСТВУЮЩИМ ДОГОВОРАМ(.*?)(?=ПОДРОБНАЯ ИНФОРМАЦИЯ О ЗАВЕРШЕННЫХ ДОГОВОРАХ|Текущие сведения)",
+        REPORT, re.DOTALL,
+    )
+    bounds = sections.section(rs.GKB_ACTIVE, (rs.GKB_COMPLETED, rs.GKB_CURRENT_INFO), to_text_end=False)
+    assert sections.slice(bounds) == match.group(1)
+
+    # Раздел до конца текста - как `$` в регулярном выражении
+    match = re.search(r"ПОДРОБНАЯ ИНФОРМАЦИЯ О ЗАВЕРШЕННЫХ ДОГОВОРАХ(.*?)(?=Текущие сведения|$)", REPORT, re.DOTALL)
+    assert sections.slice(sections.section(rs.GKB_COMPLETED, (rs.GKB_CURRENT_INFO,))) == match.group(1)
+    assert sections.section(rs.PKB_ACTIVE) is None
+
+
+def test_index_is_shared_for_same_text():
+    assert rs.index_sections(REPORT) is rs.index_sections(REPORT)
+
+
+def test_numbered_blocks_match_lookahead_regex():
+    for text in (REPORT, REPORT.rstrip("\n")):
+        sections = ReportSections(text)
+        start, end = sections.section(rs.GKB_ACTIVE, (rs.GKB_COMPLETED,))
+        expected = [
+            (m.group(1), m.start(2), m.end(2))
+            for m in re.compile(r"Обязательство\s+(\d+)(.*?)(?=Обязательство\s+\d+|$)", re.DOTALL).finditer(text, start, end)
+        ]
+        assert list(sections.iter_numbered_blocks(rs.OBLIGATION, start, end)) == expected
+
+        expected = [m.span(1) for m in re.compile(r"(Кредитор:.*?)(?=Кредитор:|$)", re.DOTALL).finditer(text)]
+        assert list(sections.iter_blocks_from(rs.CREDITOR)) == expected
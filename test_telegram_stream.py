@@ -0,0 +1,76 @@
+from telegram_stream import CURSOR, StreamingMessage
+
+
+class FakeBot:
+    def __init__(self, fail_with=None):
+        self.edits = []
+        self.fail_with = fail_with
+
+    def edit_message_text(self, chat_id, message_id, text):
+        if self.fail_with:
+            error, self.fail_with = self.fail_with, None
+            raise error
+        self.edits.append(text)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TooManyRequests(Exception):
+    error_code = 429
+    result_json = {"parameters": {"retry_after": 5}}
+
+
+def make_stream(bot, clock, sent=None, max_length=4000):
+    return StreamingMessage(bot, 1, 10, send_long=(sent.append if sent is not None else None),
+                            min_interval=1.0, max_length=max_length, clock=clock)
+
+
+def test_edits_are_throttled():
+    bot, clock = FakeBot(), FakeClock()
+    stream = make_stream(bot, clock)
+    for i in range(1, 31):
+        clock.now = i * 0.1  # фрагмент каждые 100 мс, 3 секунды
+        stream.update("слово " * i)
+    stream.finish("итоговый ответ")
+
+    assert len(bot.edits) == 4  # 0.1, 1.1, 2.1 и итоговая правка
+    assert all(edit.endswith(CURSOR) for edit in bot.edits[:-1])
+    assert bot.edits[-1] == "итоговый ответ"
+
+
+def test_rate_limit_pauses_edits():
+    bot, clock = FakeBot(fail_with=TooManyRequests("Too Many Requests")), FakeClock()
+    stream = make_stream(bot, clock)
+    stream.update("первый")
+    clock.now = 2.0
+    stream.update("второй")  # еще действует retry_after
+    clock.now = 6.0
+    stream.update("третий")
+
+    assert bot.edits == ["третий" + CURSOR]
+
+
+def test_long_answer_falls_back_to_separate_messages():
+    bot, clock, sent = FakeBot(), FakeClock(), []
+    stream = make_stream(bot, clock, sent, max_length=50)
+    stream.update("начало ответа")
+    clock.now = 5.0
+    stream.update("x" * 60)
+    assert stream.overflowed
+
+    stream.finish("x" * 80)
+    assert sent == ["x" * 80]
+    assert bot.edits[0] == "начало ответа" + CURSOR
+    assert "длинным" in bot.edits[-1]
+
+
+def test_failed_final_edit_sends_new_message():
+    bot, sent = FakeBot(fail_with=RuntimeError("message to edit not found")), []
+    make_stream(bot, FakeClock(), sent).finish("ответ")
+    assert sent == ["ответ"]
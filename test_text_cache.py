@@ -0,0 +1,97 @@
+import os
+import time
+
+import text_cache
+from text_cache import TextCache, LRUCache, cached_text_extraction
+
+
+def test_lru_evicts_oldest():
+    cache = LRUCache(max_items=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert "a" in cache
+    assert "b" not in cache
+    assert len(cache) == 2
+
+
+def test_text_cache_hits_by_content(tmp_path, monkeypatch):
+    cache = TextCache(max_items=4, cache_dir=str(tmp_path / "cache"))
+    monkeypatch.setattr(text_cache, "text_cache", cache)
+
+    calls = []
+
+    @cached_text_extraction("test")
+    def extract(filepath):
+        calls.append(filepath)
+        return "Кредитный отчет"
+
+    first = tmp_path / "report.pdf"
+    second = tmp_path / "report_copy.pdf"
+    first.write_bytes(b"%PDF-1.4 same bytes")
+    second.write_bytes(b"%PDF-1.4 same bytes")
+
+    assert extract(str(first)) == "Кредитный отчет"
+    assert extract(str(second)) == "Кредитный отчет"
+    assert len(calls) == 1
+
+    # Новый процесс: память пустая, текст поднимается с диска
+    cache.memory.clear()
+    assert extract(str(first)) == "Кредитный отчет"
+    assert len(calls) == 1
+
+    stats = cache.stats()
+    assert stats["memory_hits"] == 1
+    assert stats["disk_hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_empty_text_is_not_cached(tmp_path, monkeypatch):
+    cache = TextCache(max_items=4, cache_dir=str(tmp_path / "cache"))
+    monkeypatch.setattr(text_cache, "text_cache", cache)
+
+    calls = []
+
+    @cached_text_extraction("test")
+    def extract(filepath):
+        calls.append(filepath)
+        return "   "
+
+    pdf = tmp_path / "scan.pdf"
+    pdf.write_bytes(b"%PDF-1.4 scan")
+
+    extract(str(pdf))
+    extract(str(pdf))
+    assert len(calls) == 2
+
+
+def test_disk_cache_drops_expired_and_oldest_files(tmp_path):
+    cache = TextCache(max_items=4, cache_dir=str(tmp_path / "cache"), max_disk_mb=0.01, ttl_days=1,
+                      prune_every=1000)
+    text = "Кредитный отчет " * 300
+    for key in ("aa_old", "bb_stale", "cc_new"):
+        cache.set(key, text + key)
+    day = 24 * 3600
+    os.utime(cache._disk_path("aa_old"), (time.time() - 2 * day,) * 2)
+    os.utime(cache._disk_path("bb_stale"), (time.time() - 3600,) * 2)
+    cache.memory.clear()
+
+    # Просроченный файл не читается и удаляется
+    assert cache.get("aa_old") is None
+    assert not os.path.exists(cache._disk_path("aa_old"))
+
+    # Сверх лимита размера удаляются давно не читавшиеся файлы
+    cache.max_disk_bytes = os.path.getsize(cache._disk_path("cc_new"))
+    assert cache.prune() == 1
+    assert not os.path.exists(cache._disk_path("bb_stale"))
+    assert cache.get("cc_new") == text + "cc_new"
+    assert cache.stats()["disk_pruned"] == 2
+
+
+def test_purge_removes_memory_and_disk(tmp_path):
+    cache = TextCache(max_items=4, cache_dir=str(tmp_path / "cache"))
+    cache.set("aa_key", "Кредитный отчет")
+    assert cache.purge() == 1
+    assert cache.get("aa_key") is None
@@ -0,0 +1,81 @@
+import os
+
+import pytest
+
+import ocr
+import text_extractor
+
+# Двухстраничный PDF из golden_corpus/short.txt: python golden_corpus.py --pdf short
+SAMPLE_PDF = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden_corpus", "short.pdf")
+
+
+def _mixed(monkeypatch, tmp_path, pages=None, pdfminer_error=None):
+    monkeypatch.setattr(text_extractor, "find_image_only_pages", lambda filepath: ([2], 3))
+    monkeypatch.setattr(ocr, "ocr_pages", lambda filepath, page_numbers: {2: "Скан страницы 2\n"})
+
+    def pdfminer_pages(filepath):
+        if pdfminer_error:
+            raise pdfminer_error
+        return list(pages)
+
+    monkeypatch.setattr(text_extractor, "extract_pages_text", pdfminer_pages)
+    monkeypatch.setattr(text_extractor, "extract_pages_text_fallback",
+                        lambda filepath: ["Страница 1\n", "", "Страница 3\n"])
+    pdf = tmp_path / "mixed.pdf"
+    pdf.write_bytes(b"%PDF-1.4")
+    return text_extractor.extract_text_mixed.uncached(str(pdf))
+
+
+def test_mixed_keeps_page_separator_after_ocr(monkeypatch, tmp_path):
+    text = _mixed(monkeypatch, tmp_path, pages=["Страница 1\n\x0c", "\x0c", "Страница 3\n\x0c"])
+    assert text == "Страница 1\n\x0cСкан страницы 2\n\x0cСтраница 3\n\x0c"
+    assert text.count("\x0c") == 3
+
+
+def test_mixed_falls_back_to_pymupdf_when_pdfminer_fails(monkeypatch, tmp_path):
+    text = _mixed(monkeypatch, tmp_path, pdfminer_error=ValueError("broken xref"))
+    assert text == "Страница 1\nСкан страницы 2\nСтраница 3\n"
+
+
+def test_robust_tries_remaining_configs_when_winner_fails(monkeypatch, tmp_path):
+    good = "Кредитный отчет " * 100
+    tried = []
+
+    def extract(filepath, laparams, maxpages=0):
+        index = next(i for i, params in enumerate(text_extractor.ROBUST_LAPARAMS)
+                     if laparams.char_margin == params["char_margin"]
+                     and laparams.line_margin == params["line_margin"])
+        tried.append(index)
+        return good if index == 2 else "кредит"
+
+    monkeypatch.setattr(text_extractor, "detect_report_layout", lambda filepath: "GKB")
+    monkeypatch.setattr(text_extractor, "_select_robust_config", lambda filepath: 1)
+    monkeypatch.setattr(text_extractor, "_extract_with_laparams", extract)
+    monkeypatch.setattr(text_extractor, "extract_text_fallback_pymupdf", lambda filepath: "fallback")
+    monkeypatch.setattr(text_extractor, "_layout_configs", {})
+    pdf = tmp_path / "report.pdf"
+    pdf.write_bytes(b"%PDF-1.4")
+
+    assert text_extractor.extract_text_robust.uncached(str(pdf)) == good
+    assert tried == [1, 0, 2]
+    assert text_extractor._layout_configs == {"GKB": 2}
+
+
+def test_pymupdf_page_text_matches_pdfminer_format():
+    fitz = pytest.importorskip("fitz")
+
+    with fitz.open(SAMPLE_PDF) as doc:
+        last_page = text_extractor._pymupdf_page_text(doc[1])
+    # Блок = строки через \n, пустая строка после блока, \x0c в конце страницы
+    assert last_page == (
+        "15 000,00 KZT\n\nТОО \"Коллекторское агентство Долг\"\n\n250 000,00 KZT\n\n365\n\n"
+        "ВАЖНАЯ ИНФОРМАЦИЯ\n\nСтраница 1 из 1\n\n\x0c"
+    )
+
+
+def test_fast_path_text_equals_pdfminer_text():
+    pytest.importorskip("fitz")
+
+    fast = text_extractor.extract_text_fast_pymupdf.uncached(SAMPLE_PDF)
+    assert fast == text_extractor.extract_text_from_pdf.uncached(SAMPLE_PDF)
+    assert fast.count("\x0c") == 2
@@ -0,0 +1,32 @@
+import os
+
+import text_cache
+from bankruptcy_calculator import process_credit_report_with_bankruptcy_analysis
+from credit_application_generator import process_credit_report_with_applications
+from text_cache import TextCache
+
+# Двухстраничный PDF из golden_corpus/short.txt (три кредитора, краткая форма)
+SAMPLE_PDF = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden_corpus", "short.pdf")
+
+
+def _isolated_text_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(text_cache, "text_cache", TextCache(max_items=4, cache_dir=str(tmp_path / "cache")))
+
+
+def test_bankruptcy_helper_on_sample_pdf(tmp_path, monkeypatch):
+    _isolated_text_cache(tmp_path, monkeypatch)
+
+    result = process_credit_report_with_bankruptcy_analysis(SAMPLE_PDF, 1)
+
+    assert result["type"] == "credit_report"
+    assert result["bankruptcy_data"]["total_obligations"] == 3
+    assert isinstance(result["bankruptcy_analysis"], str) and not result["bankruptcy_analysis"].startswith("❌")
+
+
+def test_applications_helper_on_sample_pdf(tmp_path, monkeypatch):
+    _isolated_text_cache(tmp_path, monkeypatch)
+
+    result = process_credit_report_with_applications(SAMPLE_PDF, 1)
+
+    assert result["type"] == "credit_report"
+    assert result["applications_count"] == len(result["applications"]) > 0
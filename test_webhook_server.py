@@ -0,0 +1,98 @@
+import asyncio
+import threading
+import time
+
+import pytest
+import telebot
+from aiohttp.test_utils import TestClient, TestServer
+
+import webhook_server
+
+from webhook_server import (
+    SECRET_HEADER, UpdateDispatcher, create_app, fake_update, post_fake_updates, run_webhook, telebot_processor,
+)
+
+
+def _serve(dispatcher, scenario, secret=""):
+    """Поднимает приложение на локальном порту и выполняет scenario(client, url)"""
+    async def run():
+        async with TestClient(TestServer(create_app(dispatcher, "/telegram", secret))) as client:
+            return await scenario(client, str(client.make_url("/telegram")))
+    return asyncio.run(run())
+
+
+def test_updates_are_acked_before_processing_and_keep_chat_order():
+    handled = []
+    lock = threading.Lock()
+
+    def slow_process(update):
+        time.sleep(0.05)
+        with lock:
+            handled.append((update["message"]["chat"]["id"], update["update_id"]))
+
+    dispatcher = UpdateDispatcher(slow_process, workers=4, max_pending=100)
+
+    async def scenario(client, url):
+        statuses, elapsed = await post_fake_updates(url, 40, chats=4, secret="")
+        return statuses, elapsed
+
+    statuses, elapsed = _serve(dispatcher, scenario)
+    # 40 обновлений по 50 мс последовательно заняли бы 2 с; ответы приходят раньше обработки
+    assert statuses == {200: 40}
+    assert elapsed < 1.0
+    dispatcher.shutdown()
+
+    assert len(handled) == 40
+    for chat_id in {chat for chat, _ in handled}:
+        ids = [update_id for chat, update_id in handled if chat == chat_id]
+        assert ids == sorted(ids)
+    assert dispatcher.stats()["processed"] == 40
+
+
+def test_full_queue_returns_503_and_wrong_secret_403():
+    release = threading.Event()
+    dispatcher = UpdateDispatcher(lambda update: release.wait(5), workers=1, max_pending=2)
+
+    async def scenario(client, url):
+        codes = []
+        for i in range(3):
+            response = await client.post("/telegram", json=fake_update(i + 1, 1), headers={SECRET_HEADER: "s"})
+            codes.append(response.status)
+        wrong = await client.post("/telegram", json=fake_update(9, 1), headers={SECRET_HEADER: "x"})
+        missing = await client.post("/telegram", json=fake_update(10, 1))
+        release.set()
+        return codes, (wrong.status, missing.status)
+
+    codes, wrong_statuses = _serve(dispatcher, scenario, secret="s")
+    assert codes == [200, 200, 503]
+    assert wrong_statuses == (403, 403)
+    assert dispatcher.stats()["rejected"] == 1
+
+
+def test_telebot_handlers_run_in_dispatcher_threads():
+    bot = telebot.TeleBot("123456:TEST", threaded=True)
+    seen = []
+
+    @bot.message_handler(commands=["start"])
+    def start(message):
+        seen.append((message.chat.id, threading.current_thread().name))
+
+    dispatcher = UpdateDispatcher(telebot_processor(bot), workers=2)
+    dispatcher.submit(fake_update(1, 42))
+    dispatcher.shutdown()
+
+    assert seen and seen[0][0] == 42
+    assert seen[0][1].startswith("webhook-")
+
+
+def test_webhook_without_secret_is_local_only(monkeypatch):
+    bot = telebot.TeleBot("123456:TEST")
+    served = []
+    monkeypatch.setattr(webhook_server.web, "run_app", lambda app, host, port, print: served.append(host))
+
+    with pytest.raises(RuntimeError):
+        run_webhook(bot, url="https://bot.example.com", secret="")
+    assert served == []
+
+    run_webhook(bot, url="", host="0.0.0.0", port=8443, secret="")
+    assert served == ["127.0.0.1"]
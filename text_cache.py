@@ -0,0 +1,324 @@
+# text_cache.py
+"""
+Кэш извлеченного текста PDF (память процесса + gzip-файлы в TEXT_CACHE_DIR).
+
+В файлах на диске лежит текст кредитных отчетов с персональными данными клиентов
+(без шифрования), поэтому дисковый уровень ограничен: файлы старше
+TEXT_CACHE_TTL_DAYS и самые старые сверх TEXT_CACHE_DISK_MAX_MB удаляются
+при первой записи в кэш и дальше раз в TEXT_CACHE_PRUNE_EVERY записей.
+
+Обслуживание:
+    python text_cache.py --prune    # удалить просроченное и лишнее сейчас
+    python text_cache.py --purge    # удалить весь дисковый кэш (например, по запросу клиента
+                                    # на удаление данных; память процессов очистит перезапуск бота)
+"""
+
+import argparse
+import gzip
+import hashlib
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Настройки кэша берем из окружения
+TEXT_CACHE_ENABLED = os.getenv("TEXT_CACHE_ENABLED", "True").lower() == "true"
+TEXT_CACHE_SIZE = int(os.getenv("TEXT_CACHE_SIZE", "128"))
+TEXT_CACHE_DIR = os.getenv("TEXT_CACHE_DIR", "./text_cache")
+# Ограничения дискового уровня: размер, срок хранения и как часто проверять (в записях)
+TEXT_CACHE_DISK_MAX_MB = float(os.getenv("TEXT_CACHE_DISK_MAX_MB", "512"))
+TEXT_CACHE_TTL_DAYS = float(os.getenv("TEXT_CACHE_TTL_DAYS", "30"))
+TEXT_CACHE_PRUNE_EVERY = int(os.getenv("TEXT_CACHE_PRUNE_EVERY", "50"))
+
+
+class LRUCache:
+    """Простой потокобезопасный LRU-кэш в памяти процесса"""
+
+    def __init__(self, max_items=128):
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._items:
+                return default
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._items.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+
+class TextCache:
+    """
+    Двухуровневый кэш извлеченного текста PDF.
+    Ключ - SHA-256 байтов файла + метод извлечения.
+    Уровень 1 - LRU в памяти процесса, уровень 2 - gzip-файлы на диске
+    (общие для всех процессов и переживают перезапуск бота). Дисковый уровень
+    ограничен по сроку (ttl_days) и размеру (max_disk_mb): чтение обновляет
+    mtime файла, при переполнении удаляются давно не читавшиеся файлы.
+    """
+
+    def __init__(self, max_items=TEXT_CACHE_SIZE, cache_dir=TEXT_CACHE_DIR, max_disk_mb=TEXT_CACHE_DISK_MAX_MB,
+                 ttl_days=TEXT_CACHE_TTL_DAYS, prune_every=TEXT_CACHE_PRUNE_EVERY):
+        self.memory = LRUCache(max_items)
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = int(max_disk_mb * 1024 * 1024)
+        self.ttl_seconds = ttl_days * 24 * 3600
+        self.prune_every = max(1, prune_every)
+        self._stats_lock = threading.Lock()
+        self._prune_lock = threading.Lock()
+        self._writes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_pruned = 0
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.txt.gz")
+
+    def _count(self, counter):
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, key):
+        """Возвращает текст из кэша или None"""
+        text = self.memory.get(key)
+        if text is not None:
+            self._count("memory_hits")
+            return text
+
+        if self.cache_dir:
+            path = self._disk_path(key)
+            try:
+                if self._expired(os.stat(path).st_mtime):
+                    self._remove(path)
+                    raise FileNotFoundError(path)
+                with gzip.open(path, "rt", encoding="utf-8") as f:
+                    text = f.read()
+                os.utime(path)  # давно не читавшиеся файлы удаляются первыми
+            except FileNotFoundError:
+                text = None
+            except Exception as e:
+                print(f"[WARN] Не удалось прочитать кэш {path}: {e}")
+                text = None
+
+            if text is not None:
+                self.memory.set(key, text)
+                self._count("disk_hits")
+                return text
+
+        self._count("misses")
+        return None
+
+    def set(self, key, text):
+        """Сохраняет текст в оба уровня кэша"""
+        self.memory.set(key, text)
+
+        if not self.cache_dir:
+            return
+
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+                f.write(text)
+            # Атомарная замена, чтобы параллельные процессы не читали недописанный файл
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"[WARN] Не удалось записать кэш {path}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+
+        with self._stats_lock:
+            self._writes += 1
+            # Первая запись процесса и дальше каждая prune_every-я
+            due = (self._writes - 1) % self.prune_every == 0
+        if due:
+            self.prune()
+
+    def _expired(self, mtime, now=None):
+        return self.ttl_seconds > 0 and (now or time.time()) - mtime > self.ttl_seconds
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        self._count("disk_pruned")
+        return True
+
+    def _disk_files(self):
+        """[(mtime, размер, путь)] файлов дискового кэша"""
+        files = []
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                if not name.endswith(".txt.gz"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def prune(self):
+        """
+        Удаляет с диска просроченные файлы, затем самые старые, пока кэш больше max_disk_mb.
+        Возвращает число удаленных файлов.
+        """
+        if not self.cache_dir or not os.path.isdir(self.cache_dir):
+            return 0
+        # Несколько потоков одного процесса не обходят каталог одновременно
+        if not self._prune_lock.acquire(blocking=False):
+            return 0
+        try:
+            now = time.time()
+            removed = 0
+            kept = []
+            for mtime, size, path in self._disk_files():
+                if self._expired(mtime, now):
+                    removed += self._remove(path)
+                else:
+                    kept.append((mtime, size, path))
+
+            total = sum(size for _, size, _ in kept)
+            if self.max_disk_bytes > 0:
+                for _, size, path in sorted(kept):
+                    if total <= self.max_disk_bytes:
+                        break
+                    removed += self._remove(path)
+                    total -= size
+            if removed:
+                print(f"[LOG] Кэш текста: удалено {removed} файлов, на диске {total / 1024 / 1024:.1f} МБ")
+            return removed
+        finally:
+            self._prune_lock.release()
+
+    def purge(self):
+        """Удаляет весь кэш: память этого процесса и все файлы на диске. Возвращает число файлов"""
+        self.memory.clear()
+        if not self.cache_dir:
+            return 0
+        return sum(self._remove(path) for _, _, path in self._disk_files())
+
+    def stats(self):
+        """Счетчики попаданий/промахов для диагностики"""
+        with self._stats_lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "hits": hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / total, 3) if total else 0.0,
+                "memory_items": len(self.memory),
+                "disk_pruned": self.disk_pruned,
+            }
+
+
+text_cache = TextCache()
+
+# Хеши файлов по (путь, размер, mtime): цепочка extract_* не перечитывает файл на каждом уровне
+_file_hashes = LRUCache(256)
+
+
+def file_sha256(filepath, chunk_size=1024 * 1024):
+    """Считает SHA-256 содержимого файла (читаем кусками, чтобы не грузить весь PDF в память)"""
+    stat = os.stat(filepath)
+    memo_key = (os.path.abspath(filepath), stat.st_size, stat.st_mtime_ns)
+    cached = _file_hashes.get(memo_key)
+    if cached:
+        return cached
+
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+
+    _file_hashes.set(memo_key, digest.hexdigest())
+    return digest.hexdigest()
+
+
+def cached_text_extraction(method):
+    """
+    Декоратор для функций извлечения текста вида func(filepath) -> str.
+    Повторная обработка того же PDF (по содержимому, а не по имени) берется из кэша.
+    Пустой результат не кэшируем, чтобы сработал OCR или повторная попытка.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(filepath, *args, **kwargs):
+            if not TEXT_CACHE_ENABLED or args or kwargs:
+                return func(filepath, *args, **kwargs)
+
+            try:
+                key = f"{file_sha256(filepath)}_{method}"
+            except OSError:
+                return func(filepath)
+
+            text = text_cache.get(key)
+            if text is not None:
+                return text
+
+            text = func(filepath)
+            if text and text.strip():
+                text_cache.set(key, text)
+            return text
+
+        wrapper.uncached = func
+        return wrapper
+    return decorator
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Обслуживание дискового кэша текста PDF")
+    arg_parser.add_argument("--prune", action="store_true", help="Удалить просроченные и лишние файлы")
+    arg_parser.add_argument("--purge", action="store_true", help="Удалить весь дисковый кэш")
+    args = arg_parser.parse_args()
+
+    if args.purge:
+        print(f"[INFO] Удалено файлов кэша: {text_cache.purge()} ({text_cache.cache_dir})")
+    elif args.prune:
+        print(f"[INFO] Удалено файлов кэша: {text_cache.prune()} ({text_cache.cache_dir})")
+    else:
+        arg_parser.print_help()
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
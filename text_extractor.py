@@ -6,6 +6,9 @@ from pdfminer.converter import TextConverter
 from pdfminer.layout import LAParams
 import logging
 import os
+import threading
+
+from text_cache import cached_text_extraction
 
 # Настройка логирования
 DEBUG_MODE = os.getenv('DEBUG', 'False').lower() == 'true'
@@ -18,6 +21,21 @@ else:
     logger = logging.getLogger(__name__)
     logger.disabled = True
 
+# Страница с текстовым слоем короче этого считается сканом и уходит в OCR
+OCR_MIN_PAGE_CHARS = int(os.getenv("OCR_MIN_PAGE_CHARS", "30"))
+
+def credit_report_laparams():
+    """Настройки LAParams для кредитных отчетов"""
+    return LAParams(
+        char_margin=2.0,        # Расстояние между символами для группировки в слова
+        line_margin=0.3,        # Расстояние между строками для группировки в абзацы
+        word_margin=0.1,        # Расстояние между словами
+        boxes_flow=0.5,         # Порядок обхода блоков (0.5 = сбалансированный)
+        detect_vertical=False,  # Не обнаруживать вертикальный текст
+        all_texts=False         # Не включать ненужные элементы
+    )
+
+@cached_text_extraction("pdfminer")
 def extract_text_from_pdf(filepath):
     """
     Извлекает текст из PDF используя pdfminer.six с настроенными LAParams
@@ -25,14 +43,7 @@ def extract_text_from_pdf(filepath):
     """
     try:
         # Настройки LAParams для кредитных отчетов
-        laparams = LAParams(
-            char_margin=2.0,        # Расстояние между символами для группировки в слова
-            line_margin=0.3,        # Расстояние между строками для группировки в абзацы
-            word_margin=0.1,        # Расстояние между словами
-            boxes_flow=0.5,         # Порядок обхода блоков (0.5 = сбалансированный)
-            detect_vertical=False,  # Не обнаруживать вертикальный текст
-            all_texts=False         # Не включать ненужные элементы
-        )
+        laparams = credit_report_laparams()
         
         output_string = io.StringIO()
         rsrcmgr = PDFResourceManager()
@@ -65,6 +76,7 @@ def extract_text_from_pdf(filepath):
         logger.info("Используем fallback на PyMuPDF...")
         return extract_text_fallback_pymupdf(filepath)
 
+@cached_text_extraction("pymupdf")
 def extract_text_fallback_pymupdf(filepath):
     """
     Fallback метод используя PyMuPDF если pdfminer.six не работает
@@ -93,65 +105,205 @@ def extract_text_fallback_pymupdf(filepath):
         logger.error(f"Ошибка и в fallback методе: {e}")
         return ""
 
-def extract_text_robust(filepath):
+# Набор различных конфигураций LAParams для extract_text_robust
+ROBUST_LAPARAMS = [
+    # Конфигурация для кредитных отчетов (основная)
+    dict(char_margin=2.0, line_margin=0.3, word_margin=0.1, boxes_flow=0.5),
+    
+    # Конфигурация для плотных документов
+    dict(char_margin=1.5, line_margin=0.2, word_margin=0.05, boxes_flow=0.3),
+    
+    # Конфигурация для документов с таблицами
+    dict(char_margin=3.0, line_margin=0.5, word_margin=0.2, boxes_flow=0.7),
+    
+    # Минимальная конфигурация
+    dict(char_margin=1.0, line_margin=0.1, word_margin=0.0, boxes_flow=0.1)
+]
+
+# Сколько первых страниц используем для подбора конфигурации
+ROBUST_PROBE_PAGES = int(os.getenv("ROBUST_PROBE_PAGES", "2"))
+
+# Запомненная конфигурация для каждого типа отчета (PKB/GKB/KZ): layout -> индекс в ROBUST_LAPARAMS
+_layout_configs = {}
+_layout_configs_lock = threading.Lock()
+
+def _extract_with_laparams(filepath, laparams, maxpages=0):
+    """Извлекает текст pdfminer.six с заданными LAParams (maxpages=0 - все страницы)"""
+    output_string = io.StringIO()
+    rsrcmgr = PDFResourceManager()
+    device = TextConverter(rsrcmgr, output_string, laparams=laparams)
+    interpreter = PDFPageInterpreter(rsrcmgr, device)
+    
+    with open(filepath, 'rb') as file:
+        for page in PDFPage.get_pages(file, maxpages=maxpages, check_extractable=True):
+            interpreter.process_page(page)
+    
+    text = output_string.getvalue()
+    device.close()
+    output_string.close()
+    return text
+
+def _is_good_extraction(text):
+    """Проверяем качество извлечения"""
+    return len(text) > 1000 and "кредит" in text.lower()
+
+def _extraction_score(text):
+    """Оценка пробного извлечения: сначала ключевые слова, потом длина"""
+    lowered = text.lower()
+    keywords = sum(1 for kw in ["кредит", "обязательство", "долг", "банк"] if kw in lowered)
+    return (_is_good_extraction(text), keywords, len(text))
+
+def detect_report_layout(filepath):
+    """Определяет тип отчета (PKB/GKB/KZ) по первой странице через PyMuPDF"""
+    try:
+        import fitz  # PyMuPDF
+        with fitz.open(filepath) as doc:
+            if len(doc) == 0:
+                return None
+            first_page = doc.load_page(0).get_text()
+    except Exception as e:
+        logger.warning(f"Не удалось определить тип отчета: {e}")
+        return None
+    
+    upper = first_page.upper()
+    if "ҚОЛДАНЫСТАҒЫ" in upper or "КРЕДИТТІК ЕСЕП" in upper or "ЖСН" in upper:
+        return "KZ"
+    if "ГОСУДАРСТВЕННОЕ КРЕДИТНОЕ БЮРО" in upper or "ГКБ" in upper:
+        return "GKB"
+    if "ПЕРСОНАЛЬНЫЙ КРЕДИТНЫЙ" in upper or "ПКБ" in upper:
+        return "PKB"
+    return None
+
+def _select_robust_config(filepath):
     """
-    Робустный метод с несколькими попытками и разными параметрами
+    Подбирает конфигурацию LAParams по первым ROBUST_PROBE_PAGES страницам.
+    Возвращает индекс лучшей конфигурации или None.
     """
+    best_index, best_score = None, None
     
-    # Набор различных конфигураций LAParams
-    configs = [
-        # Конфигурация для кредитных отчетов (основная)
-        LAParams(char_margin=2.0, line_margin=0.3, word_margin=0.1, boxes_flow=0.5),
-        
-        # Конфигурация для плотных документов
-        LAParams(char_margin=1.5, line_margin=0.2, word_margin=0.05, boxes_flow=0.3),
-        
-        # Конфигурация для документов с таблицами
-        LAParams(char_margin=3.0, line_margin=0.5, word_margin=0.2, boxes_flow=0.7),
+    for i, params in enumerate(ROBUST_LAPARAMS):
+        try:
+            if DEBUG_MODE:
+                logger.info(f"Пробуем конфигурацию {i+1}/{len(ROBUST_LAPARAMS)} на первых страницах")
+            probe = _extract_with_laparams(filepath, LAParams(**params), maxpages=ROBUST_PROBE_PAGES)
+        except Exception as e:
+            if DEBUG_MODE:
+                logger.warning(f"Конфигурация {i+1} не сработала: {e}")
+            continue
         
-        # Минимальная конфигурация
-        LAParams(char_margin=1.0, line_margin=0.1, word_margin=0.0, boxes_flow=0.1)
-    ]
+        score = _extraction_score(probe)
+        # Первая подходящая конфигурация побеждает, как и раньше при полном переборе
+        if score[0]:
+            return i
+        if best_score is None or score > best_score:
+            best_index, best_score = i, score
+    
+    return best_index
+
+@cached_text_extraction("robust")
+def extract_text_robust(filepath):
+    """
+    Робустный метод с несколькими попытками и разными параметрами.
+    Конфигурации сравниваются на первых страницах, весь документ
+    извлекается победившей конфигурацией, а если результат плохой - остальными
+    по порядку. Сработавшая конфигурация запоминается для типа отчета,
+    и следующие отчеты того же типа подбор пропускают.
+    """
+    layout = detect_report_layout(filepath)
+    
+    with _layout_configs_lock:
+        config_index = _layout_configs.get(layout) if layout else None
     
-    for i, laparams in enumerate(configs):
+    remembered = config_index is not None
+    if not remembered:
+        config_index = _select_robust_config(filepath)
+    
+    # Сначала победитель подбора (или запомненная), затем остальные по порядку
+    candidates = list(range(len(ROBUST_LAPARAMS)))
+    if config_index is not None:
+        candidates.remove(config_index)
+        candidates.insert(0, config_index)
+    
+    for i in candidates:
         try:
-            if DEBUG_MODE:
-                logger.info(f"Пробуем конфигурацию {i+1}/{len(configs)}")
-            
-            output_string = io.StringIO()
-            rsrcmgr = PDFResourceManager()
-            device = TextConverter(rsrcmgr, output_string, laparams=laparams)
-            interpreter = PDFPageInterpreter(rsrcmgr, device)
-            
-            with open(filepath, 'rb') as file:
-                for page in PDFPage.get_pages(file, check_extractable=True):
-                    interpreter.process_page(page)
-            
-            text = output_string.getvalue()
-            device.close()
-            output_string.close()
-            
-            # Проверяем качество извлечения
-            if len(text) > 1000 and "кредит" in text.lower():
-                if DEBUG_MODE:
-                    logger.info(f"Успешно с конфигурацией {i+1}")
-                return text
-                
+            text = _extract_with_laparams(filepath, LAParams(**ROBUST_LAPARAMS[i]))
         except Exception as e:
             if DEBUG_MODE:
                 logger.warning(f"Конфигурация {i+1} не сработала: {e}")
             continue
+        
+        if _is_good_extraction(text):
+            if DEBUG_MODE:
+                logger.info(f"Успешно с конфигурацией {i+1} (тип отчета: {layout})")
+            if layout and not (remembered and i == config_index):
+                with _layout_configs_lock:
+                    _layout_configs[layout] = i
+            return text
     
     # Если все конфигурации не сработали
     logger.warning("Все конфигурации pdfminer.six не сработали, используем fallback")
     return extract_text_fallback_pymupdf(filepath)
 
+# Быстрый путь через PyMuPDF вместо pdfminer.six (проверять compare_extractors.py перед включением)
+PDF_FAST_PATH = os.getenv("PDF_FAST_PATH", "False").lower() == "true"
+
+def _pymupdf_page_text(page):
+    """
+    Текст страницы PyMuPDF в формате вывода pdfminer.six TextConverter:
+    блоки сверху вниз и слева направо, строка блока = слова через пробел,
+    пустая строка после каждого блока и \x0c в конце страницы.
+    """
+    # (x0, y0, x1, y1, слово, номер_блока, номер_строки, номер_слова)
+    words = page.get_text("words")
+    
+    blocks = {}
+    for x0, y0, x1, y1, word, block_no, line_no, word_no in words:
+        block = blocks.setdefault(block_no, {})
+        block.setdefault(line_no, []).append((x0, y0, word))
+    
+    def block_position(lines):
+        first_words = [ws[0] for ws in lines.values()]
+        return (round(min(y for _, y, _ in first_words)), min(x for x, _, _ in first_words))
+    
+    parts = []
+    for lines in sorted(blocks.values(), key=block_position):
+        for line_words in sorted(lines.values(), key=lambda ws: min(y for _, y, _ in ws)):
+            parts.append(" ".join(word for _, _, word in sorted(line_words)) + "\n")
+        parts.append("\n")
+    parts.append("\x0c")
+    return "".join(parts)
+
+@cached_text_extraction("fast")
+def extract_text_fast_pymupdf(filepath):
+    """
+    Быстрое извлечение через PyMuPDF со строками в том же порядке,
+    что ожидают парсеры от pdfminer.six с LAParams(char_margin=2.0, line_margin=0.3...)
+    """
+    try:
+        import fitz  # PyMuPDF
+        
+        with fitz.open(filepath) as doc:
+            return "".join(_pymupdf_page_text(page) for page in doc)
+    
+    except Exception as e:
+        logger.error(f"Ошибка быстрого извлечения PyMuPDF: {e}")
+        return ""
+
 # Основная функция для совместимости
+@cached_text_extraction("enhanced_fast" if PDF_FAST_PATH else "enhanced")
 def extract_text_from_pdf_enhanced(filepath):
     """
     Расширенная функция извлечения с автоматическим выбором метода
     """
     
+    # Быстрый путь (если включен): при хорошем результате pdfminer не запускается
+    if PDF_FAST_PATH:
+        text = extract_text_fast_pymupdf(filepath)
+        if _is_good_extraction(text):
+            return text
+        if DEBUG_MODE:
+            logger.info("Быстрый путь PyMuPDF дал плохой результат, используем pdfminer.six...")
+    
     # Сначала пробуем основной метод
     text = extract_text_from_pdf(filepath)
     
@@ -163,6 +315,96 @@ def extract_text_from_pdf_enhanced(filepath):
     
     return text
 
+def find_image_only_pages(filepath, min_chars=None):
+    """
+    Возвращает (номера страниц без текстового слоя (с 1), всего страниц).
+    Страница считается сканом, если на ней есть изображения, а текста почти нет.
+    Использует PyMuPDF: длина текста страницы считается без разбора layout.
+    """
+    import fitz  # PyMuPDF
+
+    min_chars = OCR_MIN_PAGE_CHARS if min_chars is None else min_chars
+
+    with fitz.open(filepath) as doc:
+        image_pages = [
+            page.number + 1
+            for page in doc
+            if len(page.get_text().strip()) < min_chars and page.get_images()
+        ]
+        return image_pages, len(doc)
+
+def extract_pages_text(filepath):
+    """
+    Извлекает текст pdfminer.six постранично (те же LAParams, что в extract_text_from_pdf).
+    "".join(результат) совпадает с extract_text_from_pdf.
+    """
+    output_string = io.StringIO()
+    rsrcmgr = PDFResourceManager()
+    device = TextConverter(rsrcmgr, output_string, laparams=credit_report_laparams())
+    interpreter = PDFPageInterpreter(rsrcmgr, device)
+
+    pages = []
+    page_start = 0
+    with open(filepath, 'rb') as file:
+        for page in PDFPage.get_pages(file, check_extractable=True):
+            interpreter.process_page(page)
+            text = output_string.getvalue()
+            pages.append(text[page_start:])
+            page_start = len(text)
+
+    device.close()
+    output_string.close()
+    return pages
+
+def extract_pages_text_fallback(filepath):
+    """Постраничный текст через PyMuPDF, как в extract_text_fallback_pymupdf"""
+    import fitz  # PyMuPDF
+
+    with fitz.open(filepath) as doc:
+        return [page.get_text() for page in doc]
+
+@cached_text_extraction("mixed")
+def extract_text_mixed(filepath):
+    """
+    Извлечение для смешанных PDF: страницы с текстовым слоем читаются pdfminer,
+    OCR запускается только для страниц-сканов, результат склеивается в порядке страниц.
+    Если сканов нет - то же самое, что extract_text_from_pdf_enhanced.
+    """
+    from ocr import ocr_file, ocr_pages
+
+    try:
+        image_pages, page_count = find_image_only_pages(filepath)
+    except Exception as e:
+        logger.warning(f"Не удалось проверить страницы через PyMuPDF: {e}")
+        image_pages, page_count = [], 0
+
+    if not image_pages:
+        return extract_text_from_pdf_enhanced(filepath)
+
+    if len(image_pages) == page_count:
+        print(f"[INFO] Текстового слоя нет ни на одной странице, OCR всего документа...")
+        return ocr_file(filepath)
+
+    print(f"[INFO] Страницы без текстового слоя: {image_pages} из {page_count}, OCR только для них...")
+    try:
+        pages = extract_pages_text(filepath)
+    except Exception as e:
+        logger.warning(f"pdfminer.six не разобрал страницы ({e}), используем fallback PyMuPDF")
+        try:
+            pages = extract_pages_text_fallback(filepath)
+        except Exception as e:
+            logger.error(f"Ошибка и в fallback методе: {e}")
+            return extract_text_from_pdf_enhanced(filepath)
+    ocr_texts = ocr_pages(filepath, image_pages)
+
+    for page_number, page_text in ocr_texts.items():
+        if page_number <= len(pages):
+            # Разделитель страниц (\x0c у pdfminer) сохраняется и после OCR
+            separator = "\x0c" if pages[page_number - 1].endswith("\x0c") else ""
+            pages[page_number - 1] = page_text.rstrip("\x0c") + separator
+
+    return "".join(pages)
+
 # Функция для тестирования разных методов
 def test_extraction_methods(filepath):
     """
@@ -0,0 +1,30 @@
+# text_memo.py
+"""
+Память парсеров о последних текстах отчетов: одна цепочка парсеров разбирает
+один и тот же объект текста, и производные от него (формат, индекс разделов)
+считаются один раз. Используется format_detector и report_sections.
+"""
+
+import threading
+from collections import deque
+
+
+class RecentTexts:
+    """
+    Объекты, вычисленные по последним текстам отчетов (определение формата, индекс разделов).
+    Текст сравнивается по идентичности объекта, чтобы не хешировать сотни килобайт
+    на каждом звене цепочки парсеров.
+    """
+
+    def __init__(self, max_items=4):
+        self._items = deque(maxlen=max_items)
+        self._lock = threading.Lock()
+
+    def get_or_create(self, text, factory):
+        with self._lock:
+            for recent_text, value in self._items:
+                if recent_text is text:
+                    return value
+            value = factory(text)
+            self._items.append((text, value))
+            return value
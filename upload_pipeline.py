@@ -0,0 +1,111 @@
+# upload_pipeline.py
+
+from text_extractor import extract_text_mixed
+from ocr import ocr_file
+
+
+class UploadPipeline:
+    """
+    Обработка одного загруженного PDF за один проход извлечения.
+
+    Текст извлекается один раз (pdfminer, OCR только для страниц-сканов),
+    а затем одни и те же text / parsed_data передаются парсерам,
+    банкротному калькулятору и генератору PDF.
+    Все шаги ленивые: считаются при первом обращении и запоминаются.
+    """
+
+    # Цепочки парсеров, которые используются в разных сценариях бота
+    FULL_CHAIN = "full"              # GKB → PKB → Detailed → Short → Kazakh → Fallback
+    BANKRUPTCY_CHAIN = "bankruptcy"  # GKB → PKB → Fallback
+
+    def __init__(self, filepath, user_id=None):
+        self.filepath = filepath
+        self.user_id = user_id
+        self._text = None
+        self._collaterals = None
+        self._parsed = {}
+
+    @property
+    def text(self) -> str:
+        """Текст отчета (извлекается один раз на загрузку)"""
+        if self._text is None:
+            text = extract_text_mixed(self.filepath)
+            if not text.strip():
+                print(f"[INFO] Основное извлечение не дало результата, используем OCR...")
+                text = ocr_file(self.filepath)
+            self._text = text
+        return self._text
+
+    @property
+    def collaterals(self) -> list:
+        """Залоги из отчета"""
+        if self._collaterals is None:
+            from collateral_parser import extract_collateral_info
+            from parse_cache import parse_cache
+            self._collaterals = parse_cache.get_or_compute(
+                self.text, "collaterals", lambda: extract_collateral_info(self.text)
+            )
+        return self._collaterals
+
+    def parse(self, chain=FULL_CHAIN) -> dict:
+        """Парсит текст выбранной цепочкой парсеров (результат запоминается)"""
+        if chain not in self._parsed:
+            self._parsed[chain] = self._run_chain(chain)
+        return self._parsed[chain]
+
+    @property
+    def parsed_data(self) -> dict:
+        """Результат полной цепочки парсеров (как extract_credit_data_with_total)"""
+        return self.parse(self.FULL_CHAIN)
+
+    @property
+    def bankruptcy_data(self) -> dict:
+        """Результат цепочки GKB → PKB → Fallback для банкротного калькулятора"""
+        return self.parse(self.BANKRUPTCY_CHAIN)
+
+    def _run_chain(self, chain) -> dict:
+        from credit_parser import (
+            FallbackParser, GKBParser, PKBParser, create_parser_chain, empty_parse_result
+        )
+
+        if chain == self.FULL_CHAIN:
+            parser = create_parser_chain()
+        elif chain == self.BANKRUPTCY_CHAIN:
+            parser = GKBParser()
+            parser.set_next(PKBParser()).set_next(FallbackParser())
+        else:
+            raise ValueError(f"Неизвестная цепочка парсеров: {chain}")
+
+        result = parser.parse(self.text)
+        if not result:
+            return empty_parse_result()
+
+        result["collaterals"] = self.collaterals
+        return result
+
+    def bankruptcy_analysis(self, chain=BANKRUPTCY_CHAIN) -> str:
+        """Текст банкротного анализа по уже распарсенным данным"""
+        from bankruptcy_calculator import analyze_credit_report_for_bankruptcy
+        return analyze_credit_report_for_bankruptcy(self.parse(chain))
+
+
+def analyze_upload(filepath, user_id=None, chain=UploadPipeline.FULL_CHAIN) -> dict:
+    """
+    Извлечение текста и парсинг одной загрузки для пула процессов (job_dispatcher.run_cpu).
+    Возвращает только сериализуемые данные: текст и результат выбранной цепочки.
+    """
+    pipeline = UploadPipeline(filepath, user_id)
+    return {"text": pipeline.text, "parsed_data": pipeline.parse(chain)}
+
+
+def analyze_upload_cached(run_cpu, filepath, user_id=None, chain=UploadPipeline.FULL_CHAIN) -> dict:
+    """
+    analyze_upload через run_cpu (пул процессов) с кэшем в процессе бота:
+    повторная загрузка того же файла не отправляется в пул.
+    """
+    from parse_cache import parse_cache
+
+    return parse_cache.get_or_compute_file(
+        filepath, f"analyze_upload:{chain}", lambda: run_cpu(analyze_upload, filepath, user_id, chain),
+        cache_if=lambda upload: bool(upload["text"].strip()),
+    )
@@ -0,0 +1,71 @@
+# user_registration.py
+"""
+Общая логика /start для синхронного бота (main.py, pymongo) и async-режима
+(async_bot.py, motor): какую запись пользователя создать и какие сообщения
+отправить. Ввод-вывод (база, Bot API) остается в обработчиках.
+"""
+
+from datetime import datetime, timezone
+
+
+def new_user_record(user_id, first_name, last_name, old_user=None, now=None):
+    """
+    Запись для коллекции users при первом /start.
+    old_user - запись из user_migration: данные и доступ восстанавливаются из нее.
+    """
+    now = now or datetime.now(timezone.utc)
+    if old_user:
+        return {
+            "user_id": user_id,
+            "first_name": first_name,
+            "last_name": last_name,
+            "access": old_user.get("access", False),
+            "message_limit": old_user.get("message_limit", 0),
+            "initial_message_limit": old_user.get("initial_message_limit", 0),
+            "messages": old_user.get("messages", []),
+            "created_at": old_user.get("created_at", now),
+            "migrated_at": now,
+            "is_migrated": True
+        }
+    return {
+        "user_id": user_id,
+        "first_name": first_name,
+        "last_name": last_name,
+        "access": False,
+        "message_limit": 0,
+        "messages": [],
+        "created_at": now
+    }
+
+
+def restored_access_text(old_user):
+    """Сообщение о восстановленном доступе (Markdown) или None, если доступа не было"""
+    if not old_user or not old_user.get("access", False):
+        return None
+    return (
+        "🔄 **Данные восстановлены!**\n\n"
+        f"✅ Ваш доступ к боту был восстановлен\n"
+        f"💬 Лимит сообщений: {old_user.get('message_limit', 0)}\n\n"
+        "Добро пожаловать обратно!"
+    )
+
+
+def welcome_text(first_name):
+    return (
+        f"👋 Добро пожаловать, {first_name}!\n\n"
+        "🤖 Я ваш персональный юридический ассистент.\n"
+        "Выберите нужную услугу:"
+    )
+
+
+def admin_notification_text(user_id, first_name, last_name, admin_ids, now=None):
+    """Уведомление админам о /start или None, если /start нажал сам админ"""
+    if user_id in admin_ids:
+        return None
+    timestamp = (now or datetime.now(timezone.utc)).strftime("%Y-%m-%d %H:%M UTC")
+    return (
+        "🆕 Новый пользователь:\n"
+        f"👤 Имя: {first_name} {last_name}\n"
+        f"🆔 ID: {user_id}\n"
+        f"🕒 Время: {timestamp}"
+    )
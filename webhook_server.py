@@ -0,0 +1,240 @@
+# webhook_server.py
+"""
+Режим webhook (BOT_MODE=webhook) вместо long polling.
+
+Telegram присылает обновления POST-запросами на WEBHOOK_URL + WEBHOOK_PATH.
+Асинхронный сервер (aiohttp) проверяет секретный заголовок, сразу отвечает 200
+и передает обновление существующим обработчикам бота (bot.process_new_updates)
+в ограниченный пул потоков. Обновления одного чата выполняются по порядку
+(каждый чат закреплен за одним потоком пула). Если в работе и в очереди уже
+WEBHOOK_MAX_PENDING обновлений, сервер отвечает 503 - Telegram повторит доставку позже.
+
+Локальная проверка без Telegram:
+    BOT_MODE=webhook WEBHOOK_URL= python main.py     # сервер на 127.0.0.1 без set_webhook
+    python webhook_server.py --fake-updates 200 --url http://localhost:8443/telegram
+"""
+
+import argparse
+import asyncio
+import hmac
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Публичный адрес бота (https://...); пустой - не регистрировать webhook в Telegram
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+# Секрет, который Telegram передает в X-Telegram-Bot-Api-Secret-Token.
+# Обязателен с WEBHOOK_URL; пустой допустим только локально (сервер слушает 127.0.0.1)
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "8"))
+WEBHOOK_MAX_PENDING = int(os.getenv("WEBHOOK_MAX_PENDING", "500"))
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def update_chat_id(update_json):
+    """Чат (или пользователь) обновления - по нему сохраняется порядок обработки"""
+    for key in ("message", "edited_message", "channel_post", "edited_channel_post", "callback_query",
+                "my_chat_member", "chat_member", "chat_join_request"):
+        item = update_json.get(key)
+        if not item:
+            continue
+        if key == "callback_query":
+            item = item.get("message") or {"chat": item.get("from") or {}}
+        chat = item.get("chat") or item.get("from") or {}
+        if "id" in chat:
+            return chat["id"]
+    return update_json.get("update_id", 0)
+
+
+class UpdateDispatcher:
+    """
+    Ограниченный пул для обработки обновлений: workers однопоточных исполнителей,
+    чат закреплен за исполнителем (порядок сообщений одного пользователя сохраняется).
+    """
+
+    def __init__(self, process_update, workers=WEBHOOK_WORKERS, max_pending=WEBHOOK_MAX_PENDING):
+        self.process_update = process_update
+        self.max_pending = max_pending
+        self._executors = [
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"webhook-{i}") for i in range(workers)
+        ]
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self.process_s = 0.0
+
+    def submit(self, update_json):
+        """Ставит обновление в очередь; False, если очередь заполнена"""
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                return False
+            self.pending += 1
+            self.accepted += 1
+        executor = self._executors[hash(update_chat_id(update_json)) % len(self._executors)]
+        executor.submit(self._run, update_json)
+        return True
+
+    def _run(self, update_json):
+        started = time.perf_counter()
+        ok = True
+        try:
+            self.process_update(update_json)
+        except Exception as e:
+            ok = False
+            print(f"[ERROR] Обработка обновления {update_json.get('update_id')}: {e}")
+        finally:
+            with self._lock:
+                self.pending -= 1
+                self.processed += 1
+                self.failed += 0 if ok else 1
+                self.process_s += time.perf_counter() - started
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": self.pending,
+                "accepted": self.accepted,
+                "rejected": self.rejected,
+                "processed": self.processed,
+                "failed": self.failed,
+                "avg_process_s": round(self.process_s / self.processed, 4) if self.processed else 0.0,
+            }
+
+    def shutdown(self, wait=True):
+        for executor in self._executors:
+            executor.shutdown(wait=wait)
+
+
+def telebot_processor(bot):
+    """Функция обработки обновления обработчиками TeleBot (в потоке пула, без внутреннего пула бота)"""
+    from telebot import types
+
+    # Обработчики выполняются прямо в потоке UpdateDispatcher: его размер и есть ограничение
+    bot.threaded = False
+
+    def process(update_json):
+        bot.process_new_updates([types.Update.de_json(update_json)])
+
+    return process
+
+
+def create_app(dispatcher, path=WEBHOOK_PATH, secret=WEBHOOK_SECRET):
+    """aiohttp-приложение: POST path - обновления Telegram, GET /healthz - счетчики"""
+
+    async def handle_update(request):
+        if secret and not hmac.compare_digest(request.headers.get(SECRET_HEADER, "").encode(), secret.encode()):
+            return web.Response(status=403)
+        try:
+            update_json = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        if not dispatcher.submit(update_json):
+            # Telegram повторит доставку, когда пул разгрузится
+            return web.Response(status=503)
+        return web.Response(status=200)
+
+    async def healthz(request):
+        return web.json_response(dispatcher.stats())
+
+    async def shutdown(app):
+        # Дожидаемся уже принятых обновлений, не блокируя цикл событий
+        await asyncio.get_running_loop().run_in_executor(None, dispatcher.shutdown)
+
+    app = web.Application()
+    app.router.add_post(path, handle_update)
+    app.router.add_get("/healthz", healthz)
+    app.on_cleanup.append(shutdown)
+    return app
+
+
+def run_webhook(bot, url=WEBHOOK_URL, path=WEBHOOK_PATH, host=WEBHOOK_HOST, port=WEBHOOK_PORT,
+                secret=WEBHOOK_SECRET, workers=WEBHOOK_WORKERS, max_pending=WEBHOOK_MAX_PENDING):
+    """Регистрирует webhook в Telegram (если задан url) и запускает сервер (блокирует поток)"""
+    if not secret:
+        if url:
+            # Без секрета любой, кто достучится до порта, пришлет обновление от имени админа
+            raise RuntimeError("WEBHOOK_SECRET обязателен, когда задан WEBHOOK_URL")
+        if host not in ("127.0.0.1", "localhost", "::1"):
+            print(f"[WARN] WEBHOOK_SECRET не задан: сервер слушает только 127.0.0.1 вместо {host}")
+            host = "127.0.0.1"
+    dispatcher = UpdateDispatcher(telebot_processor(bot), workers=workers, max_pending=max_pending)
+    if url:
+        bot.remove_webhook()
+        bot.set_webhook(url=url.rstrip("/") + path, secret_token=secret, max_connections=100)
+        print(f"[INFO] Webhook зарегистрирован: {url.rstrip('/')}{path}")
+    else:
+        print("[WARN] WEBHOOK_URL не задан: webhook в Telegram не регистрируется (локальный режим)")
+    print(f"[INFO] Webhook-сервер слушает {host}:{port}{path}, потоков обработки: {workers}")
+    web.run_app(create_app(dispatcher, path, secret), host=host, port=port, print=None)
+
+
+# ========== Фейковые обновления для локальной проверки ==========
+
+def fake_update(update_id, chat_id, text="/start"):
+    """Обновление Telegram с текстовым сообщением (как его присылает Bot API)"""
+    user = {"id": chat_id, "is_bot": False, "first_name": "Test", "username": f"user{chat_id}"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "first_name": "Test"},
+            "from": user,
+            "text": text,
+            **({"entities": [{"type": "bot_command", "offset": 0, "length": len(text)}]}
+               if text.startswith("/") else {}),
+        },
+    }
+
+
+async def post_fake_updates(url, count, chats=10, text="/start", secret=WEBHOOK_SECRET, concurrency=50):
+    """Отправляет count обновлений на url; возвращает (коды ответов, секунд на все запросы)"""
+    from aiohttp import ClientSession
+
+    headers = {SECRET_HEADER: secret} if secret else {}
+    semaphore = asyncio.Semaphore(concurrency)
+    statuses = {}
+
+    async with ClientSession() as session:
+        async def post(i):
+            async with semaphore:
+                update = fake_update(i + 1, 100000 + i % chats, text)
+                async with session.post(url, json=update, headers=headers) as response:
+                    statuses[response.status] = statuses.get(response.status, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(post(i) for i in range(count)))
+        return statuses, time.perf_counter() - started
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Проверка webhook-сервера бота фейковыми обновлениями")
+    arg_parser.add_argument("--fake-updates", type=int, default=100, help="Сколько обновлений отправить")
+    arg_parser.add_argument("--url", default=f"http://localhost:{WEBHOOK_PORT}{WEBHOOK_PATH}", help="Адрес webhook")
+    arg_parser.add_argument("--chats", type=int, default=10, help="Сколько разных чатов")
+    arg_parser.add_argument("--text", default="/start", help="Текст сообщений")
+    args = arg_parser.parse_args()
+
+    statuses, elapsed = asyncio.run(post_fake_updates(args.url, args.fake_updates, args.chats, args.text))
+    print(f"📨 Отправлено {args.fake_updates} обновлений за {elapsed:.2f} с "
+          f"({args.fake_updates / elapsed:.0f}/с), ответы: {statuses}")
+    return 0 if set(statuses) == {200} else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+# worker.py
+"""
+Воркер очереди задач (job_queue): обработка загруженных в бот PDF вне процесса бота.
+
+Воркеров можно запускать сколько угодно и на разных машинах - задачи забираются
+атомарно. Завершение по SIGTERM/Ctrl+C: текущая задача дорабатывается, новые не берутся.
+
+Запуск:
+    python -m worker
+    python -m worker --once               # обработать все готовые задачи и выйти
+    python -m worker --poll-interval 5
+"""
+
+import argparse
+import os
+import signal
+import sys
+import threading
+
+from dotenv import load_dotenv
+
+from job_queue import (
+    JOB_VISIBILITY_TIMEOUT, claim, ensure_indexes, get_jobs_collection, heartbeat, new_worker_id, queue_stats,
+    run_job,
+)
+
+load_dotenv()
+
+# Пауза между опросами пустой очереди, секунд
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "2"))
+
+
+def run_telegram_document(payload, progress):
+    """
+    Обработка PDF, присланного в бот: тот же обработчик, что и в боте, по сохраненному сообщению.
+    Файл скачивается заново по file_id, поэтому задача переживает перезапуск бота и воркера.
+    Ошибка обработчика пробрасывается в run_job (повтор с задержкой); пользователю
+    о ней сообщаем только после последней попытки.
+    """
+    from telebot import types
+
+    import main as bot_app  # обработчики бота; импорт не запускает polling
+
+    message = types.Message.de_json(payload["message"])
+    try:
+        if payload["kind"] == "credit_report":
+            bot_app.handle_credit_report_pdf(message, state=payload.get("state"), progress=progress,
+                                             raise_errors=True)
+        elif payload["kind"] == "creditors_list":
+            bot_app.handle_creditors_list_pdf(message, progress=progress, raise_errors=True)
+        else:
+            raise ValueError(f"Неизвестный вид документа: {payload['kind']}")
+    except Exception as e:
+        if progress.is_last_attempt:
+            bot_app.report_document_error(message, progress.get("status_message_id"), e)
+        raise
+
+
+JOB_HANDLERS = {
+    "telegram_document": run_telegram_document,
+}
+
+
+def _keep_alive(jobs, job, visibility_timeout, stop):
+    """Продлевает блокировку задачи, пока она выполняется (каждую треть таймаута)"""
+    while not stop.wait(visibility_timeout / 3):
+        if not heartbeat(jobs, job, visibility_timeout):
+            print(f"[WARN] Задача {job['_id']} больше не принадлежит воркеру {job['locked_by']}")
+            return
+
+
+def work(jobs, worker_id, handlers=JOB_HANDLERS, once=False, poll_interval=WORKER_POLL_INTERVAL,
+         visibility_timeout=JOB_VISIBILITY_TIMEOUT, stop_event=None):
+    """
+    Цикл воркера: забрать задачу, выполнить с продлением блокировки, записать итог.
+    С once выходит, когда готовых задач не осталось. Возвращает число обработанных задач.
+    """
+    stop_event = stop_event or threading.Event()
+    processed = 0
+    while not stop_event.is_set():
+        job = claim(jobs, worker_id, visibility_timeout, job_types=list(handlers))
+        if job is None:
+            if once:
+                break
+            stop_event.wait(poll_interval)
+            continue
+
+        print(f"[LOG] Воркер {worker_id}: задача {job['_id']} ({job['type']}), попытка {job['attempts']}")
+        done = threading.Event()
+        keeper = threading.Thread(
+            target=_keep_alive, args=(jobs, job, visibility_timeout, done), daemon=True, name="job-heartbeat"
+        )
+        keeper.start()
+        try:
+            status = run_job(jobs, job, handlers)
+        finally:
+            done.set()
+            keeper.join()
+        print(f"[LOG] Задача {job['_id']}: {status}")
+        processed += 1
+    return processed
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Воркер очереди задач бота (коллекция jobs)")
+    arg_parser.add_argument("--once", action="store_true", help="Обработать готовые задачи и выйти")
+    arg_parser.add_argument("--poll-interval", type=float, default=WORKER_POLL_INTERVAL,
+                            help="Пауза между опросами пустой очереди, секунд")
+    arg_parser.add_argument("--visibility-timeout", type=int, default=JOB_VISIBILITY_TIMEOUT,
+                            help="Блокировка задачи без продления, секунд")
+    args = arg_parser.parse_args()
+
+    jobs = get_jobs_collection()
+    ensure_indexes(jobs)
+    worker_id = new_worker_id()
+
+    stop_event = threading.Event()
+
+    def request_stop(signum, frame):
+        print(f"[INFO] Воркер {worker_id}: остановка после текущей задачи")
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    print(f"[INFO] Воркер {worker_id} запущен, очередь: {queue_stats(jobs)}")
+    processed = work(jobs, worker_id, once=args.once, poll_interval=args.poll_interval,
+                     visibility_timeout=args.visibility_timeout, stop_event=stop_event)
+    print(f"[INFO] Воркер {worker_id} остановлен, обработано задач: {processed}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())